@@ -102,6 +102,11 @@ if USE_S3_STORAGE:
         },
     }
 
+    # Clients PUT frames and audio chunks straight to the bucket with presigned
+    # URLs instead of streaming them through the web process.
+    DIRECT_UPLOADS_ENABLED = env.bool("DIRECT_UPLOADS_ENABLED", default=False)
+    DIRECT_UPLOAD_EXPIRES_SECONDS = env.int("DIRECT_UPLOAD_EXPIRES_SECONDS", default=900)
+
     if AWS_S3_CUSTOM_DOMAIN:
         MEDIA_URL = f"https://{AWS_S3_CUSTOM_DOMAIN}/"
     else:
@@ -128,6 +133,15 @@ CHANNEL_LAYERS = {
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
 
+# ---- Cache ----
+# Shared by all web processes, so a render queued by one is seen by the others.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    }
+}
+
 # ---- TURN config for ICE endpoint ----
 TURN_HOST = env("TURN_HOST", default="localhost")
 TURN_PORT = env("TURN_PORT", default="3478")
@@ -169,4 +183,31 @@ DIGITIZATION_MODEL_PATH = env(
     "DIGITIZATION_MODEL_PATH",
     default=str(BASE_DIR / "legacy" / "yolov8n-seg.pt"),
 )
+# YOLOv8-seg exported to ONNX, used by the "onnx" person_segmentation backend
+# (OpenCV DNN on the CPU, no torch needed).
+DIGITIZATION_ONNX_MODEL_PATH = env(
+    "DIGITIZATION_ONNX_MODEL_PATH",
+    default=str(BASE_DIR / "legacy" / "yolov8n-seg.onnx"),
+)
 DIGITIZATION_AUTO_TRIGGER = env.bool("DIGITIZATION_AUTO_TRIGGER", default=False)
+DIGITIZATION_PROGRESS_SAVE_INTERVAL = env.float("DIGITIZATION_PROGRESS_SAVE_INTERVAL", default=5.0)
+DIGITIZATION_LOAD_WORKERS = env.int("DIGITIZATION_LOAD_WORKERS", default=8)
+# Worker-local disk cache for frame blobs and model weights; 0 disables it.
+DIGITIZATION_CACHE_DIR = env("DIGITIZATION_CACHE_DIR", default="")
+DIGITIZATION_CACHE_MAX_BYTES = env.int("DIGITIZATION_CACHE_MAX_BYTES", default=2 * 1024 ** 3)
+# Median-mode frame stacks larger than this are backed by np.memmap files in
+# DIGITIZATION_SCRATCH_DIR (the system temp dir when empty).
+DIGITIZATION_MEMMAP_THRESHOLD_BYTES = env.int("DIGITIZATION_MEMMAP_THRESHOLD_BYTES", default=1536 * 1024 ** 2)
+DIGITIZATION_SCRATCH_DIR = env("DIGITIZATION_SCRATCH_DIR", default="")
+# Side of the square tiles a room's board is published as.
+DIGITIZATION_BOARD_TILE_SIZE = env.int("DIGITIZATION_BOARD_TILE_SIZE", default=256)
+# Job results also get a Deep Zoom tile pyramid and thumbnails of these widths.
+DIGITIZATION_PYRAMID_TILE_SIZE = env.int("DIGITIZATION_PYRAMID_TILE_SIZE", default=256)
+DIGITIZATION_THUMBNAIL_WIDTHS = env.list("DIGITIZATION_THUMBNAIL_WIDTHS", cast=int, default=[200, 400, 800])
+# Secondary artifacts (background, debug, webp, pyramid) are rendered by a
+# worker on first request unless listed here; that request gets a 202 with
+# this Retry-After.
+DIGITIZATION_EAGER_ARTIFACTS = env.list("DIGITIZATION_EAGER_ARTIFACTS", default=[])
+DIGITIZATION_ARTIFACT_RETRY_AFTER_SECONDS = env.int("DIGITIZATION_ARTIFACT_RETRY_AFTER_SECONDS", default=2)
+# A queued artifact render is not queued again for this long.
+DIGITIZATION_ARTIFACT_QUEUE_TIMEOUT_SECONDS = env.int("DIGITIZATION_ARTIFACT_QUEUE_TIMEOUT_SECONDS", default=300)
@@ -0,0 +1,211 @@
+import math
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .models import DigitizationJob, job_result_upload_to
+
+# Secondary results rendered from stored intermediates when first requested,
+# unless listed in DIGITIZATION_EAGER_ARTIFACTS (or canvas_webp for "webp").
+# Maps each one to the job field that holds it.
+LAZY_ARTIFACTS = {
+    "background": "background_image",
+    "debug": "debug_image",
+    "webp": "result_webp",
+    "pyramid": "pyramid",
+}
+
+
+def _save_all(files: Iterable[Tuple[str, bytes]]) -> list:
+    """Write ``(name, data)`` pairs to storage in parallel; returns the stored names."""
+    files = list(files)
+    if not files:
+        return []
+    workers = min(int(getattr(settings, "DIGITIZATION_LOAD_WORKERS", 8)), len(files))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(lambda item: default_storage.save(item[0], ContentFile(item[1])), files))
+
+
+def _load_image(name: str) -> Any:
+    import cv2
+    import numpy as np
+
+    with default_storage.open(name, "rb") as fh:
+        image = cv2.imdecode(np.frombuffer(fh.read(), np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Failed to decode {name}")
+    return image
+
+
+def save_intermediates(job: DigitizationJob, background: Any, stroke_color: Any, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Store the stage outputs everything after background estimation starts
+    from: the background and the un-inpainted stroke colours, as quickly
+    compressed lossless PNGs.
+
+    They are keyed by the job whose frames produced them and by the config
+    subset they depend on, so lazy artifacts and re-renders under new ink or
+    render options can start from them instead of the frames.
+    """
+    import cv2
+
+    from .pipeline import encode_image, intermediate_config
+
+    params = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+    background_name, strokes_name = _save_all([
+        (job_result_upload_to(job, "intermediate/background.png"), encode_image(background, ".png", params)),
+        (job_result_upload_to(job, "intermediate/strokes.png"), encode_image(stroke_color, ".png", params)),
+    ])
+    return {
+        "job": str(job.id),
+        "config": intermediate_config(config),
+        "background": background_name,
+        "strokes": strokes_name,
+    }
+
+
+def load_intermediates(intermediates: Dict[str, Any]) -> Tuple[Any, Any]:
+    """The stored ``(background, stroke_color)`` pair."""
+    return _load_image(intermediates["background"]), _load_image(intermediates["strokes"])
+
+
+def pyramid_description(canvas_shape: Tuple[int, ...]) -> Dict[str, object]:
+    """Pyramid geometry of a canvas; ``root`` is added once the tiles exist."""
+    height, width = canvas_shape[:2]
+    return {
+        "format": "png",
+        "tile_size": int(getattr(settings, "DIGITIZATION_PYRAMID_TILE_SIZE", 256)),
+        "max_level": math.ceil(math.log2(max(height, width, 1))),
+        "width": width,
+        "height": height,
+    }
+
+
+def save_tile_pyramid(job: DigitizationJob, canvas: Any) -> Dict[str, object]:
+    """
+    Store ``canvas`` as Deep Zoom tiles under ``<root>/<level>/<x>_<y>.png``
+    and return the pyramid description kept on the job.
+
+    Each run writes to a fresh root, so a re-run never collides with (or is
+    served from caches of) an older pyramid.
+    """
+    from .pipeline import deep_zoom_levels, encode_image
+
+    tile_size = int(getattr(settings, "DIGITIZATION_PYRAMID_TILE_SIZE", 256))
+    root = job_result_upload_to(job, f"pyramid/{uuid.uuid4().hex[:12]}")
+
+    def tiles():
+        for level, image in deep_zoom_levels(canvas):
+            h, w = image.shape[:2]
+            for y in range(math.ceil(h / tile_size)):
+                for x in range(math.ceil(w / tile_size)):
+                    tile = image[y * tile_size:(y + 1) * tile_size, x * tile_size:(x + 1) * tile_size]
+                    yield f"{root}/{level}/{x}_{y}.png", encode_image(tile, ".png")
+
+    _save_all(tiles())
+    return {**pyramid_description(canvas.shape), "root": root}
+
+
+def save_thumbnails(job: DigitizationJob, canvas: Any) -> Dict[str, str]:
+    """Store downscaled copies of ``canvas``; returns storage names keyed by width."""
+    from .pipeline import encode_image, resize_to_width
+
+    widths = sorted({int(w) for w in getattr(settings, "DIGITIZATION_THUMBNAIL_WIDTHS", [])})
+    widths = [w for w in widths if 0 < w < canvas.shape[1]]
+    names = _save_all(
+        (job_result_upload_to(job, f"thumbnails/{w}.png"), encode_image(resize_to_width(canvas, w), ".png"))
+        for w in widths
+    )
+    return {str(w): name for w, name in zip(widths, names)}
+
+
+def pyramid_tile_path(pyramid: Dict[str, object], level: int, x: int, y: int) -> str:
+    """Path of a tile under the pyramid root; raises ``ValueError`` if it is outside the pyramid."""
+    max_level = int(pyramid["max_level"])
+    if not 0 <= level <= max_level:
+        raise ValueError("level out of range")
+    scale = 2 ** (max_level - level)
+    tile_size = int(pyramid["tile_size"])
+    width = math.ceil(int(pyramid["width"]) / scale)
+    height = math.ceil(int(pyramid["height"]) / scale)
+    if not (0 <= x < math.ceil(width / tile_size) and 0 <= y < math.ceil(height / tile_size)):
+        raise ValueError("tile out of range")
+    return f"{level}/{x}_{y}.{pyramid['format']}"
+
+
+def thumbnail_urls(request, job: DigitizationJob) -> Dict[str, str]:
+    return {
+        width: request.build_absolute_uri(default_storage.url(name))
+        for width, name in (job.thumbnails or {}).items()
+    }
+
+
+def artifact_ready(job: DigitizationJob, name: str) -> bool:
+    if name not in LAZY_ARTIFACTS:
+        raise ValueError(f"Unknown artifact {name}")
+    if name == "pyramid":
+        # The pyramid geometry is known up front; ``root`` marks stored tiles.
+        return "root" in (job.pyramid or {})
+    return bool(getattr(job, LAZY_ARTIFACTS[name]))
+
+
+def render_artifact(job: DigitizationJob, name: str, canvas: Any = None, background: Any = None) -> None:
+    """
+    Render and store artifact ``name`` on ``job`` (without saving the job).
+    ``canvas`` and ``background`` are loaded from storage when not given.
+    """
+    import numpy as np
+
+    from .pipeline import encode_image, encode_lossless_webp
+
+    if name in ("background", "debug") and background is None:
+        background = _load_image(job.intermediates["background"])
+    if name in ("debug", "webp", "pyramid") and canvas is None:
+        canvas = _load_image(job.result_image.name)
+
+    if name == "background":
+        job.background_image.save("background.jpg", ContentFile(encode_image(background, ".jpg")), save=False)
+    elif name == "debug":
+        debug_bytes = encode_image(np.hstack([background, canvas]), ".jpg")
+        job.debug_image.save("comparison.jpg", ContentFile(debug_bytes), save=False)
+    elif name == "webp":
+        job.result_webp.save("digital_board.webp", ContentFile(encode_lossless_webp(canvas)), save=False)
+    elif name == "pyramid":
+        job.pyramid = save_tile_pyramid(job, canvas)
+    else:
+        raise ValueError(f"Unknown artifact {name}")
+
+
+def artifact_queue_key(job_id, name: str) -> str:
+    """Cache key marking a queued worker render of artifact ``name``."""
+    return f"digitization:artifact:{job_id}:{name}"
+
+
+def artifact_available(job: DigitizationJob, name: str) -> bool:
+    """Whether artifact ``name`` can be rendered from what ``job`` has stored."""
+    if not job.result_image:
+        return False
+    return name not in ("background", "debug") or "background" in (job.intermediates or {})
+
+
+def ensure_artifact(job: DigitizationJob, name: str) -> DigitizationJob:
+    """
+    The job with artifact ``name`` present, rendering it first if needed.
+    Concurrent renders of the same artifact store it once.
+    """
+    if artifact_ready(job, name):
+        return job
+    if not artifact_available(job, name):
+        raise ValueError(f"{name} is not available for this job")
+
+    with transaction.atomic():
+        job = DigitizationJob.objects.select_for_update().get(id=job.id)
+        if not artifact_ready(job, name):
+            render_artifact(job, name)
+            job.save(update_fields=[LAZY_ARTIFACTS[name]])
+    return job
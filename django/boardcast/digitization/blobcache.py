@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BlobCache:
+    """
+    Content-addressed blob cache on the worker's local disk.
+
+    Blobs are stored under their key and evicted least-recently-used first
+    (by mtime, which reads refresh) once the directory exceeds ``max_bytes``.
+    Writes go through a temp file and ``os.replace``, so several worker
+    processes can share one directory. Cache I/O errors are logged and treated
+    as misses; the cache never fails its caller.
+    """
+
+    def __init__(self, root, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def path(self, key: str, suffix: str = "") -> Path:
+        return self.root / key[:2] / f"{key}{suffix}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        path = self.path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            self._count(hit=False)
+            return None
+        except OSError:
+            logger.warning("Could not read cached blob %s", path, exc_info=True)
+            self._count(hit=False)
+            return None
+        self._touch(path)
+        self._count(hit=True)
+        return data
+
+    def put(self, key: str, data: bytes, suffix: str = "") -> Optional[Path]:
+        if not self.enabled or len(data) > self.max_bytes:
+            return None
+        path = self.path(key, suffix)
+        tmp = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            logger.warning("Could not cache blob %s", path, exc_info=True)
+            if tmp is not None:
+                Path(tmp).unlink(missing_ok=True)
+            return None
+        except BaseException:
+            if tmp is not None:
+                Path(tmp).unlink(missing_ok=True)
+            raise
+        return path
+
+    def file(self, key: str, suffix: str, fetch: Callable[[], bytes]) -> Path:
+        """Path of a cached file, calling ``fetch`` for its bytes on a miss."""
+        path = self.path(key, suffix)
+        # Another process may evict the file between the check and the touch.
+        if path.exists() and self._touch(path):
+            self._count(hit=True)
+            return path
+        self._count(hit=False)
+        data = fetch()
+        cached = self.put(key, data, suffix)
+        if cached is None:
+            # Too large for the budget (or caching is off): keep it outside the cache.
+            path = Path(tempfile.gettempdir()) / f"{key}{suffix}"
+            path.write_bytes(data)
+            return path
+        return cached
+
+    def evict(self) -> None:
+        if not self.enabled or not self.root.exists():
+            return
+        entries = []
+        total = 0
+        for path in self.root.glob("*/*"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                logger.warning("Could not evict cached blob %s", path, exc_info=True)
+                continue
+            total -= size
+
+    def _touch(self, path: Path) -> bool:
+        """Mark ``path`` recently used; False if it is gone."""
+        try:
+            os.utime(path)
+        except OSError:
+            return False
+        return True
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+def get_blob_cache() -> BlobCache:
+    root = getattr(settings, "DIGITIZATION_CACHE_DIR", "") or Path(tempfile.gettempdir()) / "boardcast-cache"
+    return BlobCache(root, getattr(settings, "DIGITIZATION_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+
+def resolve_model_path(location: str, cache: BlobCache) -> str:
+    """
+    Local path of the model weights named by ``location``: an existing local
+    file, an http(s) URL, or a name in the default storage. Remote weights are
+    kept in ``cache`` so later jobs on the same machine skip the download.
+    """
+    if Path(location).exists():
+        return location
+
+    key = hashlib.sha256(location.encode()).hexdigest()
+    suffix = Path(location.split("?", 1)[0]).suffix or ".pt"
+
+    if location.startswith(("http://", "https://")):
+        import requests
+
+        def fetch() -> bytes:
+            resp = requests.get(location, timeout=60)
+            resp.raise_for_status()
+            return resp.content
+    else:
+        from django.core.files.storage import default_storage
+
+        if not default_storage.exists(location):
+            raise ValueError(f"YOLO model not found at {location}")
+
+        def fetch() -> bytes:
+            with default_storage.open(location, "rb") as fh:
+                return fh.read()
+
+    return str(cache.file(key, suffix, fetch))
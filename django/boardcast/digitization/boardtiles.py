@@ -0,0 +1,107 @@
+import logging
+import math
+from typing import Any, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from .models import BoardTileSet, DigitizationJob
+
+logger = logging.getLogger(__name__)
+
+
+def _tile_key(row: int, col: int) -> str:
+    return f"{row},{col}"
+
+
+def delete_files(storage, names: List[str]) -> None:
+    """Delete ``names`` from ``storage``; failures are logged, not raised."""
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception:
+            logger.warning("Could not delete %s", name, exc_info=True)
+
+
+def publish_board_tiles(
+    room_id,
+    canvas: Any,
+    job: Optional[DigitizationJob] = None,
+) -> Tuple[BoardTileSet, List[Tuple[int, int]]]:
+    """
+    Make ``canvas`` the room's tiled board, rewriting only the tiles that
+    differ from the previous canvas. Returns the tile set and the
+    ``(row, col)`` of every rewritten tile.
+    """
+    import cv2
+    import numpy as np
+
+    from .pipeline import dirty_tiles, encode_image
+
+    tile_size = int(getattr(settings, "DIGITIZATION_BOARD_TILE_SIZE", 256))
+    height, width = canvas.shape[:2]
+
+    with transaction.atomic():
+        tileset, _ = BoardTileSet.objects.select_for_update().get_or_create(
+            room_id=room_id,
+            defaults={"tile_size": tile_size, "width": width, "height": height},
+        )
+
+        previous = None
+        if tileset.canvas and tileset.tile_size == tile_size:
+            with tileset.canvas.open("rb") as fh:
+                previous = cv2.imdecode(np.frombuffer(fh.read(), np.uint8), cv2.IMREAD_COLOR)
+
+        changed = dirty_tiles(previous, canvas, tile_size)
+        if previous is not None and not changed:
+            return tileset, []
+
+        version = tileset.version + 1
+        rows, cols = math.ceil(height / tile_size), math.ceil(width / tile_size)
+        tiles = {}
+        if previous is not None:
+            for key, entry in tileset.tiles.items():
+                row, col = map(int, key.split(","))
+                if row < rows and col < cols:
+                    tiles[key] = entry
+        stale = [entry["name"] for key, entry in tileset.tiles.items() if key not in tiles]
+
+        storage = tileset.canvas.storage
+        for row, col in changed:
+            key = _tile_key(row, col)
+            if key in tiles:
+                stale.append(tiles[key]["name"])
+            tile = canvas[row * tile_size:(row + 1) * tile_size, col * tile_size:(col + 1) * tile_size]
+            # Versioned names keep cached copies of the old tile valid until clients move on.
+            name = storage.save(
+                tileset.canvas.field.generate_filename(tileset, f"{row}_{col}_v{version}.png"),
+                ContentFile(encode_image(tile, ".png")),
+            )
+            tiles[key] = {"version": version, "name": name}
+
+        if tileset.canvas:
+            stale.append(tileset.canvas.name)
+        tileset.canvas.save(f"canvas_v{version}.png", ContentFile(encode_image(canvas, ".png")), save=False)
+        tileset.version = version
+        tileset.tile_size = tile_size
+        tileset.width = width
+        tileset.height = height
+        tileset.tiles = tiles
+        tileset.job = job
+        tileset.save()
+
+        # The committed row keeps pointing at the old files until the new
+        # ones are committed, so they are only deleted after the commit.
+        transaction.on_commit(lambda: delete_files(storage, stale))
+
+    return tileset, changed
+
+
+def tiles_event(tileset: BoardTileSet, changed: List[Tuple[int, int]]) -> dict:
+    """The ``tiles`` part of a board-updated event."""
+    return {
+        "version": tileset.version,
+        "tile_size": tileset.tile_size,
+        "changed": [[row, col] for row, col in changed],
+    }
@@ -0,0 +1,100 @@
+import struct
+from typing import Tuple
+
+# JPEG start-of-frame markers; C4 (DHT), C8 (JPG) and CC (DAC) share the range.
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _exif_orientation(segment: bytes) -> int:
+    """The Orientation tag of an APP1 Exif segment body (1, upright, when absent)."""
+    if segment[:6] != b"Exif\x00\x00":
+        return 1
+    tiff = segment[6:]
+    endian = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if endian is None or len(tiff) < 8:
+        return 1
+    (offset,) = struct.unpack(endian + "I", tiff[4:8])
+    if offset + 2 > len(tiff):
+        return 1
+    (count,) = struct.unpack(endian + "H", tiff[offset:offset + 2])
+    for entry in range(offset + 2, min(offset + 2 + 12 * count, len(tiff) - 11), 12):
+        tag, kind = struct.unpack(endian + "HH", tiff[entry:entry + 4])
+        if tag == 0x0112 and kind == 3:
+            return struct.unpack(endian + "H", tiff[entry + 8:entry + 10])[0]
+    return 1
+
+
+def _probe_jpeg(data: bytes) -> Tuple[int, int]:
+    pos = 2
+    orientation = 1
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError("Corrupt JPEG marker")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in {0xD8, 0x01} or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        if marker == 0xD9:
+            break
+        (length,) = struct.unpack(">H", data[pos + 2:pos + 4])
+        if marker == 0xE1 and orientation == 1:
+            orientation = _exif_orientation(data[pos + 4:pos + 2 + length])
+        if marker in _JPEG_SOF_MARKERS:
+            if pos + 9 > len(data):
+                break
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            # Orientations 5-8 rotate by 90 degrees, and decoders apply them.
+            if 5 <= orientation <= 8:
+                return height, width
+            return width, height
+        pos += 2 + length
+    raise ValueError("JPEG has no frame header")
+
+
+def _probe_png(data: bytes) -> Tuple[int, int]:
+    if len(data) < 24 or data[12:16] != b"IHDR":
+        raise ValueError("PNG has no IHDR chunk")
+    return struct.unpack(">II", data[16:24])
+
+
+def _probe_webp(data: bytes) -> Tuple[int, int]:
+    chunk = data[12:16]
+    if chunk == b"VP8 " and len(data) >= 30:
+        if data[23:26] != b"\x9d\x01\x2a":
+            raise ValueError("Corrupt VP8 frame header")
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(data) >= 25:
+        if data[20] != 0x2F:
+            raise ValueError("Corrupt VP8L header")
+        (bits,) = struct.unpack("<I", data[21:25])
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(data) >= 30:
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return width, height
+    raise ValueError("Unsupported WebP chunk")
+
+
+def probe_image(data: bytes) -> Tuple[str, int, int]:
+    """
+    Return ``(format, width, height)`` of a JPEG, PNG or WebP payload by
+    reading its headers only. Raises ``ValueError`` for anything else.
+
+    The pixel data is not decoded; the worker does that when it loads frames.
+    """
+    if data[:3] == b"\xff\xd8\xff":
+        fmt, (width, height) = "jpeg", _probe_jpeg(data)
+    elif data[:8] == b"\x89PNG\r\n\x1a\n":
+        fmt, (width, height) = "png", _probe_png(data)
+    elif data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        fmt, (width, height) = "webp", _probe_webp(data)
+    else:
+        raise ValueError("Unsupported image format")
+
+    if width <= 0 or height <= 0:
+        raise ValueError("Image has no pixels")
+    return fmt, width, height
@@ -0,0 +1,97 @@
+import multiprocessing
+import resource
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from digitization.blobcache import get_blob_cache, resolve_model_path
+
+MODEL_SETTINGS = {
+    "yolo": "DIGITIZATION_MODEL_PATH",
+    "onnx": "DIGITIZATION_ONNX_MODEL_PATH",
+}
+
+
+def _run_backend(backend, model_path, frame_paths, options, repeats):
+    """Time one segmentation backend from a cold start, in a fresh process."""
+    started = time.perf_counter()
+    import cv2
+
+    from digitization.pipeline import build_config, detect_person_masks, load_yolo_model
+
+    if backend == "yolo":
+        import ultralytics  # noqa: F401
+    imported = time.perf_counter()
+
+    model = load_yolo_model(model_path)
+    loaded = time.perf_counter()
+
+    config = build_config({**options, "person_segmentation": backend})
+    images = [cv2.imread(path, cv2.IMREAD_COLOR) for path in frame_paths]
+    # The first pass warms up lazily initialised layers and is not timed.
+    masks = [detect_person_masks([img], model, img.shape[:2], config)[0] for img in images]
+    frame_ms = []
+    for _ in range(repeats):
+        for img in images:
+            start = time.perf_counter()
+            detect_person_masks([img], model, img.shape[:2], config)
+            frame_ms.append((time.perf_counter() - start) * 1000.0)
+
+    return {
+        "import_s": imported - started,
+        "load_s": loaded - imported,
+        "frame_ms": sorted(frame_ms),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "masks": masks,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the person segmentation backends on sample frames: import and "
+        "load time, per-frame latency, peak memory and mask agreement."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("frames", nargs="+", help="Frame images to segment.")
+        parser.add_argument("--backends", nargs="+", default=["yolo", "onnx"], choices=sorted(MODEL_SETTINGS))
+        parser.add_argument("--repeats", type=int, default=5)
+        parser.add_argument("--conf", type=float, default=None)
+        parser.add_argument("--onnx-input-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        config = {}
+        if options["conf"] is not None:
+            config["conf"] = options["conf"]
+        if options["onnx_input_size"] is not None:
+            config["onnx_input_size"] = options["onnx_input_size"]
+
+        results = {}
+        for backend in options["backends"]:
+            try:
+                model_path = resolve_model_path(str(getattr(settings, MODEL_SETTINGS[backend])), get_blob_cache())
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            # Each backend gets its own interpreter so neither sees the other's imports.
+            with multiprocessing.get_context("spawn").Pool(1) as pool:
+                results[backend] = pool.apply(
+                    _run_backend,
+                    (backend, model_path, options["frames"], config, max(1, options["repeats"])),
+                )
+
+        self.stdout.write(f"{'backend':<8}{'import s':>10}{'load s':>10}{'p50 ms':>10}{'p90 ms':>10}{'peak MB':>10}")
+        for backend, result in results.items():
+            frame_ms = result["frame_ms"]
+            self.stdout.write(
+                f"{backend:<8}{result['import_s']:>10.2f}{result['load_s']:>10.2f}"
+                f"{frame_ms[len(frame_ms) // 2]:>10.1f}{frame_ms[int(len(frame_ms) * 0.9)]:>10.1f}"
+                f"{result['peak_rss_mb']:>10.0f}"
+            )
+
+        if len(results) > 1:
+            (first, a), (second, b) = list(results.items())[:2]
+            for path, mask_a, mask_b in zip(options["frames"], a["masks"], b["masks"]):
+                union = (mask_a | mask_b).sum()
+                iou = (mask_a & mask_b).sum() / union if union else 1.0
+                self.stdout.write(f"{path}: {first}/{second} mask IoU {iou:.3f}")
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.10 on 2026-10-17 17:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("digitization", "0001_initial"),
+        ("rooms", "0002_room_janus_room_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RoomCalibration",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("frame_width", models.IntegerField()),
+                ("frame_height", models.IntegerField()),
+                ("bbox", models.JSONField(default=list)),
+                ("params", models.JSONField(blank=True, default=dict)),
+                ("thumbnail", models.BinaryField()),
+                ("features", models.BinaryField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("room", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name="digitization_calibration", to="rooms.room")),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.10 on 2026-10-17 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("digitization", "0002_room_calibration"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="digitizationjob",
+            name="fingerprint",
+            field=models.CharField(blank=True, db_index=True, default="", max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.10 on 2026-10-17 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("digitization", "0003_job_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="digitizationframe",
+            name="size_bytes",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
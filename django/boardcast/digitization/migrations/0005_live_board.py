@@ -0,0 +1,27 @@
+# Generated by Django 5.0.10 on 2026-10-17 17:34
+
+import digitization.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("digitization", "0004_frame_size_bytes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LiveBoard",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("frames", models.IntegerField(default=0)),
+                ("state", models.FileField(blank=True, null=True, upload_to=digitization.models.live_board_upload_to)),
+                ("canvas", models.FileField(blank=True, null=True, upload_to=digitization.models.live_board_upload_to)),
+                ("metrics", models.JSONField(blank=True, default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("job", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name="live_board", to="digitization.digitizationjob")),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.10 on 2026-10-17 17:36
+
+import digitization.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("digitization", "0005_live_board"),
+        ("rooms", "0002_room_janus_room_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BoardTileSet",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("version", models.IntegerField(default=0)),
+                ("tile_size", models.IntegerField()),
+                ("width", models.IntegerField()),
+                ("height", models.IntegerField()),
+                ("canvas", models.FileField(blank=True, null=True, upload_to=digitization.models.board_tiles_upload_to)),
+                ("tiles", models.JSONField(blank=True, default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("job", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="+", to="digitization.digitizationjob")),
+                ("room", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name="board_tiles", to="rooms.room")),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.10 on 2026-10-17 17:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("digitization", "0006_board_tiles"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="digitizationjob",
+            name="pyramid",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="digitizationjob",
+            name="thumbnails",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.10 on 2026-10-17 17:42
+
+import digitization.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("digitization", "0008_result_webp"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="digitizationjob",
+            name="result_svg",
+            field=models.FileField(blank=True, null=True, upload_to=digitization.models.job_result_upload_to),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.10 on 2026-10-17 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("digitization", "0009_result_svg"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="digitizationjob",
+            name="intermediates",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -18,6 +18,14 @@ def job_result_upload_to(instance, filename):
     return f"digitization/{instance.id}/{filename}"
 
 
+def board_tiles_upload_to(instance, filename):
+    return f"digitization/rooms/{instance.room_id}/tiles/{filename}"
+
+
+def live_board_upload_to(instance, filename):
+    return f"digitization/{instance.job_id}/live/{filename}"
+
+
 class DigitizationJob(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="digitization_jobs")
@@ -29,6 +37,7 @@ class DigitizationJob(models.Model):
     capture_source = models.CharField(max_length=64, blank=True, default="")
     options = models.JSONField(default=dict, blank=True)
     metrics = models.JSONField(default=dict, blank=True)
+    fingerprint = models.CharField(max_length=64, blank=True, default="", db_index=True)
 
     processed_frames = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -41,6 +50,18 @@ class DigitizationJob(models.Model):
     result_image = models.FileField(upload_to=job_result_upload_to, null=True, blank=True)
     background_image = models.FileField(upload_to=job_result_upload_to, null=True, blank=True)
     debug_image = models.FileField(upload_to=job_result_upload_to, null=True, blank=True)
+    result_webp = models.FileField(upload_to=job_result_upload_to, null=True, blank=True)
+    result_svg = models.FileField(upload_to=job_result_upload_to, null=True, blank=True)
+    # Deep Zoom pyramid of the result (root path, tile size, levels) and
+    # result thumbnails keyed by width.
+    pyramid = models.JSONField(default=dict, blank=True)
+    thumbnails = models.JSONField(default=dict, blank=True)
+    # Storage names of the arrays lazy artifacts are rendered from.
+    intermediates = models.JSONField(default=dict, blank=True)
+
+    @property
+    def live(self) -> bool:
+        return bool((self.options or {}).get("live"))
 
     def __str__(self):
         return f"{self.id} {self.room_id} {self.status}"
@@ -55,6 +76,7 @@ class DigitizationFrame(models.Model):
     width = models.IntegerField(null=True, blank=True)
     height = models.IntegerField(null=True, blank=True)
     checksum = models.CharField(max_length=64, blank=True, default="")
+    size_bytes = models.IntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -65,3 +87,56 @@ class DigitizationFrame(models.Model):
 
     def __str__(self):
         return f"{self.id} {self.job_id} idx={self.frame_index}"
+
+
+class RoomCalibration(models.Model):
+    """Whiteboard bbox and reference ORB features cached from a room's last full detection."""
+
+    room = models.OneToOneField(Room, on_delete=models.CASCADE, related_name="digitization_calibration")
+    frame_width = models.IntegerField()
+    frame_height = models.IntegerField()
+    bbox = models.JSONField(default=list)
+    params = models.JSONField(default=dict, blank=True)
+    thumbnail = models.BinaryField()
+    features = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.room_id} {self.frame_width}x{self.frame_height} bbox={self.bbox}"
+
+
+class LiveBoard(models.Model):
+    """Online background state and latest canvas of a job run in live mode."""
+
+    job = models.OneToOneField(DigitizationJob, on_delete=models.CASCADE, related_name="live_board")
+    frames = models.IntegerField(default=0)
+    state = models.FileField(upload_to=live_board_upload_to, null=True, blank=True)
+    canvas = models.FileField(upload_to=live_board_upload_to, null=True, blank=True)
+    metrics = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.job_id} frames={self.frames}"
+
+
+class BoardTileSet(models.Model):
+    """
+    A room's latest board split into square tiles.
+
+    ``version`` goes up on every publish, and each entry of ``tiles`` (keyed
+    ``"row,col"``) records the version that last rewrote it, so clients only
+    fetch tiles newer than the version they hold.
+    """
+
+    room = models.OneToOneField(Room, on_delete=models.CASCADE, related_name="board_tiles")
+    job = models.ForeignKey(DigitizationJob, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    version = models.IntegerField(default=0)
+    tile_size = models.IntegerField()
+    width = models.IntegerField()
+    height = models.IntegerField()
+    canvas = models.FileField(upload_to=board_tiles_upload_to, null=True, blank=True)
+    tiles = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.room_id} v{self.version} {self.width}x{self.height}"
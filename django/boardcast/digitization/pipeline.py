@@ -1,6 +1,14 @@
+import io
+import math
+import os
+import struct
+import threading
+import time
 import warnings
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from functools import lru_cache
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import cv2
 import numpy as np
@@ -8,6 +16,7 @@ import numpy as np
 DEFAULT_CONFIG: Dict[str, object] = {
     "conf": 0.4,
     "person_class": 0,
+    "onnx_input_size": 640,
     "person_segmentation": "yolo",
     "whiteboard_thresh": 200,
     "min_whiteboard_area": 10000,
@@ -19,8 +28,66 @@ DEFAULT_CONFIG: Dict[str, object] = {
     "morph_kernel_size": 3,
     "expect_person_in_each_frame": True,
     "min_person_area_ratio": 0.003,
+    "background_mode": "median",
+    "stack_storage": "auto",
+    "streaming_bins": 16,
+    "segmentation_batch_size": 8,
+    "parallelism": "serial",
+    "parallel_workers": 0,
+    "alignment_mode": "full",
+    "pyramid_levels": 1,
+    "pyramid_refine": False,
+    "identity_tolerance_px": 0.5,
+    "use_calibration": True,
+    "calibration_max_diff": 12.0,
+    "tiling": "auto",
+    "tile_size": 1024,
+    "live": False,
+    "live_alpha": 0.3,
+    "palette_colors": 8,
+    "canvas_webp": False,
+    "vector_export": True,
+    "vector_epsilon": 1.0,
 }
 
+# Config keys that only change how the job runs, not what it produces.
+EXECUTION_ONLY_KEYS = (
+    "stack_storage",
+    "segmentation_batch_size",
+    "parallelism",
+    "parallel_workers",
+    "tiling",
+    "tile_size",
+    "live",
+    "live_alpha",
+)
+
+# Config keys that only change ink detection and rendering, so a finished
+# job's board can be re-rendered under new values from its intermediates.
+RENDER_KEYS = (
+    "adaptive_block_size",
+    "adaptive_c",
+    "morph_kernel_size",
+    "palette_colors",
+    "canvas_webp",
+    "vector_export",
+    "vector_epsilon",
+)
+
+CALIBRATION_THUMBNAIL_SIZE = (64, 48)
+# Config keys that change the cached bbox or reference features.
+CALIBRATION_PARAMS = ("whiteboard_thresh", "min_whiteboard_area", "orb_features")
+
+STREAMING_BIN_CHOICES = {4, 8, 16, 32, 64}
+
+
+def intermediate_config(config: Dict[str, object]) -> Dict[str, object]:
+    """The config subset that produced a job's intermediates (background and stroke colours)."""
+    return {
+        key: value for key, value in config.items()
+        if key not in RENDER_KEYS and key not in EXECUTION_ONLY_KEYS
+    }
+
 
 def build_config(options: Dict[str, object]) -> Dict[str, object]:
     config = DEFAULT_CONFIG.copy()
@@ -29,9 +96,60 @@ def build_config(options: Dict[str, object]) -> Dict[str, object]:
             config[key] = value
 
     segmentation = str(config.get("person_segmentation") or "").lower()
-    if segmentation not in {"yolo", "heuristic"}:
+    if segmentation not in {"yolo", "onnx", "heuristic"}:
         segmentation = "yolo"
     config["person_segmentation"] = segmentation
+    # YOLO inputs are multiples of the 32 px stride.
+    config["onnx_input_size"] = max(32, int(config["onnx_input_size"]) // 32 * 32)
+
+    background_mode = str(config.get("background_mode") or "").lower()
+    if background_mode not in {"median", "streaming"}:
+        background_mode = "median"
+    config["background_mode"] = background_mode
+
+    stack_storage = str(config.get("stack_storage") or "").lower()
+    if stack_storage not in {"auto", "memory", "memmap"}:
+        stack_storage = "auto"
+    config["stack_storage"] = stack_storage
+
+    bins = int(config["streaming_bins"])
+    if bins not in STREAMING_BIN_CHOICES:
+        bins = int(DEFAULT_CONFIG["streaming_bins"])
+    config["streaming_bins"] = bins
+
+    config["segmentation_batch_size"] = max(1, int(config["segmentation_batch_size"]))
+
+    parallelism = str(config.get("parallelism") or "").lower()
+    if parallelism not in {"serial", "thread", "process"}:
+        parallelism = "serial"
+    config["parallelism"] = parallelism
+
+    workers = int(config["parallel_workers"])
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    config["parallel_workers"] = workers
+
+    alignment_mode = str(config.get("alignment_mode") or "").lower()
+    if alignment_mode not in {"full", "pyramid"}:
+        alignment_mode = "full"
+    config["alignment_mode"] = alignment_mode
+    config["pyramid_levels"] = min(max(1, int(config["pyramid_levels"])), 3)
+
+    tiling = str(config.get("tiling") or "").lower()
+    if tiling not in {"auto", "on", "off"}:
+        tiling = "auto"
+    config["tiling"] = tiling
+    config["tile_size"] = max(128, int(config["tile_size"]))
+
+    config["live"] = bool(config["live"])
+    config["live_alpha"] = min(max(0.01, float(config["live_alpha"])), 1.0)
+
+    # Index 0 of the palette is the white background.
+    config["palette_colors"] = min(max(0, int(config["palette_colors"])), 255)
+    config["canvas_webp"] = bool(config["canvas_webp"])
+
+    config["vector_export"] = bool(config["vector_export"])
+    config["vector_epsilon"] = max(0.0, float(config["vector_epsilon"]))
 
     block_size = int(config["adaptive_block_size"])
     if block_size % 2 == 0:
@@ -41,13 +159,54 @@ def build_config(options: Dict[str, object]) -> Dict[str, object]:
     return config
 
 
-@lru_cache(maxsize=1)
-def get_yolo_model(model_path: str) -> Any:
+# Input side, scale and (left, top) padding of a letterboxed frame.
+Letterbox = Tuple[int, float, int, int]
+
+
+def letterbox_image(img: np.ndarray, size: int) -> Tuple[np.ndarray, Letterbox]:
+    """``img`` scaled to fit a ``size`` square and centred on grey padding, as YOLO expects."""
+    h, w = img.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = round(w * scale), round(h * scale)
+    left, top = (size - new_w) // 2, (size - new_h) // 2
+    padded = np.full((size, size, 3), 114, dtype=np.uint8)
+    padded[top:top + new_h, left:left + new_w] = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    return padded, (size, scale, left, top)
+
+
+class OnnxSegmentationModel:
+    """A YOLOv8-seg ONNX export run on the CPU through OpenCV DNN."""
+
+    def __init__(self, model_path: str):
+        self.net = cv2.dnn.readNetFromONNX(model_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.output_names = self.net.getUnconnectedOutLayersNames()
+
+    def __call__(self, img: np.ndarray, input_size: int) -> Tuple[np.ndarray, np.ndarray, Letterbox]:
+        padded, letterbox = letterbox_image(img, input_size)
+        self.net.setInput(cv2.dnn.blobFromImage(padded, 1.0 / 255.0, swapRB=True))
+        outputs = self.net.forward(self.output_names)
+        # (1, 4 + classes + coefficients, anchors) detections and
+        # (1, coefficients, mask_h, mask_w) prototypes, in either order.
+        preds, protos = sorted(outputs, key=lambda output: output.ndim)
+        return preds[0], protos[0], letterbox
+
+
+def load_yolo_model(model_path: str) -> Any:
+    if model_path.endswith(".onnx"):
+        return OnnxSegmentationModel(model_path)
+
     from ultralytics import YOLO
 
     return YOLO(model_path)
 
 
+@lru_cache(maxsize=1)
+def get_yolo_model(model_path: str) -> Any:
+    return load_yolo_model(model_path)
+
+
 def detect_whiteboard_bbox(img: np.ndarray, config: Dict[str, object]) -> Tuple[int, int, int, int]:
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     gray = cv2.bilateralFilter(gray, 9, 75, 75)
@@ -74,31 +233,47 @@ def detect_whiteboard_bbox(img: np.ndarray, config: Dict[str, object]) -> Tuple[
     return cv2.boundingRect(largest_contour)
 
 
-def align_image(
-    img: np.ndarray,
+def estimate_homography(
+    gray: np.ndarray,
     ref_kp,
     ref_des,
     orb,
     bf,
-    target_size: Tuple[int, int],
     config: Dict[str, object],
-) -> np.ndarray:
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+) -> Tuple[Optional[np.ndarray], Optional[float]]:
+    """Homography mapping ``gray`` onto the reference features, and its RANSAC inlier ratio."""
     kp, des = orb.detectAndCompute(gray, None)
 
     if des is None or ref_des is None or len(kp) < 4:
-        return img
+        return None, None
 
     matches = bf.match(ref_des, des)
     matches = sorted(matches, key=lambda x: x.distance)[:50]
 
     if len(matches) < int(config["min_match_count"]):
-        return img
+        return None, None
 
     src_pts = np.float32([ref_kp[m.queryIdx].pt for m in matches]).reshape(-1, 1, 2)
     dst_pts = np.float32([kp[m.trainIdx].pt for m in matches]).reshape(-1, 1, 2)
 
-    H, _ = cv2.findHomography(dst_pts, src_pts, cv2.RANSAC, float(config["ransac_threshold"]))
+    H, inliers = cv2.findHomography(dst_pts, src_pts, cv2.RANSAC, float(config["ransac_threshold"]))
+    if H is None:
+        return None, None
+
+    return H, float(inliers.sum()) / len(matches)
+
+
+def align_image(
+    img: np.ndarray,
+    ref_kp,
+    ref_des,
+    orb,
+    bf,
+    target_size: Tuple[int, int],
+    config: Dict[str, object],
+) -> np.ndarray:
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    H, _ = estimate_homography(gray, ref_kp, ref_des, orb, bf, config)
     if H is None:
         return img
 
@@ -106,75 +281,687 @@ def align_image(
     return cv2.warpPerspective(img, H, (w, h), flags=cv2.INTER_LINEAR)
 
 
-def detect_person_mask(
-    img: np.ndarray,
-    model: Any,
+def _downscale(gray: np.ndarray, scale: float) -> np.ndarray:
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def _upscale_homography(H: np.ndarray, scale: float) -> np.ndarray:
+    S = np.diag([scale, scale, 1.0])
+    return np.linalg.inv(S) @ H @ S
+
+
+def _is_near_identity(H: np.ndarray, target_size: Tuple[int, int], tolerance: float) -> bool:
+    w, h = target_size
+    corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+    moved = cv2.perspectiveTransform(corners, H)
+    return float(np.abs(moved - corners).max()) <= tolerance
+
+
+def _heuristic_person_mask(img: np.ndarray) -> np.ndarray:
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    v = hsv[..., 2]
+    mask = (v < 130).astype(np.uint8) * 255
+
+    k_close = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (31, 31))
+    k_open = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
+    k_dilate = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (21, 21))
+
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, k_close, iterations=1)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, k_open, iterations=1)
+
+    num, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    cleaned = np.zeros_like(mask)
+    if num > 1:
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        largest = 1 + int(np.argmax(areas))
+        if stats[largest, cv2.CC_STAT_AREA] < 0.7 * mask.size:
+            cleaned[labels == largest] = 255
+
+    cleaned = cv2.dilate(cleaned, k_dilate, iterations=1)
+    return cleaned.astype(bool)
+
+
+def _close_person_mask(person_mask: np.ndarray) -> np.ndarray:
+    if not person_mask.any():
+        return person_mask
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    return cv2.morphologyEx(person_mask.astype(np.uint8), cv2.MORPH_CLOSE, kernel).astype(bool)
+
+
+def _merge_person_segments(result: Any, target_size: Tuple[int, int], config: Dict[str, object]) -> np.ndarray:
+    """
+    Union of the person-class masks of one YOLO result at ``target_size``.
+
+    The masks are selected, resized and merged as one tensor, so only the final
+    boolean mask is copied to NumPy.
+    """
+    h, w = target_size
+    if not hasattr(result, "masks") or result.masks is None:
+        return np.zeros((h, w), dtype=bool)
+
+    import torch.nn.functional as F
+
+    segments = result.masks.data[result.boxes.cls == int(config["person_class"])]
+    if segments.shape[0] == 0:
+        return np.zeros((h, w), dtype=bool)
+
+    resized = F.interpolate(segments[:, None].float(), size=(h, w), mode="bilinear", align_corners=False)
+    person_mask = (resized[:, 0] > 0.5).any(dim=0).cpu().numpy()
+    return _close_person_mask(person_mask)
+
+
+def decode_person_segments(
+    preds: np.ndarray,
+    protos: np.ndarray,
+    letterbox: Letterbox,
     target_size: Tuple[int, int],
     config: Dict[str, object],
+    iou_threshold: float = 0.7,
 ) -> np.ndarray:
+    """Union of the person masks in one frame's raw YOLOv8-seg output, at ``target_size``."""
     h, w = target_size
+    preds = preds.T
+    num_coeffs, proto_h, proto_w = protos.shape
+    num_classes = preds.shape[1] - 4 - num_coeffs
+
+    scores = preds[:, 4:4 + num_classes]
+    person_class = int(config["person_class"])
+    keep = (scores.argmax(axis=1) == person_class) & (scores[:, person_class] >= float(config["conf"]))
+    if not keep.any():
+        return np.zeros((h, w), dtype=bool)
+
+    boxes = preds[keep, :4]
+    xyxy = np.concatenate([boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, :2] + boxes[:, 2:] / 2], axis=1)
+    kept = cv2.dnn.NMSBoxes(
+        np.concatenate([xyxy[:, :2], boxes[:, 2:]], axis=1).tolist(),
+        scores[keep, person_class].tolist(),
+        float(config["conf"]),
+        iou_threshold,
+    )
+    kept = np.asarray(kept, dtype=np.int64).reshape(-1)
+    coeffs = preds[keep, 4 + num_classes:][kept]
+    xyxy = xyxy[kept]
+
+    masks = (coeffs @ protos.reshape(num_coeffs, -1)).reshape(-1, proto_h, proto_w)
+
+    # Boxes are in input pixels; the prototypes cover the input at lower resolution.
+    size, scale, left, top = letterbox
+    ratio = proto_w / float(size)
+    cols = np.arange(proto_w, dtype=np.float32)[None, None, :]
+    rows = np.arange(proto_h, dtype=np.float32)[None, :, None]
+    x1, y1, x2, y2 = (xyxy[:, i, None, None] * ratio for i in range(4))
+    masks *= (cols >= x1) & (cols < x2) & (rows >= y1) & (rows < y2)
+
+    # Only the part of the prototypes that covers the frame is upsampled.
+    x0, y0 = left * ratio, top * ratio
+    region = masks[
+        :,
+        int(y0):int(np.ceil(y0 + h * scale * ratio)),
+        int(x0):int(np.ceil(x0 + w * scale * ratio)),
+    ]
     person_mask = np.zeros((h, w), dtype=bool)
+    for mask in region:
+        person_mask |= cv2.resize(mask, (w, h), interpolation=cv2.INTER_LINEAR) > 0
+    return _close_person_mask(person_mask)
+
 
+def detect_person_masks(
+    images: List[np.ndarray],
+    model: Any,
+    target_size: Tuple[int, int],
+    config: Dict[str, object],
+) -> List[np.ndarray]:
+    """
+    Person masks for a batch of frames, with a single YOLO call per
+    ``segmentation_batch_size`` frames.
+    """
     if config.get("person_segmentation") == "heuristic":
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        v = hsv[..., 2]
-        mask = (v < 130).astype(np.uint8) * 255
+        return [_heuristic_person_mask(img) for img in images]
+    if config.get("person_segmentation") == "onnx":
+        input_size = int(config["onnx_input_size"])
+        return [decode_person_segments(*model(img, input_size), target_size, config) for img in images]
+
+    batch_size = int(config["segmentation_batch_size"])
+    masks = []
+    for start in range(0, len(images), batch_size):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            results = model(images[start:start + batch_size], conf=float(config["conf"]), verbose=False)
+        masks.extend(_merge_person_segments(r, target_size, config) for r in results)
+    return masks
+
 
-        k_close = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (31, 31))
-        k_open = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
-        k_dilate = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (21, 21))
+def detect_person_mask(
+    img: np.ndarray,
+    model: Any,
+    target_size: Tuple[int, int],
+    config: Dict[str, object],
+) -> np.ndarray:
+    return detect_person_masks([img], model, target_size, config)[0]
 
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, k_close, iterations=1)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, k_open, iterations=1)
 
-        num, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
-        cleaned = np.zeros_like(mask)
-        if num > 1:
-            areas = stats[1:, cv2.CC_STAT_AREA]
-            largest = 1 + int(np.argmax(areas))
-            if stats[largest, cv2.CC_STAT_AREA] < 0.7 * mask.size:
-                cleaned[labels == largest] = 255
+# Pyramid level -> (keypoints as an (K, 7) float32 array, ORB descriptors).
+ReferenceFeatures = Dict[int, Tuple[np.ndarray, Optional[np.ndarray]]]
 
-        cleaned = cv2.dilate(cleaned, k_dilate, iterations=1)
-        return cleaned.astype(bool)
 
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        results = model(img, conf=float(config["conf"]), verbose=False)
+def _pack_level(kp, des) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    points = np.float32([(k.pt[0], k.pt[1], k.size, k.angle, k.response, k.octave, k.class_id) for k in kp])
+    return points.reshape(-1, 7), des
 
-    for r in results:
-        if not hasattr(r, "masks") or r.masks is None:
-            continue
-        for j, seg in enumerate(r.masks.data):
-            cls = int(r.boxes.cls[j])
-            if cls != int(config["person_class"]):
-                continue
-            seg_np = cv2.resize(seg.cpu().numpy(), (w, h), interpolation=cv2.INTER_LINEAR)
-            person_mask |= (seg_np > 0.5)
 
-    if person_mask.any():
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-        person_mask = cv2.morphologyEx(person_mask.astype(np.uint8), cv2.MORPH_CLOSE, kernel).astype(bool)
+def _unpack_level(level: Tuple[np.ndarray, Optional[np.ndarray]]):
+    points, des = level
+    kp = tuple(
+        cv2.KeyPoint(float(x), float(y), float(size), float(angle), float(response), int(octave), int(class_id))
+        for x, y, size, angle, response, octave, class_id in points
+    )
+    return kp, des
 
-    return person_mask
 
+def reference_features(
+    ref: np.ndarray,
+    config: Dict[str, object],
+    cached: Optional[ReferenceFeatures] = None,
+) -> ReferenceFeatures:
+    """
+    Reference ORB features for every pyramid level the alignment mode needs,
+    reusing ``cached`` levels and computing only the missing ones.
+    """
+    levels = {0}
+    if config["alignment_mode"] == "pyramid":
+        levels = {int(config["pyramid_levels"])}
+        if config["pyramid_refine"]:
+            levels.add(0)
 
-def estimate_background(stack: np.ndarray, bg_mask_stack: np.ndarray) -> np.ndarray:
-    masked_bg = np.where(bg_mask_stack[..., None], stack.astype(np.float32), np.nan)
+    features = dict(cached or {})
+    missing = levels - set(features)
+    if missing:
+        orb = cv2.ORB_create(int(config["orb_features"]))
+        ref_gray = cv2.cvtColor(ref, cv2.COLOR_BGR2GRAY)
+        for level in missing:
+            gray = _downscale(ref_gray, 0.5 ** level) if level else ref_gray
+            features[level] = _pack_level(*orb.detectAndCompute(gray, None))
+    return features
+
+
+def dump_reference_features(features: ReferenceFeatures) -> bytes:
+    arrays = {}
+    for level, (points, des) in features.items():
+        arrays[f"kp_{level}"] = points
+        if des is not None:
+            arrays[f"des_{level}"] = des
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def load_reference_features(data: bytes) -> ReferenceFeatures:
+    features = {}
+    with np.load(io.BytesIO(bytes(data))) as arrays:
+        for key in arrays.files:
+            if key.startswith("kp_"):
+                level = int(key[3:])
+                des_key = f"des_{level}"
+                features[level] = (arrays[key], arrays[des_key] if des_key in arrays.files else None)
+    return features
+
+
+def calibration_thumbnail(frame: np.ndarray) -> np.ndarray:
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, CALIBRATION_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def calibration_matches(cached: np.ndarray, frame: np.ndarray, config: Dict[str, object]) -> bool:
+    """
+    Cheap check that ``frame`` shows the same scene as the cached thumbnail.
+
+    The thumbnails must not be shifted against each other by more than a
+    pixel, and their median absolute difference, which ignores the presenter
+    and new ink, must stay below ``calibration_max_diff``.
+    """
+    thumbnail = calibration_thumbnail(frame)
+    (dx, dy), _ = cv2.phaseCorrelate(cached.astype(np.float32), thumbnail.astype(np.float32))
+    if max(abs(dx), abs(dy)) > 1.0:
+        return False
+    diff = cv2.absdiff(cached, thumbnail)
+    return float(np.median(diff)) <= float(config["calibration_max_diff"])
+
+
+class FrameProcessor:
+    """
+    Aligns frames to a reference image and segments the people in them.
+
+    Holds its own ORB detector, matcher and model, so each pool worker builds
+    one instead of sharing OpenCV or YOLO objects across threads.
+
+    In ``pyramid`` alignment mode features are matched on a frame downscaled
+    by ``2 ** pyramid_levels`` and the homography is scaled back up, then
+    optionally refined against full-resolution features. Frames whose
+    transform moves no corner by more than ``identity_tolerance_px`` are not
+    warped.
+    """
+
+    def __init__(
+        self,
+        ref: np.ndarray,
+        model: Any,
+        config: Dict[str, object],
+        features: Optional[ReferenceFeatures] = None,
+    ):
+        self.config = config
+        self.target_size = ref.shape[:2]
+        self.orb = cv2.ORB_create(int(config["orb_features"]))
+        self.bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+        self.model = model
+
+        self.pyramid = config["alignment_mode"] == "pyramid"
+        self.refine = self.pyramid and bool(config["pyramid_refine"])
+        self.scale = 0.5 ** int(config["pyramid_levels"]) if self.pyramid else 1.0
+
+        self.features = reference_features(ref, config, features)
+        self.ref_kp = self.ref_des = None
+        if not self.pyramid or self.refine:
+            self.ref_kp, self.ref_des = _unpack_level(self.features[0])
+        if self.pyramid:
+            self.ref_small_kp, self.ref_small_des = _unpack_level(self.features[int(config["pyramid_levels"])])
+
+    def _homography(self, gray: np.ndarray) -> Tuple[Optional[np.ndarray], Optional[float]]:
+        if not self.pyramid:
+            return estimate_homography(gray, self.ref_kp, self.ref_des, self.orb, self.bf, self.config)
+
+        H, inlier_ratio = estimate_homography(
+            _downscale(gray, self.scale), self.ref_small_kp, self.ref_small_des, self.orb, self.bf, self.config
+        )
+        if H is None:
+            return None, None
+        H = _upscale_homography(H, self.scale)
+
+        if self.refine:
+            h, w = self.target_size
+            warped = cv2.warpPerspective(gray, H, (w, h), flags=cv2.INTER_LINEAR)
+            residual, refined_ratio = estimate_homography(
+                warped, self.ref_kp, self.ref_des, self.orb, self.bf, self.config
+            )
+            if residual is not None:
+                H = residual @ H
+                inlier_ratio = refined_ratio
+        return H, inlier_ratio
+
+    def align(self, img: np.ndarray) -> Tuple[np.ndarray, Dict[str, object]]:
+        started = time.perf_counter()
+        h, w = self.target_size
+        H, inlier_ratio = self._homography(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+
+        aligned = img
+        if H is not None:
+            skip = img.shape[:2] == (h, w) and _is_near_identity(
+                H, (w, h), float(self.config["identity_tolerance_px"])
+            )
+            if not skip:
+                aligned = cv2.warpPerspective(img, H, (w, h), flags=cv2.INTER_LINEAR)
 
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        background = np.nanmedian(masked_bg, axis=0)
+        stats = {
+            "ms": round((time.perf_counter() - started) * 1000.0, 2),
+            "inlier_ratio": None if inlier_ratio is None else round(inlier_ratio, 4),
+        }
+        return aligned, stats
 
-    nan_mask = np.isnan(background[..., 0])
-    background = np.nan_to_num(background, nan=255).astype(np.uint8)
+    def process(
+        self,
+        images: List[np.ndarray],
+    ) -> Tuple[List[np.ndarray], List[np.ndarray], List[Dict[str, object]]]:
+        h, w = self.target_size
+        results = [self.align(img) for img in images]
+        aligned = [frame for frame, _ in results]
+        stats = [frame_stats for _, frame_stats in results]
+        return aligned, detect_person_masks(aligned, self.model, (h, w), self.config), stats
 
-    if nan_mask.any():
-        background = cv2.inpaint(background, nan_mask.astype(np.uint8), 3, cv2.INPAINT_TELEA)
 
+_worker_state = threading.local()
+
+
+class _SharedModel:
+    """Serialises calls to one segmentation model shared by worker threads."""
+
+    def __init__(self, model: Any):
+        self.model = model
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            return self.model(*args, **kwargs)
+
+
+def _init_frame_worker(
+    ref: np.ndarray,
+    model: Any,
+    model_path: Optional[str],
+    config: Dict[str, object],
+    features: Optional[ReferenceFeatures],
+) -> None:
+    if model is None and model_path:
+        model = get_yolo_model(model_path)
+    _worker_state.processor = FrameProcessor(ref, model, config, features)
+
+
+def _process_frame_batch(
+    indices: range,
+    images: List[np.ndarray],
+) -> Tuple[range, List[np.ndarray], List[np.ndarray], List[Dict[str, object]]]:
+    return (indices, *_worker_state.processor.process(images))
+
+
+def _process_frame_batch_args(args: Tuple[range, List[np.ndarray]]):
+    return _process_frame_batch(*args)
+
+
+def iter_processed_frames(
+    images: List[np.ndarray],
+    model_path: Optional[str],
+    config: Dict[str, object],
+    features: Optional[ReferenceFeatures] = None,
+) -> Iterator[Tuple[range, List[np.ndarray], List[np.ndarray], List[Dict[str, object]]]]:
+    """
+    Align and segment ``images`` against ``images[0]``, yielding
+    ``(indices, aligned, person_masks, alignment_stats)`` batches.
+
+    With ``parallelism`` set to ``thread`` or ``process`` the batches run on a
+    pool of ``parallel_workers`` and are yielded as they complete, not in
+    frame order. Threads share one model and take turns segmenting; the
+    process pool is billiard's, which also starts from daemonic Celery
+    prefork workers.
+    """
+    total = len(images)
+    batch_size = int(config["segmentation_batch_size"])
+    parallelism = config["parallelism"]
+
+    if parallelism == "serial":
+        model = get_yolo_model(model_path) if model_path else None
+        processor = FrameProcessor(images[0], model, config, features)
+        for start in range(0, total, batch_size):
+            indices = range(start, min(start + batch_size, total))
+            yield (indices, *processor.process([images[i] for i in indices]))
+        return
+
+    workers = int(config["parallel_workers"])
+    # Smaller batches keep every worker busy when there are few frames.
+    batch_size = max(1, min(batch_size, math.ceil(total / workers)))
+    batches = [range(start, min(start + batch_size, total)) for start in range(0, total, batch_size)]
+
+    if parallelism == "thread":
+        model = _SharedModel(get_yolo_model(model_path)) if model_path else None
+        with ThreadPoolExecutor(
+            max_workers=workers,
+            initializer=_init_frame_worker,
+            initargs=(images[0], model, None, config, features),
+        ) as pool:
+            # Frames are only fetched from ``images`` for the batches in
+            # flight, so lazily loaded frames are not all decoded up front.
+            pending = set()
+            for indices in batches:
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(pool.submit(_process_frame_batch, indices, [images[i] for i in indices]))
+            for future in as_completed(pending):
+                yield future.result()
+        return
+
+    from billiard.pool import Pool
+
+    pool = Pool(
+        processes=workers,
+        initializer=_init_frame_worker,
+        initargs=(images[0], None, model_path, config, features),
+    )
+    try:
+        yield from pool.imap_unordered(
+            _process_frame_batch_args,
+            ((indices, [images[i] for i in indices]) for indices in batches),
+        )
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def frame_stack_bytes(total_frames: int, h: int, w: int) -> int:
+    """Bytes used by the frame, person-mask and background-mask stacks."""
+    return total_frames * h * w * (3 + 1 + 1)
+
+
+def allocate_stack(
+    shape: Tuple[int, ...],
+    dtype,
+    fill=0,
+    scratch_dir: Optional[str] = None,
+    name: str = "stack",
+) -> np.ndarray:
+    """
+    A ``shape`` array set to ``fill``, in RAM or, with ``scratch_dir``, as an
+    ``np.memmap`` file there so the OS can page it out instead of the worker
+    being OOM-killed.
+    """
+    if scratch_dir is None:
+        return np.full(shape, fill, dtype=dtype)
+
+    # New memmap files read as zeros, so only other fill values are written.
+    stack = np.memmap(os.path.join(scratch_dir, f"{name}.dat"), dtype=dtype, mode="w+", shape=shape)
+    if fill:
+        stack[:] = fill
+    return stack
+
+
+def fill_missing_background(background: np.ndarray, missing: np.ndarray) -> np.ndarray:
+    if missing.any():
+        background = cv2.inpaint(background, missing.astype(np.uint8), 3, cv2.INPAINT_TELEA)
     return background
 
 
+def masked_median(
+    values: np.ndarray,
+    mask: np.ndarray,
+    chunk_rows: int = 64,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Median of uint8 ``values`` along axis 0, counting only samples where
+    ``mask`` is set. ``mask`` has the shape of ``values`` minus an optional
+    trailing channel axis.
+
+    Returns the median (255 where a position has no samples) and the mask of
+    positions with at least one sample. Even sample counts round down, which
+    matches casting ``np.nanmedian`` output to uint8.
+    """
+    has_channels = values.ndim == mask.ndim + 1
+    counts = mask.sum(axis=0, dtype=np.int32)
+    sampled = counts > 0
+    last = values.shape[0] - 1
+
+    median = np.empty(values.shape[1:], dtype=np.uint8)
+    for start in range(0, values.shape[1], chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        chunk_mask = mask[:, rows]
+        k = counts[rows]
+        if has_channels:
+            chunk_mask = chunk_mask[..., None]
+            k = k[..., None]
+
+        # Unsampled entries become 255, which sorts after (or ties with) every
+        # real sample, so the first k sorted entries are exactly the samples.
+        chunk = np.where(chunk_mask, values[:, rows], np.uint8(255))
+        chunk.sort(axis=0)
+
+        lo = np.take_along_axis(chunk, (np.maximum(k - 1, 0) // 2)[None], axis=0)[0]
+        hi = np.take_along_axis(chunk, np.minimum(k // 2, last)[None], axis=0)[0]
+        mid = ((lo.astype(np.uint16) + hi) // 2).astype(np.uint8)
+        median[rows] = np.where(k > 0, mid, np.uint8(255))
+
+    return median, sampled
+
+
+def estimate_background(stack: np.ndarray, bg_mask_stack: np.ndarray) -> np.ndarray:
+    median, sampled = masked_median(stack, bg_mask_stack)
+    return fill_missing_background(median, ~sampled)
+
+
+def estimate_background_and_strokes(
+    stack: np.ndarray,
+    bg_mask_stack: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Background and stroke colours from a single median pass.
+
+    Stroke colours are the median over frames where the pixel is not covered by
+    a person, which is the same sample set as the background, so the
+    un-inpainted median serves as the stroke colour for every ink pixel.
+    """
+    median, sampled = masked_median(stack, bg_mask_stack)
+    background = fill_missing_background(median, ~sampled)
+    return background, median
+
+
+class StreamingBackgroundEstimator:
+    """Per-pixel median from ``bins``-bucket histograms of frames folded in one at a time."""
+
+    max_frames = 255
+
+    def __init__(self, shape: Tuple[int, int], bins: int = 16):
+        if bins not in STREAMING_BIN_CHOICES:
+            raise ValueError(f"Unsupported histogram bin count: {bins}")
+        h, w = shape
+        self.bins = bins
+        self.frames = 0
+        self._shift = 8 - (bins.bit_length() - 1)
+        self._hist = np.zeros((h, w, 3, bins), dtype=np.uint8)
+        self._counts = np.zeros((h, w), dtype=np.uint8)
+        # Bound the interpolation inside a bucket, so boards whose samples
+        # sit in a narrow range (or at 0 and 255) come back unbiased.
+        self._min = np.full((h, w, 3), 255, dtype=np.uint8)
+        self._max = np.zeros((h, w, 3), dtype=np.uint8)
+
+    def update(self, frame: np.ndarray, mask: np.ndarray) -> None:
+        if self.frames >= self.max_frames:
+            raise ValueError(f"Streaming background supports at most {self.max_frames} frames")
+        self.frames += 1
+
+        pixels = np.flatnonzero(mask)
+        if pixels.size == 0:
+            return
+
+        samples = frame.reshape(-1, 3)[pixels]
+        flat = (pixels[:, None] * 3 + np.arange(3)) * self.bins + (samples >> self._shift)
+        self._hist.reshape(-1)[flat.ravel()] += 1
+        self._counts.reshape(-1)[pixels] += 1
+        lows, highs = self._min.reshape(-1, 3), self._max.reshape(-1, 3)
+        lows[pixels] = np.minimum(lows[pixels], samples)
+        highs[pixels] = np.maximum(highs[pixels], samples)
+
+    def _rank_value(self, c: int, rank: np.ndarray, cum: np.ndarray) -> np.ndarray:
+        """Estimated ``rank``-th smallest sample of channel ``c``, spreading each bucket's samples evenly over it."""
+        width = 256 // self.bins
+        k = np.argmax(cum > rank[..., None], axis=-1)[..., None]
+        in_bin = np.take_along_axis(self._hist[:, :, c, :], k, axis=-1)[..., 0].astype(np.float32)
+        below = np.take_along_axis(cum, k, axis=-1)[..., 0] - in_bin
+        k = k[..., 0].astype(np.float32)
+        low = np.maximum(k * width, self._min[..., c])
+        high = np.minimum(k * width + width - 1, self._max[..., c])
+        return low + (high - low) * (rank - below + 0.5) / np.maximum(in_bin, 1.0)
+
+    def median(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the per-pixel median (255 where unsampled) and the sampled-pixel mask."""
+        valid = self._counts > 0
+        counts = self._counts.astype(np.int32)
+        lower = np.maximum(counts - 1, 0) // 2
+        upper = counts // 2
+
+        median = np.full(self._counts.shape + (3,), 255, dtype=np.uint8)
+        for c in range(3):
+            cum = np.cumsum(self._hist[:, :, c, :], axis=-1, dtype=np.uint8)
+            lo = np.clip(np.rint(self._rank_value(c, lower, cum)), 0, 255)
+            hi = np.clip(np.rint(self._rank_value(c, upper, cum)), 0, 255)
+            # Even sample counts round down, as in ``masked_median``.
+            median[..., c] = np.where(valid, (lo + hi) // 2, 255).astype(np.uint8)
+
+        return median, valid
+
+    def background(self) -> np.ndarray:
+        median, valid = self.median()
+        return fill_missing_background(median, ~valid)
+
+
+class OnlineBackgroundModel:
+    """
+    Running per-pixel background for live boards, updated one frame at a time.
+
+    A pixel's first samples are averaged; once ``1 / (n + 1)`` drops below
+    ``alpha`` it becomes an exponential moving average, so new strokes show up
+    within a few frames and the state stays two uint8 arrays however long the
+    session runs.
+    """
+
+    def __init__(self, background: np.ndarray, counts: np.ndarray, alpha: float):
+        self.alpha = float(alpha)
+        self._background = background
+        self._counts = counts
+
+    @classmethod
+    def empty(cls, shape: Tuple[int, int], alpha: float) -> "OnlineBackgroundModel":
+        h, w = shape
+        return cls(np.full((h, w, 3), 255, dtype=np.uint8), np.zeros((h, w), dtype=np.uint8), alpha)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self._counts.shape
+
+    def update(self, frame: np.ndarray, mask: np.ndarray) -> None:
+        pixels = np.flatnonzero(mask)
+        if pixels.size == 0:
+            return
+
+        counts = self._counts.reshape(-1)
+        weight = np.maximum(1.0 / (counts[pixels].astype(np.float32) + 1.0), self.alpha)[:, None]
+        current = self._background.reshape(-1, 3)[pixels].astype(np.float32)
+        samples = frame.reshape(-1, 3)[pixels].astype(np.float32)
+        self._background.reshape(-1, 3)[pixels] = np.clip(np.rint(current + weight * (samples - current)), 0, 255)
+        counts[pixels] = np.minimum(counts[pixels].astype(np.uint16) + 1, 255)
+
+    def current(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the running background (255 where unsampled) and the sampled-pixel mask."""
+        return self._background.copy(), self._counts > 0
+
+    def background(self) -> np.ndarray:
+        current, valid = self.current()
+        return fill_missing_background(current, ~valid)
+
+
+def dump_live_state(
+    board: OnlineBackgroundModel,
+    bbox: Tuple[int, int, int, int],
+    features: ReferenceFeatures,
+) -> bytes:
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        background=board._background,
+        counts=board._counts,
+        bbox=np.int64(bbox),
+        features=np.frombuffer(dump_reference_features(features), np.uint8),
+    )
+    return buffer.getvalue()
+
+
+def load_live_state(
+    data: bytes,
+    alpha: float,
+) -> Tuple[OnlineBackgroundModel, Tuple[int, int, int, int], ReferenceFeatures]:
+    with np.load(io.BytesIO(bytes(data))) as arrays:
+        board = OnlineBackgroundModel(arrays["background"], arrays["counts"], alpha)
+        bbox = tuple(int(v) for v in arrays["bbox"])
+        features = load_reference_features(arrays["features"].tobytes())
+    return board, bbox, features
+
+
 def detect_ink_mask(background: np.ndarray, config: Dict[str, object]) -> np.ndarray:
     gray_bg = cv2.cvtColor(background, cv2.COLOR_BGR2GRAY)
     gray_bg = cv2.bilateralFilter(gray_bg, 5, 50, 50)
@@ -200,22 +987,136 @@ def detect_ink_mask(background: np.ndarray, config: Dict[str, object]) -> np.nda
     return ink_mask.astype(bool)
 
 
-def estimate_stroke_colors(
+def use_tiling(shape: Tuple[int, int], config: Dict[str, object]) -> bool:
+    if config["tiling"] == "auto":
+        # Boards that fit in a couple of tiles gain nothing from splitting.
+        return max(shape) > 2 * int(config["tile_size"])
+    return config["tiling"] == "on"
+
+
+def ink_tile_halo(config: Dict[str, object]) -> int:
+    """
+    Border needed around a tile so ``detect_ink_mask`` gives the same result
+    in the tile interior as on the whole board: the bilateral filter and the
+    adaptive threshold window reach past the pixel they produce, and so do
+    the erosion and the dilation of each morphology pass.
+    """
+    return 2 + int(config["adaptive_block_size"]) // 2 + 2 * (int(config["morph_kernel_size"]) // 2) + 2
+
+
+def tile_grid(shape: Tuple[int, int], tile_size: int, halo: int = 0) -> List[Tuple[Tuple[slice, slice], Tuple[slice, slice]]]:
+    """
+    Split a ``shape`` board into tiles of at most ``tile_size`` pixels a side.
+
+    Returns ``(outer, inner)`` slice pairs: ``outer`` is the tile grown by
+    ``halo`` (clipped to the board) and ``inner`` locates the tile itself
+    inside ``outer``.
+    """
+    h, w = shape
+    tiles = []
+    for y0 in range(0, h, tile_size):
+        y1 = min(y0 + tile_size, h)
+        oy0, oy1 = max(0, y0 - halo), min(h, y1 + halo)
+        for x0 in range(0, w, tile_size):
+            x1 = min(x0 + tile_size, w)
+            ox0, ox1 = max(0, x0 - halo), min(w, x1 + halo)
+            tiles.append((
+                (slice(oy0, oy1), slice(ox0, ox1)),
+                (slice(y0 - oy0, y1 - oy0), slice(x0 - ox0, x1 - ox0)),
+            ))
+    return tiles
+
+
+def _run_tiles(func, tiles, workers: int) -> None:
+    if workers <= 1 or len(tiles) <= 1:
+        for tile in tiles:
+            func(tile)
+        return
+    # numpy sorts and OpenCV filters release the GIL, so threads are enough
+    # and the tiles can write straight into shared output arrays.
+    with ThreadPoolExecutor(max_workers=min(workers, len(tiles))) as pool:
+        for future in as_completed([pool.submit(func, tile) for tile in tiles]):
+            future.result()
+
+
+def tiled_background_and_strokes(
     stack: np.ndarray,
-    ink_mask: np.ndarray,
-    person_mask_stack: np.ndarray,
-) -> np.ndarray:
-    stroke_mask = ink_mask[None, ...] & (~person_mask_stack)
-    stroke_mask_rgb = np.repeat(stroke_mask[..., None], 3, axis=3)
-    stroke_stack = np.where(stroke_mask_rgb, stack.astype(np.float32), np.nan)
+    bg_mask_stack: np.ndarray,
+    config: Dict[str, object],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ``estimate_background_and_strokes`` computed tile by tile in parallel.
+
+    The median is per pixel, so tiles need no halo. Inpainting the unsampled
+    pixels runs once on the stitched board, since holes can cross tiles.
+    """
+    median = np.empty(stack.shape[1:], dtype=np.uint8)
+    sampled = np.empty(stack.shape[1:3], dtype=bool)
+
+    def run(tile):
+        (ys, xs), _ = tile
+        median[ys, xs], sampled[ys, xs] = masked_median(stack[:, ys, xs], bg_mask_stack[:, ys, xs])
+
+    _run_tiles(run, tile_grid(stack.shape[1:3], int(config["tile_size"])), int(config["parallel_workers"]))
+    background = fill_missing_background(median, ~sampled)
+    return background, median
+
+
+def tiled_ink_mask(background: np.ndarray, config: Dict[str, object]) -> np.ndarray:
+    """``detect_ink_mask`` over halo-padded tiles, stitched from the tile interiors."""
+    ink_mask = np.empty(background.shape[:2], dtype=bool)
+
+    def run(tile):
+        (oys, oxs), (iys, ixs) = tile
+        ys = slice(oys.start + iys.start, oys.start + iys.stop)
+        xs = slice(oxs.start + ixs.start, oxs.start + ixs.stop)
+        ink_mask[ys, xs] = detect_ink_mask(background[oys, oxs], config)[iys, ixs]
+
+    tiles = tile_grid(background.shape[:2], int(config["tile_size"]), ink_tile_halo(config))
+    _run_tiles(run, tiles, int(config["parallel_workers"]))
+    return ink_mask
 
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        stroke_color = np.nanmedian(stroke_stack, axis=0)
 
-    stroke_color = np.where(np.isnan(stroke_color), 255, stroke_color).astype(np.uint8)
+def dirty_tiles(previous: Optional[np.ndarray], canvas: np.ndarray, tile_size: int) -> List[Tuple[int, int]]:
+    """
+    ``(row, col)`` of every ``tile_size`` tile of ``canvas`` that differs from
+    ``previous``; all tiles when there is no previous canvas of the same size.
+    """
+    h, w = canvas.shape[:2]
+    rows, cols = math.ceil(h / tile_size), math.ceil(w / tile_size)
+    if previous is None or previous.shape != canvas.shape:
+        return [(row, col) for row in range(rows) for col in range(cols)]
 
-    return stroke_color
+    changed = previous != canvas
+    if changed.ndim == 3:
+        changed = changed.any(axis=2)
+    padded = np.zeros((rows * tile_size, cols * tile_size), dtype=bool)
+    padded[:h, :w] = changed
+    per_tile = padded.reshape(rows, tile_size, cols, tile_size).any(axis=(1, 3))
+    return [(int(row), int(col)) for row, col in zip(*np.nonzero(per_tile))]
+
+
+def deep_zoom_levels(image: np.ndarray) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Yield ``(level, image)`` from full resolution down to 1x1, Deep Zoom
+    style: the top level is the image itself and each level below halves
+    both sides, rounding up.
+    """
+    h, w = image.shape[:2]
+    level = math.ceil(math.log2(max(h, w, 1)))
+    while True:
+        yield level, image
+        if level == 0:
+            return
+        level -= 1
+        h, w = max(1, math.ceil(h / 2)), max(1, math.ceil(w / 2))
+        image = cv2.resize(image, (w, h), interpolation=cv2.INTER_AREA)
+
+
+def resize_to_width(image: np.ndarray, width: int) -> np.ndarray:
+    h, w = image.shape[:2]
+    height = max(1, round(h * width / w))
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
 
 
 def render_canvas(background: np.ndarray, ink_mask: np.ndarray, stroke_color: np.ndarray) -> np.ndarray:
@@ -224,8 +1125,174 @@ def render_canvas(background: np.ndarray, ink_mask: np.ndarray, stroke_color: np
     return canvas
 
 
+def _farthest_point_centers(samples: np.ndarray, weights: np.ndarray, k: int) -> np.ndarray:
+    # Deterministic seeding: start at the most common colour, then keep adding
+    # the sample farthest from every chosen centre.
+    centers = [samples[int(np.argmax(weights))]]
+    dist = ((samples - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        centers.append(samples[int(np.argmax(dist))])
+        dist = np.minimum(dist, ((samples - centers[-1]) ** 2).sum(axis=1))
+    return np.array(centers, dtype=np.float32)
+
+
+def _nearest_center(colors: np.ndarray, centers: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    labels = np.empty(len(colors), dtype=np.intp)
+    for start in range(0, len(colors), chunk):
+        block = colors[start:start + chunk]
+        labels[start:start + chunk] = ((block[:, None, :] - centers[None]) ** 2).sum(axis=2).argmin(axis=1)
+    return labels
+
+
+def quantize_colors(
+    colors: np.ndarray,
+    max_colors: int,
+    iterations: int = 10,
+    max_samples: int = 20000,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cluster ``(N, 3)`` uint8 colours into at most ``max_colors`` with k-means.
+
+    The clustering runs on the distinct colours weighted by how often they
+    occur (an evenly strided subset of at most ``max_samples`` of them when
+    there are more), then every distinct colour is assigned to its nearest
+    centre. Returns the ``(K, 3)`` uint8 palette and the ``(N,)`` labels.
+    """
+    packed = (colors[:, 0].astype(np.int32) << 16) | (colors[:, 1].astype(np.int32) << 8) | colors[:, 2]
+    keys, inverse, counts = np.unique(packed, return_inverse=True, return_counts=True)
+    unique = np.stack([keys >> 16, (keys >> 8) & 0xFF, keys & 0xFF], axis=1).astype(np.float32)
+    if len(unique) <= max_colors:
+        return unique.astype(np.uint8), inverse.reshape(-1)
+
+    step = max(1, len(unique) // max_samples)
+    samples, weights = unique[::step], counts[::step].astype(np.float32)
+    centers = _farthest_point_centers(samples, weights, max_colors)
+    for _ in range(iterations):
+        labels = _nearest_center(samples, centers)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, samples * weights[:, None])
+        totals = np.bincount(labels, weights=weights, minlength=len(centers))[:, None]
+        updated = np.where(totals > 0, sums / np.maximum(totals, 1e-6), centers).astype(np.float32)
+        if np.allclose(updated, centers, atol=0.5):
+            break
+        centers = updated
+
+    unique_labels = _nearest_center(unique, centers)
+    used = np.unique(unique_labels)
+    remap = np.zeros(len(centers), dtype=np.intp)
+    remap[used] = np.arange(len(used))
+    palette = np.clip(np.rint(centers[used]), 0, 255).astype(np.uint8)
+    return palette, remap[unique_labels][inverse.reshape(-1)]
+
+
+def quantize_canvas(
+    ink_mask: np.ndarray,
+    stroke_color: np.ndarray,
+    max_colors: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Palette version of ``render_canvas``: ``(indices, palette)`` where index 0
+    is white and the ink pixels use up to ``max_colors`` clustered stroke
+    colours. ``palette[indices]`` is the BGR canvas.
+    """
+    indices = np.zeros(ink_mask.shape, dtype=np.uint8)
+    palette = np.full((1, 3), 255, dtype=np.uint8)
+    if ink_mask.any():
+        strokes, labels = quantize_colors(stroke_color[ink_mask], max_colors)
+        palette = np.vstack([palette, strokes])
+        indices[ink_mask] = labels + 1
+    return indices, palette
+
+
+def trace_strokes(
+    indices: np.ndarray,
+    palette: np.ndarray,
+    epsilon: float = 1.0,
+) -> List[Tuple[np.ndarray, List[np.ndarray]]]:
+    """
+    Outline the ink (every non-zero palette index) as polygons grouped by
+    colour.
+
+    Each connected stroke is traced as a whole and takes the palette colour
+    most of its pixels have, so quantization noise inside a stroke does not
+    split it into fragments. Returns ``(bgr_color, polygons)`` per colour,
+    each polygon an ``(M, 2)`` int array simplified with Douglas-Peucker at
+    ``epsilon`` pixels. Holes are separate polygons, so fill them even-odd.
+    """
+    ink = (indices > 0).astype(np.uint8)
+    count, labels = cv2.connectedComponents(ink, connectivity=8)
+    if len(palette) == 1 or count <= 1:
+        # A blank board: no strokes to trace.
+        return []
+    votes = np.bincount(labels.ravel() * len(palette) + indices.ravel(), minlength=count * len(palette))
+    stroke_index = votes.reshape(count, len(palette))[:, 1:].argmax(axis=1) + 1
+
+    contours, hierarchy = cv2.findContours(ink, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    polygons: Dict[int, List[np.ndarray]] = {}
+    for i, contour in enumerate(contours):
+        parent = hierarchy[0][i][3]
+        x, y = contours[i if parent < 0 else parent][0][0]
+        if epsilon > 0:
+            contour = cv2.approxPolyDP(contour, epsilon, True)
+        polygons.setdefault(int(stroke_index[labels[y, x]]), []).append(contour.reshape(-1, 2))
+    return [(palette[index], polygons[index]) for index in sorted(polygons)]
+
+
+def strokes_to_svg(strokes: List[Tuple[np.ndarray, List[np.ndarray]]], width: int, height: int) -> bytes:
+    """One even-odd filled ``<path>`` per colour on a white ``width`` x ``height`` board."""
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" '
+        f'width="{width}" height="{height}">',
+        f'<rect width="{width}" height="{height}" fill="#fff"/>',
+        # Outlines run through the centres of the edge pixels; the shift and
+        # a 1 px stroke in the fill colour widen them to the pixel edges, so
+        # 1-2 px pen lines keep their width instead of collapsing.
+        '<g transform="translate(.5 .5)" stroke-width="1" stroke-linejoin="round" stroke-linecap="square">',
+    ]
+    for (b, g, r), polygons in strokes:
+        color = f"#{int(r):02x}{int(g):02x}{int(b):02x}"
+        # Coordinate pairs after a moveto are implicit linetos.
+        d = "".join("M" + " ".join(f"{x} {y}" for x, y in polygon) + "Z" for polygon in polygons)
+        parts.append(f'<path fill="{color}" stroke="{color}" fill-rule="evenodd" d="{d}"/>')
+    parts.append("</g></svg>")
+    return "".join(parts).encode("ascii")
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def encode_indexed_png(indices: np.ndarray, palette: np.ndarray, level: int = 6) -> bytes:
+    """
+    Encode a palette image as an indexed PNG, 4 bits per pixel when the BGR
+    ``palette`` has at most 16 colours and 8 bits otherwise.
+    """
+    h, w = indices.shape
+    bit_depth = 4 if len(palette) <= 16 else 8
+    rows = indices
+    if bit_depth == 4:
+        if w % 2:
+            rows = np.pad(rows, ((0, 0), (0, 1)))
+        rows = (rows[:, 0::2] << 4) | rows[:, 1::2]
+    # Filter type 0 on every row: the PNG spec recommends no filtering for palette images.
+    raw = np.hstack([np.zeros((h, 1), dtype=np.uint8), rows.astype(np.uint8)])
+
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, bit_depth, 3, 0, 0, 0)),
+        _png_chunk(b"PLTE", palette[:, ::-1].astype(np.uint8).tobytes()),
+        _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), level)),
+        _png_chunk(b"IEND", b""),
+    ])
+
+
 def encode_image(image: np.ndarray, ext: str, params=None) -> bytes:
     success, buffer = cv2.imencode(ext, image, params or [])
     if not success:
         raise ValueError("Failed to encode image")
     return buffer.tobytes()
+
+
+def encode_lossless_webp(image: np.ndarray) -> bytes:
+    # OpenCV switches WebP to lossless mode for quality values above 100.
+    return encode_image(image, ".webp", [cv2.IMWRITE_WEBP_QUALITY, 101])
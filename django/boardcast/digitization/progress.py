@@ -0,0 +1,155 @@
+import json
+import logging
+import time
+from typing import Optional
+
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+JOB_PROGRESS_TTL_SECONDS = 60 * 60
+
+
+_redis_client = None
+
+
+def _get_redis_client() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _redis_client
+
+
+def _progress_key(job_id) -> str:
+    return f"digitization:job:{job_id}:progress"
+
+
+def broadcast_to_room(room_id, payload: dict) -> bool:
+    """Send ``payload`` to the room's WebSocket group; returns False if the channel layer is unreachable."""
+    try:
+        async_to_sync(get_channel_layer().group_send)(f"room_{room_id}", {
+            "type": "room.event",
+            "payload": payload,
+            "sender": None,
+        })
+    except Exception:
+        logger.warning("Could not push %s to room %s", payload.get("type"), room_id, exc_info=True)
+        return False
+    return True
+
+
+def board_updated_payload(job) -> dict:
+    generated_at = job.finished_at or job.created_at
+    return {
+        "type": "board-updated",
+        "room_id": str(job.room_id),
+        "job_id": str(job.id),
+        "image_url": job.result_image.url if job.result_image else None,
+        "generated_at": generated_at.isoformat() if generated_at else None,
+        "metrics": job.metrics or None,
+    }
+
+
+def live_board_payload(live_board) -> dict:
+    return {
+        "type": "board-updated",
+        "room_id": str(live_board.job.room_id),
+        "job_id": str(live_board.job_id),
+        "image_url": live_board.canvas.url if live_board.canvas else None,
+        "generated_at": live_board.updated_at.isoformat() if live_board.updated_at else None,
+        "metrics": live_board.metrics or None,
+        "live": True,
+        "frames": live_board.frames,
+    }
+
+
+class ProgressReporter:
+    """
+    Keeps a running job's stage and frame count in Redis on every change and
+    writes them to the database at most once per ``save_interval`` seconds,
+    plus on ``flush``.
+
+    Stage changes are also pushed to the room's WebSocket group as
+    ``digitization-progress`` events; frame counts are pushed on the same
+    throttle as the database writes.
+    """
+
+    def __init__(self, job, save_interval: Optional[float] = None):
+        self.job = job
+        if save_interval is None:
+            save_interval = getattr(settings, "DIGITIZATION_PROGRESS_SAVE_INTERVAL", 5.0)
+        self.save_interval = float(save_interval)
+        self._dirty = set()
+        self._last_save = time.monotonic()
+        self._last_push = time.monotonic()
+        self._redis_available = True
+        self._push_available = True
+
+    def stage(self, stage: str) -> None:
+        self.job.stage = stage
+        self._changed("stage")
+        self.push()
+
+    def frames(self, processed_frames: int) -> None:
+        self.job.processed_frames = processed_frames
+        self._changed("processed_frames")
+        if time.monotonic() - self._last_push >= self.save_interval:
+            self.push()
+
+    def push(self) -> None:
+        """Send the current status, stage and frame count to the room."""
+        self._last_push = time.monotonic()
+        if not self._push_available:
+            return
+        self._push_available = broadcast_to_room(self.job.room_id, {
+            "type": "digitization-progress",
+            "job_id": str(self.job.id),
+            "status": self.job.status,
+            "stage": self.job.stage or None,
+            "processed_frames": self.job.processed_frames,
+            "expected_frames": self.job.expected_frames,
+        })
+
+    def flush(self) -> None:
+        if self._dirty:
+            self.job.save(update_fields=sorted(self._dirty))
+            self._dirty.clear()
+        self._last_save = time.monotonic()
+
+    def _changed(self, field: str) -> None:
+        self._dirty.add(field)
+        self._publish()
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.flush()
+
+    def _publish(self) -> None:
+        if not self._redis_available:
+            return
+        payload = {
+            "stage": self.job.stage,
+            "processed_frames": self.job.processed_frames,
+            "updated_at": timezone.now().isoformat(),
+        }
+        try:
+            _get_redis_client().set(_progress_key(self.job.id), json.dumps(payload), ex=JOB_PROGRESS_TTL_SECONDS)
+        except redis.RedisError:
+            # Progress still reaches the database on the save throttle.
+            logger.warning("Live progress unavailable for DigitizationJob %s", self.job.id, exc_info=True)
+            self._redis_available = False
+
+
+def read_progress(job_id) -> Optional[dict]:
+    try:
+        raw = _get_redis_client().get(_progress_key(job_id))
+    except redis.RedisError:
+        return None
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except (TypeError, json.JSONDecodeError):
+        return None
@@ -12,21 +12,50 @@ class DigitizationJobCreateSerializer(serializers.Serializer):
     options = serializers.JSONField(required=False)
 
 
+class DigitizationJobRerenderSerializer(serializers.Serializer):
+    options = serializers.DictField()
+
+
+def validate_frame_image(value):
+    max_bytes = getattr(settings, "DIGITIZATION_MAX_FRAME_BYTES", 3_000_000)
+    if value.size > max_bytes:
+        raise serializers.ValidationError("Image exceeds max file size")
+
+    allowed_types = set(getattr(settings, "DIGITIZATION_ALLOWED_MIME_TYPES", []))
+    if allowed_types and value.content_type not in allowed_types:
+        raise serializers.ValidationError("Unsupported image type")
+
+    return value
+
+
 class DigitizationFrameUploadSerializer(serializers.ModelSerializer):
     class Meta:
         model = DigitizationFrame
         fields = ["frame_index", "captured_at", "image"]
 
     def validate_image(self, value):
-        max_bytes = getattr(settings, "DIGITIZATION_MAX_FRAME_BYTES", 3_000_000)
-        if value.size > max_bytes:
-            raise serializers.ValidationError("Image exceeds max file size")
+        return validate_frame_image(value)
 
-        allowed_types = set(getattr(settings, "DIGITIZATION_ALLOWED_MIME_TYPES", []))
-        if allowed_types and value.content_type not in allowed_types:
-            raise serializers.ValidationError("Unsupported image type")
 
-        return value
+class DigitizationFrameBatchUploadSerializer(serializers.Serializer):
+    images = serializers.ListField(child=serializers.FileField(), required=False, allow_empty=False)
+    archive = serializers.FileField(required=False)
+    frame_indices = serializers.ListField(child=serializers.IntegerField(min_value=0), required=False)
+    run = serializers.BooleanField(required=False, default=False)
+
+    def validate_images(self, value):
+        return [validate_frame_image(image) for image in value]
+
+    def validate(self, attrs):
+        if ("images" in attrs) == ("archive" in attrs):
+            raise serializers.ValidationError("Provide either images or archive")
+        indices = attrs.get("frame_indices")
+        if indices is not None:
+            if "images" in attrs and len(indices) != len(attrs["images"]):
+                raise serializers.ValidationError("frame_indices must match the number of images")
+            if len(set(indices)) != len(indices):
+                raise serializers.ValidationError("frame_indices must be unique")
+        return attrs
 
 
 class DigitizationJobSerializer(serializers.ModelSerializer):
@@ -51,3 +80,20 @@ class DigitizationJobSerializer(serializers.ModelSerializer):
             "metrics",
         ]
         read_only_fields = fields
+
+
+class DigitizationFramePresignSerializer(serializers.Serializer):
+    frame_index = serializers.IntegerField()
+    content_type = serializers.CharField()
+    checksum = serializers.CharField(min_length=64, max_length=64)
+
+    def validate_content_type(self, value):
+        allowed_types = set(getattr(settings, "DIGITIZATION_ALLOWED_MIME_TYPES", []))
+        if allowed_types and value not in allowed_types:
+            raise serializers.ValidationError("Unsupported image type")
+        return value
+
+
+class DigitizationFrameFinalizeSerializer(serializers.Serializer):
+    upload_token = serializers.CharField()
+    captured_at = serializers.DateTimeField(required=False)
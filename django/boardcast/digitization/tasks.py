@@ -1,12 +1,31 @@
+import hashlib
+import json
 import logging
-from pathlib import Path
-from typing import Any, List
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
 
 from celery import shared_task
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 
+from .artifacts import (
+    LAZY_ARTIFACTS,
+    artifact_queue_key,
+    ensure_artifact,
+    load_intermediates,
+    pyramid_description,
+    render_artifact,
+    save_intermediates,
+    save_thumbnails,
+)
+from .boardtiles import delete_files
+from .blobcache import BlobCache, get_blob_cache, resolve_model_path
 from .constants import (
     STATUS_FAILED,
     STATUS_QUEUED,
@@ -19,26 +38,428 @@ from .constants import (
     STAGE_LOADING,
     STAGE_RENDER,
     STAGE_SAVING,
-    STAGE_STROKE,
     STAGE_WHITEBOARD_DETECTION,
 )
-from .models import DigitizationFrame, DigitizationJob
+from .models import DigitizationFrame, DigitizationJob, LiveBoard, RoomCalibration
+from .progress import ProgressReporter, board_updated_payload, broadcast_to_room, live_board_payload
 logger = logging.getLogger(__name__)
 
 
-def _load_frames(frames: List[DigitizationFrame]) -> List[Any]:
+def _read_frame(frame: DigitizationFrame, cache: Optional[BlobCache] = None) -> bytes:
+    data = None
+    if cache is not None and frame.checksum:
+        try:
+            data = cache.get(frame.checksum)
+        except OSError:
+            logger.warning("Frame cache read failed for frame %s", frame.id, exc_info=True)
+    if data is None:
+        with frame.image.open("rb") as fh:
+            data = fh.read()
+        # Only content that still matches its checksum is cached under it.
+        if cache is not None and frame.checksum and hashlib.sha256(data).hexdigest() == frame.checksum:
+            # The cache only saves a later fetch; the job goes on without it.
+            try:
+                cache.put(frame.checksum, data)
+            except OSError:
+                logger.warning("Frame cache write failed for frame %s", frame.id, exc_info=True)
+    return data
+
+
+def _decode_image(data: bytes) -> Any:
     import cv2
     import numpy as np
 
-    images = []
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def _decode_frame(frame: DigitizationFrame, cache: Optional[BlobCache] = None) -> Any:
+    img = _decode_image(_read_frame(frame, cache))
+    if img is None:
+        raise ValueError(f"Failed to decode frame {frame.id}")
+    return img
+
+
+def _load_frames(
+    frames: List[DigitizationFrame],
+    crop=None,
+    out=None,
+    cache: Optional[BlobCache] = None,
+) -> List[Any]:
+    """
+    Fetch and decode ``frames`` on a bounded thread pool, since each read can
+    be a blocking storage GET. Frame bytes come from ``cache`` when it holds
+    their checksum.
+
+    With ``crop`` set to an ``(x, y, w, h)`` box only that region of each frame
+    is kept. With ``out`` the cropped frames are written into its slots and the
+    full decodes are dropped as soon as they are copied.
+    """
+    def load(index: int, frame: DigitizationFrame) -> Any:
+        img = _decode_frame(frame, cache)
+        if crop is not None:
+            x, y, w, h = crop
+            img = img[y:y + h, x:x + w]
+        if out is None:
+            return img.copy() if crop is not None else img
+        if img.shape != out[index].shape:
+            raise ValueError(f"Frame {frame.id} does not match the size of the first frame")
+        out[index] = img
+        return None
+
+    if not frames:
+        return []
+    workers = min(int(getattr(settings, "DIGITIZATION_LOAD_WORKERS", 8)), len(frames))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(load, range(len(frames)), frames))
+
+
+class _LazyFrames:
+    """
+    Cropped frames of a job, decoded when indexed; index 0 is the
+    already-decoded reference.
+
+    Indexing a frame also starts loading the next ``lookahead`` frames on a
+    bounded thread pool, so frames taken in order are fetched in parallel
+    while at most ``lookahead`` of them wait in memory. ``close`` stops the
+    pool.
+    """
+
+    def __init__(
+        self,
+        ref: Any,
+        frames: List[DigitizationFrame],
+        crop,
+        cache: Optional[BlobCache],
+        lookahead: int,
+    ):
+        self.ref = ref
+        self.frames = frames
+        self.crop = crop
+        self.cache = cache
+        self.lookahead = max(1, int(lookahead))
+        workers = min(int(getattr(settings, "DIGITIZATION_LOAD_WORKERS", 8)), self.lookahead)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._pending = {}
+        self._submitted = 1
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def _load(self, index: int) -> Any:
+        x, y, w, h = self.crop
+        return _decode_frame(self.frames[index], self.cache)[y:y + h, x:x + w].copy()
+
+    def __getitem__(self, index: int) -> Any:
+        if index == 0:
+            return self.ref
+        with self._lock:
+            future = self._pending.pop(index, None)
+            if future is None:
+                future = self._pool.submit(self._load, index)
+            end = min(index + 1 + self.lookahead, len(self.frames))
+            for ahead in range(max(index + 1, self._submitted), end):
+                self._pending[ahead] = self._pool.submit(self._load, ahead)
+            self._submitted = max(self._submitted, end)
+        return future.result()
+
+    def close(self) -> None:
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+        self._pool.shutdown(wait=True)
+
+
+def _segmentation_model_path(config: dict) -> Optional[str]:
+    """Local path of the weights the config's person segmentation runs, if it uses a model."""
+    if config["person_segmentation"] == "heuristic":
+        return None
+    if config["person_segmentation"] == "onnx":
+        location = settings.DIGITIZATION_ONNX_MODEL_PATH
+    else:
+        location = settings.DIGITIZATION_MODEL_PATH
+    return resolve_model_path(str(location), get_blob_cache())
+
+
+def _cached_calibration(room_id, frame: Any, config: dict) -> Optional[RoomCalibration]:
+    import numpy as np
+
+    from .pipeline import CALIBRATION_PARAMS, CALIBRATION_THUMBNAIL_SIZE, calibration_matches
+
+    if not config.get("use_calibration"):
+        return None
+    calibration = RoomCalibration.objects.filter(room_id=room_id).first()
+    if calibration is None:
+        return None
+
+    height, width = frame.shape[:2]
+    if (calibration.frame_width, calibration.frame_height) != (width, height):
+        return None
+    if calibration.params != {key: config[key] for key in CALIBRATION_PARAMS}:
+        return None
+
+    thumb_w, thumb_h = CALIBRATION_THUMBNAIL_SIZE
+    thumbnail = np.frombuffer(bytes(calibration.thumbnail), np.uint8).reshape(thumb_h, thumb_w)
+    if not calibration_matches(thumbnail, frame, config):
+        return None
+    return calibration
+
+
+def _save_calibration(room_id, frame: Any, bbox, features, config: dict) -> None:
+    from .pipeline import CALIBRATION_PARAMS, calibration_thumbnail, dump_reference_features
+
+    height, width = frame.shape[:2]
+    RoomCalibration.objects.update_or_create(
+        room_id=room_id,
+        defaults={
+            "frame_width": width,
+            "frame_height": height,
+            "bbox": [int(v) for v in bbox],
+            "params": {key: config[key] for key in CALIBRATION_PARAMS},
+            "thumbnail": calibration_thumbnail(frame).tobytes(),
+            "features": dump_reference_features(features),
+        },
+    )
+
+
+def _render_board(background: Any, ink_mask: Any, stroke_color: Any, config: dict):
+    """
+    Render the canvas, palette-quantized when ``palette_colors`` is set.
+
+    Returns the BGR canvas, its PNG bytes (an indexed PNG when quantized) and
+    the ``(indices, palette)`` pair, or None for full-colour canvases.
+    """
+    from .pipeline import encode_image, encode_indexed_png, quantize_canvas, render_canvas
+
+    if not config["palette_colors"]:
+        canvas = render_canvas(background, ink_mask, stroke_color)
+        return canvas, encode_image(canvas, ".png"), None
+    indices, palette = quantize_canvas(ink_mask, stroke_color, int(config["palette_colors"]))
+    return palette[indices], encode_indexed_png(indices, palette), (indices, palette)
+
+
+def _render_vector(ink_mask: Any, stroke_color: Any, palette_image, config: dict) -> bytes:
+    """SVG outlines of the ink, one path per palette colour."""
+    from .pipeline import DEFAULT_CONFIG, quantize_canvas, strokes_to_svg, trace_strokes
+
+    if palette_image is None:
+        # Full-colour canvases still need a small palette to group strokes.
+        palette_image = quantize_canvas(ink_mask, stroke_color, int(DEFAULT_CONFIG["palette_colors"]))
+    indices, palette = palette_image
+    height, width = indices.shape
+    return strokes_to_svg(trace_strokes(indices, palette, float(config["vector_epsilon"])), width, height)
+
+
+def _publish_tiles(job: DigitizationJob, canvas: Any = None) -> Optional[dict]:
+    """
+    Publish ``canvas`` (by default the job's result image) as the room's tiled
+    board; tile errors never fail the job.
+    """
+    from .boardtiles import publish_board_tiles, tiles_event
+
+    try:
+        if canvas is None:
+            with job.result_image.open("rb") as fh:
+                canvas = _decode_image(fh.read())
+        tileset, changed = publish_board_tiles(job.room_id, canvas, job)
+    except Exception:
+        logger.exception("Could not publish board tiles for DigitizationJob %s", job.id)
+        return None
+    return tiles_event(tileset, changed)
+
+
+def _render_results(
+    job: DigitizationJob,
+    background: Any,
+    ink_mask: Any,
+    stroke_color: Any,
+    config: dict,
+    progress: Optional[ProgressReporter] = None,
+) -> Any:
+    """
+    Render the board and store it with its cheap companions on ``job``
+    (without saving it); returns the canvas.
+    """
+    canvas, canvas_bytes, palette_image = _render_board(background, ink_mask, stroke_color, config)
+
+    if progress is not None:
+        progress.stage(STAGE_SAVING)
+
+    # Only the canvas and its cheap companions are written here; the other
+    # artifacts are rendered from the stored intermediates on first request.
+    job.result_image.save("digital_board.png", ContentFile(canvas_bytes), save=False)
+    job.result_svg = None
+    if config["vector_export"]:
+        svg_bytes = _render_vector(ink_mask, stroke_color, palette_image, config)
+        job.result_svg.save("digital_board.svg", ContentFile(svg_bytes), save=False)
+    job.thumbnails = save_thumbnails(job, canvas)
+    job.pyramid = pyramid_description(canvas.shape)
+    job.background_image = job.debug_image = job.result_webp = None
+
+    eager = set(getattr(settings, "DIGITIZATION_EAGER_ARTIFACTS", []))
+    if config["canvas_webp"]:
+        eager.add("webp")
+    for name in LAZY_ARTIFACTS:
+        if name in eager:
+            render_artifact(job, name, canvas=canvas, background=background)
+    return canvas
+
+
+def _job_fingerprint(frames: List[DigitizationFrame], config: dict) -> str:
+    from .pipeline import EXECUTION_ONLY_KEYS
+
+    checksums = []
     for frame in frames:
-        with frame.image.open("rb") as fh:
-            data = fh.read()
-        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
-        if img is None:
-            raise ValueError(f"Failed to decode frame {frame.id}")
-        images.append(img)
-    return images
+        if not frame.checksum:
+            with frame.image.open("rb") as fh:
+                frame.checksum = hashlib.sha256(fh.read()).hexdigest()
+            frame.save(update_fields=["checksum"])
+        checksums.append(frame.checksum)
+
+    payload = {
+        "frames": checksums,
+        "config": {key: value for key, value in config.items() if key not in EXECUTION_ONLY_KEYS},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _reuse_previous_result(job: DigitizationJob, total_frames: int) -> bool:
+    source = (
+        DigitizationJob.objects.filter(fingerprint=job.fingerprint, status=STATUS_SUCCEEDED)
+        .exclude(id=job.id)
+        .exclude(result_image="")
+        .order_by("-finished_at")
+        .first()
+    )
+    if source is None:
+        return False
+
+    # Same frames and options produce the same board, so the stored files are
+    # shared rather than recomputed.
+    job.result_image = source.result_image.name
+    job.background_image = source.background_image.name
+    job.debug_image = source.debug_image.name
+    job.result_webp = source.result_webp.name
+    job.result_svg = source.result_svg.name
+    job.pyramid = source.pyramid
+    job.thumbnails = source.thumbnails
+    job.intermediates = source.intermediates
+    job.metrics = {**(source.metrics or {}), "reused_from": str(source.id)}
+    job.processed_frames = total_frames
+    job.status = STATUS_SUCCEEDED
+    job.stage = STAGE_DONE
+    job.finished_at = timezone.now()
+    job.save()
+
+    tiles = _publish_tiles(job)
+    broadcast_to_room(job.room_id, {**board_updated_payload(job), "tiles": tiles})
+    return True
+
+
+def _is_room_latest(job: DigitizationJob, source: DigitizationJob) -> bool:
+    """Whether ``source``'s board is the room's current one, so ``job`` may replace it."""
+    latest = (
+        DigitizationJob.objects.filter(room_id=job.room_id, status=STATUS_SUCCEEDED)
+        .exclude(id=job.id)
+        .order_by(F("finished_at").desc(nulls_last=True), "-created_at")
+        .first()
+    )
+    return latest is None or source.id == latest.id or (latest.metrics or {}).get("rerendered_from") == str(source.id)
+
+
+def rerender_job(job: DigitizationJob, source: DigitizationJob) -> None:
+    """
+    Finish ``job`` with ``source``'s board re-rendered under ``job.options``,
+    starting from the stored intermediates rather than the frames: only ink
+    detection and rendering run again.
+
+    Raises ``ValueError`` when ``source`` has no usable intermediates or when
+    the options change anything the intermediates depend on.
+    """
+    from .pipeline import build_config, detect_ink_mask, intermediate_config, tiled_ink_mask, use_tiling
+
+    intermediates = source.intermediates or {}
+    if source.status != STATUS_SUCCEEDED or "strokes" not in intermediates:
+        raise ValueError("Job has no stored intermediates to re-render from")
+
+    config = build_config(job.options)
+    upstream = intermediate_config(config)
+    changed = sorted(key for key in upstream if intermediates["config"].get(key) != upstream[key])
+    if changed:
+        raise ValueError(f"Options {', '.join(changed)} need a new digitization job")
+
+    background, stroke_color = load_intermediates(intermediates)
+    if use_tiling(background.shape[:2], config):
+        ink_mask = tiled_ink_mask(background, config)
+    else:
+        ink_mask = detect_ink_mask(background, config)
+
+    job.intermediates = intermediates
+    canvas = _render_results(job, background, ink_mask, stroke_color, config)
+    frames = list(DigitizationFrame.objects.filter(job_id=intermediates["job"]).order_by("frame_index"))
+    if frames:
+        # Lets a later full run with the same frames and options reuse this board.
+        job.fingerprint = _job_fingerprint(frames, config)
+    job.metrics = {
+        **(source.metrics or {}),
+        "ink_coverage_pct": round(float(ink_mask.sum()) / float(ink_mask.size) * 100.0, 4),
+        "rerendered_from": str(source.id),
+    }
+    # Re-rendering an older job must not replace the room's current board.
+    publish = _is_room_latest(job, source)
+    job.status = STATUS_SUCCEEDED
+    job.stage = STAGE_DONE
+    job.finished_at = timezone.now()
+    job.save()
+
+    if publish:
+        tiles = _publish_tiles(job, canvas)
+        broadcast_to_room(job.room_id, {**board_updated_payload(job), "tiles": tiles})
+
+
+@shared_task
+def rerender_digitization_job(job_id: str) -> None:
+    try:
+        job = DigitizationJob.objects.get(id=job_id)
+    except DigitizationJob.DoesNotExist:
+        logger.warning("DigitizationJob %s not found", job_id)
+        return
+
+    if job.status != STATUS_QUEUED:
+        logger.info("DigitizationJob %s not queued (status=%s)", job_id, job.status)
+        return
+
+    job.status = STATUS_RUNNING
+    job.stage = STAGE_INK
+    job.started_at = timezone.now()
+    job.save(update_fields=["status", "stage", "started_at"])
+
+    try:
+        source = DigitizationJob.objects.get(id=(job.metrics or {}).get("rerendered_from"))
+        rerender_job(job, source)
+    except Exception as exc:
+        logger.exception("DigitizationJob %s failed", job_id)
+        job.status = STATUS_FAILED
+        job.error_message = str(exc)
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error_message", "finished_at"])
+
+
+@shared_task
+def render_job_artifact(job_id: str, name: str) -> None:
+    try:
+        job = DigitizationJob.objects.get(id=job_id)
+    except DigitizationJob.DoesNotExist:
+        logger.warning("DigitizationJob %s not found", job_id)
+        return
+
+    try:
+        ensure_artifact(job, name)
+    except Exception:
+        logger.exception("Could not render %s for DigitizationJob %s", name, job_id)
+        # Lets the next request queue the render again.
+        cache.delete(artifact_queue_key(job_id, name))
 
 
 @shared_task
@@ -60,22 +481,29 @@ def process_digitization_job(job_id: str) -> None:
     job.error_message = ""
     job.started_at = timezone.now()
     job.save()
+    progress = ProgressReporter(job)
+    progress.push()
+    scratch = None
+    lazy_frames = None
 
     try:
         import numpy as np
-        import cv2
 
         from .pipeline import (
-            align_image,
             build_config,
             detect_ink_mask,
-            detect_person_mask,
             detect_whiteboard_bbox,
-            encode_image,
-            estimate_background,
-            estimate_stroke_colors,
-            get_yolo_model,
-            render_canvas,
+            estimate_background_and_strokes,
+            fill_missing_background,
+            iter_processed_frames,
+            load_reference_features,
+            reference_features,
+            StreamingBackgroundEstimator,
+            allocate_stack,
+            frame_stack_bytes,
+            tiled_background_and_strokes,
+            tiled_ink_mask,
+            use_tiling,
         )
 
         frames_qs = list(DigitizationFrame.objects.filter(job=job).order_by("frame_index"))
@@ -83,93 +511,123 @@ def process_digitization_job(job_id: str) -> None:
             raise ValueError("No frames uploaded")
 
         config = build_config(job.options)
-        images = _load_frames(frames_qs)
-
-        job.stage = STAGE_WHITEBOARD_DETECTION
-        job.save(update_fields=["stage"])
-
-        x, y, bw, bh = detect_whiteboard_bbox(images[0], config)
-        images = [img[y:y + bh, x:x + bw] for img in images]
-
-        h, w = images[0].shape[:2]
-        total_frames = len(images)
-
-        orb = cv2.ORB_create(int(config["orb_features"]))
-        bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
-
-        ref = images[0]
-        ref_gray = cv2.cvtColor(ref, cv2.COLOR_BGR2GRAY)
-        ref_kp, ref_des = orb.detectAndCompute(ref_gray, None)
-
-        stack = np.zeros((total_frames, h, w, 3), dtype=np.uint8)
-        person_mask_stack = np.zeros((total_frames, h, w), dtype=bool)
-        bg_mask_stack = np.ones((total_frames, h, w), dtype=bool)
-
-        segmentation_mode = config.get("person_segmentation", "yolo")
-        model = None
-        if segmentation_mode == "yolo":
-            model_path = Path(settings.DIGITIZATION_MODEL_PATH)
-            if not model_path.exists():
-                raise ValueError(f"YOLO model not found at {model_path}")
-            model = get_yolo_model(str(model_path))
-
-        job.stage = STAGE_ALIGNMENT
-        job.save(update_fields=["stage"])
+        job.fingerprint = _job_fingerprint(frames_qs, config)
+        job.save(update_fields=["fingerprint"])
+        if _reuse_previous_result(job, len(frames_qs)):
+            return
+
+        frame_cache = get_blob_cache()
+        first_frame = _decode_frame(frames_qs[0], frame_cache)
+
+        # A fixed room camera keeps the same whiteboard bbox and reference
+        # features between jobs, so both come from the cache while the scene
+        # still matches.
+        calibration = _cached_calibration(job.room_id, first_frame, config)
+        cached_features = None
+        if calibration is not None:
+            x, y, bw, bh = calibration.bbox
+            cached_features = load_reference_features(calibration.features)
+        else:
+            progress.stage(STAGE_WHITEBOARD_DETECTION)
+            x, y, bw, bh = detect_whiteboard_bbox(first_frame, config)
+
+        ref = first_frame[y:y + bh, x:x + bw]
+        features = reference_features(ref, config, cached_features)
+        if config.get("use_calibration") and (calibration is None or features.keys() != cached_features.keys()):
+            _save_calibration(job.room_id, first_frame, (x, y, bw, bh), features, config)
+        first_frame = None
+
+        h, w = ref.shape[:2]
+        total_frames = len(frames_qs)
+        streaming = config["background_mode"] == "streaming"
+        if streaming:
+            # Frames are loaded a batch ahead of alignment and folded into
+            # the estimator, so only that look-ahead and the batches in flight
+            # are held in memory.
+            lazy_frames = images = _LazyFrames(
+                ref.copy(), frames_qs, (x, y, bw, bh), frame_cache, int(config["segmentation_batch_size"])
+            )
+            estimator = StreamingBackgroundEstimator((h, w), int(config["streaming_bins"]))
+        else:
+            # Frames are decoded straight into the stack and aligned in place.
+            # The reference features are already computed, so overwriting
+            # stack[0] with its aligned version is safe.
+            stack_storage = config["stack_storage"]
+            if stack_storage == "auto":
+                budget = int(getattr(settings, "DIGITIZATION_MEMMAP_THRESHOLD_BYTES", 1536 * 1024 ** 2))
+                stack_storage = "memmap" if frame_stack_bytes(total_frames, h, w) > budget else "memory"
+            if stack_storage == "memmap":
+                scratch = tempfile.TemporaryDirectory(
+                    prefix="digitization-",
+                    dir=getattr(settings, "DIGITIZATION_SCRATCH_DIR", "") or None,
+                )
+            scratch_dir = scratch.name if scratch is not None else None
+
+            stack = allocate_stack((total_frames, h, w, 3), np.uint8, 0, scratch_dir, "frames")
+            stack[0] = ref
+            _load_frames(frames_qs[1:], crop=(x, y, bw, bh), out=stack[1:], cache=frame_cache)
+            images = stack
+            person_mask_stack = allocate_stack((total_frames, h, w), bool, False, scratch_dir, "person_masks")
+            bg_mask_stack = allocate_stack((total_frames, h, w), bool, True, scratch_dir, "bg_masks")
+        ref = None
+        frame_cache.evict()
+
+        model_path = _segmentation_model_path(config)
+
+        progress.stage(STAGE_ALIGNMENT)
 
         excluded_frames = 0
-        for i, img in enumerate(images):
-            aligned = align_image(img, ref_kp, ref_des, orb, bf, (w, h), config)
-            stack[i] = aligned
+        frames_used = 0
+        processed = 0
+        alignment_stats = [None] * total_frames
+        for indices, aligned_batch, person_masks, batch_stats in iter_processed_frames(images, model_path, config, features):
+            for i, aligned, person_mask, stats in zip(indices, aligned_batch, person_masks, batch_stats):
+                processed += 1
+                alignment_stats[i] = stats
+                if not streaming:
+                    stack[i] = aligned
+
+                if config.get("expect_person_in_each_frame"):
+                    min_area = int(float(config["min_person_area_ratio"]) * person_mask.size)
+                    if person_mask.sum() < min_area:
+                        if not streaming:
+                            bg_mask_stack[i] = False
+                            person_mask_stack[i] = True
+                        excluded_frames += 1
+                        progress.frames(processed)
+                        continue
+
+                bg_mask = ~person_mask
+                if bg_mask.any():
+                    frames_used += 1
+                if streaming:
+                    estimator.update(aligned, bg_mask)
+                else:
+                    person_mask_stack[i] = person_mask
+                    bg_mask_stack[i] = bg_mask
+                progress.frames(processed)
 
-            person_mask = detect_person_mask(aligned, model, (h, w), config)
-
-            if config.get("expect_person_in_each_frame"):
-                min_area = int(float(config["min_person_area_ratio"]) * person_mask.size)
-                if person_mask.sum() < min_area:
-                    bg_mask_stack[i] = False
-                    person_mask_stack[i] = True
-                    excluded_frames += 1
-                    job.processed_frames = i + 1
-                    job.save(update_fields=["processed_frames"])
-                    continue
-
-            person_mask_stack[i] = person_mask
-            bg_mask_stack[i] = ~person_mask
-            job.processed_frames = i + 1
-            job.save(update_fields=["processed_frames"])
-
-        frames_used = int((bg_mask_stack.reshape(total_frames, -1).any(axis=1)).sum())
         if frames_used == 0:
             raise ValueError("No usable frames after person detection")
 
-        job.stage = STAGE_BACKGROUND
-        job.save(update_fields=["stage"])
-        background = estimate_background(stack, bg_mask_stack)
-
-        job.stage = STAGE_INK
-        job.save(update_fields=["stage"])
-        ink_mask = detect_ink_mask(background, config)
-
-        job.stage = STAGE_STROKE
-        job.save(update_fields=["stage"])
-        stroke_color = estimate_stroke_colors(stack, ink_mask, person_mask_stack)
-
-        job.stage = STAGE_RENDER
-        job.save(update_fields=["stage"])
-        canvas = render_canvas(background, ink_mask, stroke_color)
-
-        debug_img = np.hstack([background, canvas])
-
-        job.stage = STAGE_SAVING
-        job.save(update_fields=["stage"])
-
-        background_bytes = encode_image(background, ".jpg")
-        canvas_bytes = encode_image(canvas, ".png")
-        debug_bytes = encode_image(debug_img, ".jpg")
-
-        job.background_image.save("background.jpg", ContentFile(background_bytes), save=False)
-        job.result_image.save("digital_board.png", ContentFile(canvas_bytes), save=False)
-        job.debug_image.save("comparison.jpg", ContentFile(debug_bytes), save=False)
+        progress.stage(STAGE_BACKGROUND)
+        tiled = use_tiling((h, w), config)
+        if streaming:
+            # Stroke colours are the median over the same non-person samples
+            # the background uses, so the streaming median already holds them.
+            stroke_color, sampled = estimator.median()
+            background = fill_missing_background(stroke_color, ~sampled)
+        elif tiled:
+            background, stroke_color = tiled_background_and_strokes(stack, bg_mask_stack, config)
+        else:
+            background, stroke_color = estimate_background_and_strokes(stack, bg_mask_stack)
+
+        progress.stage(STAGE_INK)
+        ink_mask = tiled_ink_mask(background, config) if tiled else detect_ink_mask(background, config)
+
+        progress.stage(STAGE_RENDER)
+        canvas = _render_results(job, background, ink_mask, stroke_color, config, progress)
+        job.intermediates = save_intermediates(job, background, stroke_color, config)
 
         ink_pct = float(ink_mask.sum()) / float(ink_mask.size) * 100.0
 
@@ -178,15 +636,136 @@ def process_digitization_job(job_id: str) -> None:
             "excluded_frames": excluded_frames,
             "frames_used": frames_used,
             "total_frames": total_frames,
+            "calibration_hit": calibration is not None,
+            "stack_storage": "streaming" if streaming else stack_storage,
+            "tiled": tiled,
+            "frame_cache_hits": frame_cache.hits,
+            "frame_cache_misses": frame_cache.misses,
+            "alignment_mode": config["alignment_mode"],
+            "alignment_ms": [stats["ms"] for stats in alignment_stats],
+            "alignment_inlier_ratio": [stats["inlier_ratio"] for stats in alignment_stats],
         }
+        tiles = _publish_tiles(job, canvas)
+
         job.status = STATUS_SUCCEEDED
         job.stage = STAGE_DONE
         job.finished_at = timezone.now()
         job.save()
+        progress.push()
+        broadcast_to_room(job.room_id, {**board_updated_payload(job), "tiles": tiles})
 
     except Exception as exc:
         logger.exception("DigitizationJob %s failed", job_id)
         job.status = STATUS_FAILED
         job.error_message = str(exc)
         job.finished_at = timezone.now()
-        job.save(update_fields=["status", "error_message", "finished_at"])
+        job.save(update_fields=["status", "stage", "processed_frames", "error_message", "finished_at"])
+        progress.push()
+
+    finally:
+        if lazy_frames is not None:
+            lazy_frames.close()
+        if scratch is not None:
+            scratch.cleanup()
+
+
+def _replace_file(field, name: str, data: bytes, stale: List[str]) -> None:
+    """Store ``data`` on ``field`` under a new name; the old name goes to ``stale``."""
+    if field:
+        stale.append(field.name)
+    field.save(name, ContentFile(data), save=False)
+
+
+@shared_task
+def process_live_frame(job_id: str, frame_index: int) -> None:
+    """Fold one uploaded frame of a live job into its board and push the canvas to the room."""
+    from .pipeline import (
+        FrameProcessor,
+        OnlineBackgroundModel,
+        build_config,
+        detect_ink_mask,
+        detect_whiteboard_bbox,
+        dump_live_state,
+        get_yolo_model,
+        load_live_state,
+        load_reference_features,
+        reference_features,
+        tiled_ink_mask,
+        use_tiling,
+    )
+
+    try:
+        frame = DigitizationFrame.objects.select_related("job").get(job_id=job_id, frame_index=frame_index)
+    except DigitizationFrame.DoesNotExist:
+        logger.warning("Frame %s of DigitizationJob %s not found", frame_index, job_id)
+        return
+    job = frame.job
+    config = build_config(job.options)
+
+    try:
+        frame_cache = get_blob_cache()
+        image = _decode_frame(frame, frame_cache)
+        if frame_cache.misses:
+            # The frame was just cached, which may push the cache over budget.
+            frame_cache.evict()
+        model_path = _segmentation_model_path(config)
+        model = get_yolo_model(model_path) if model_path else None
+
+        with transaction.atomic():
+            live_board, _ = LiveBoard.objects.select_for_update().get_or_create(job=job)
+            if live_board.state:
+                with live_board.state.open("rb") as fh:
+                    board, bbox, features = load_live_state(fh.read(), config["live_alpha"])
+            else:
+                calibration = _cached_calibration(job.room_id, image, config)
+                if calibration is not None:
+                    bbox = tuple(calibration.bbox)
+                    cached_features = load_reference_features(calibration.features)
+                else:
+                    bbox = detect_whiteboard_bbox(image, config)
+                    cached_features = None
+                x, y, bw, bh = bbox
+                features = reference_features(image[y:y + bh, x:x + bw], config, cached_features)
+                if config.get("use_calibration") and calibration is None:
+                    _save_calibration(job.room_id, image, bbox, features, config)
+                board = OnlineBackgroundModel.empty((bh, bw), config["live_alpha"])
+
+            x, y, bw, bh = bbox
+            processor = FrameProcessor(board.current()[0], model, config, features)
+            (aligned,), (person_mask,), _ = processor.process([image[y:y + bh, x:x + bw]])
+
+            if config.get("expect_person_in_each_frame"):
+                min_area = int(float(config["min_person_area_ratio"]) * person_mask.size)
+                if person_mask.sum() < min_area:
+                    logger.info("Live frame %s of DigitizationJob %s has no person; skipped", frame_index, job_id)
+                    return
+
+            board.update(aligned, ~person_mask)
+            stroke_color, _ = board.current()
+            background = board.background()
+            if use_tiling(board.shape, config):
+                ink_mask = tiled_ink_mask(background, config)
+            else:
+                ink_mask = detect_ink_mask(background, config)
+            canvas, canvas_bytes, _ = _render_board(background, ink_mask, stroke_color, config)
+
+            # Readers keep the committed files until the new names are committed.
+            stale = []
+            _replace_file(live_board.state, "live_state.npz", dump_live_state(board, bbox, features), stale)
+            _replace_file(live_board.canvas, "digital_board.png", canvas_bytes, stale)
+            live_board.frames += 1
+            live_board.metrics = {
+                "ink_coverage_pct": round(float(ink_mask.sum()) / float(ink_mask.size) * 100.0, 4),
+                "frames_used": live_board.frames,
+                "last_frame_index": frame_index,
+            }
+            live_board.save()
+            storage = live_board.canvas.storage
+            transaction.on_commit(lambda: delete_files(storage, stale))
+
+    except Exception:
+        logger.exception("Live frame %s of DigitizationJob %s failed", frame_index, job_id)
+        return
+
+    tiles = _publish_tiles(job, canvas)
+    broadcast_to_room(job.room_id, {**live_board_payload(live_board), "tiles": tiles})
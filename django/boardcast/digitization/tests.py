@@ -0,0 +1,1442 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+import warnings
+import zipfile
+from types import SimpleNamespace
+from unittest import mock
+
+import cv2
+import numpy as np
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from media_ingest.tests import LocalS3
+from rooms.models import Room
+
+from .artifacts import pyramid_description, save_intermediates, save_thumbnails, save_tile_pyramid
+from .blobcache import BlobCache
+from .boardtiles import publish_board_tiles
+from .constants import STATUS_FAILED, STATUS_QUEUED, STATUS_RUNNING, STATUS_SUCCEEDED, STATUS_UPLOADING
+from .imageprobe import probe_image
+from .models import BoardTileSet, DigitizationFrame, DigitizationJob, LiveBoard
+from .pipeline import (
+    FrameProcessor,
+    OnlineBackgroundModel,
+    StreamingBackgroundEstimator,
+    allocate_stack,
+    build_config,
+    calibration_matches,
+    calibration_thumbnail,
+    decode_person_segments,
+    deep_zoom_levels,
+    detect_person_masks,
+    dump_live_state,
+    dump_reference_features,
+    encode_indexed_png,
+    estimate_background,
+    estimate_background_and_strokes,
+    detect_ink_mask,
+    dirty_tiles,
+    iter_processed_frames,
+    letterbox_image,
+    load_live_state,
+    load_reference_features,
+    masked_median,
+    quantize_canvas,
+    reference_features,
+    strokes_to_svg,
+    tile_grid,
+    tiled_background_and_strokes,
+    tiled_ink_mask,
+    trace_strokes,
+)
+from .progress import ProgressReporter, _get_redis_client, read_progress
+from .tasks import (
+    _job_fingerprint,
+    _LazyFrames,
+    _load_frames,
+    process_digitization_job,
+    process_live_frame,
+    render_job_artifact,
+    rerender_digitization_job,
+)
+
+
+def _nanmedian_background(stack, bg_mask_stack):
+    masked_bg = np.where(bg_mask_stack[..., None], stack.astype(np.float32), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        background = np.nanmedian(masked_bg, axis=0)
+    nan_mask = np.isnan(background[..., 0])
+    return np.nan_to_num(background, nan=255).astype(np.uint8), nan_mask
+
+
+def _nanmedian_stroke_colors(stack, ink_mask, person_mask_stack):
+    stroke_mask = ink_mask[None, ...] & (~person_mask_stack)
+    stroke_mask_rgb = np.repeat(stroke_mask[..., None], 3, axis=3)
+    stroke_stack = np.where(stroke_mask_rgb, stack.astype(np.float32), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        stroke_color = np.nanmedian(stroke_stack, axis=0)
+    return np.where(np.isnan(stroke_color), 255, stroke_color).astype(np.uint8)
+
+
+class MaskedMedianTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1234)
+        n, h, w = 8, 37, 53
+        self.stack = rng.integers(0, 256, size=(n, h, w, 3), dtype=np.uint8)
+        self.person_mask_stack = rng.random((n, h, w)) < 0.4
+        # One excluded frame and a patch that no frame ever sees.
+        self.person_mask_stack[2] = True
+        self.person_mask_stack[:, :4, :5] = True
+        self.bg_mask_stack = ~self.person_mask_stack
+        self.ink_mask = rng.random((h, w)) < 0.1
+
+    def test_matches_nanmedian(self):
+        expected, nan_mask = _nanmedian_background(self.stack, self.bg_mask_stack)
+        median, sampled = masked_median(self.stack, self.bg_mask_stack, chunk_rows=7)
+
+        np.testing.assert_array_equal(median, expected)
+        np.testing.assert_array_equal(sampled, ~nan_mask)
+
+    def test_estimate_background_matches_nanmedian(self):
+        expected, nan_mask = _nanmedian_background(self.stack, self.bg_mask_stack)
+        background = estimate_background(self.stack, self.bg_mask_stack)
+
+        np.testing.assert_array_equal(background[~nan_mask], expected[~nan_mask])
+
+    def test_single_pass_matches_separate_estimates(self):
+        background, stroke_color = estimate_background_and_strokes(self.stack, self.bg_mask_stack)
+        expected_bg = estimate_background(self.stack, self.bg_mask_stack)
+        expected_stroke = _nanmedian_stroke_colors(self.stack, self.ink_mask, self.person_mask_stack)
+
+        np.testing.assert_array_equal(background, expected_bg)
+        np.testing.assert_array_equal(stroke_color[self.ink_mask], expected_stroke[self.ink_mask])
+
+
+class _FakeSegmentationResult:
+    def __init__(self, segments, classes):
+        import torch
+
+        self.masks = SimpleNamespace(data=torch.as_tensor(segments))
+        self.boxes = SimpleNamespace(cls=torch.as_tensor(classes, dtype=torch.float32))
+
+
+class _FakeSegmentationModel:
+    def __init__(self, segments, classes):
+        self.segments = segments
+        self.classes = classes
+        self.batches = []
+
+    def __call__(self, images, conf, verbose):
+        self.batches.append(len(images))
+        return [_FakeSegmentationResult(self.segments, self.classes) for _ in images]
+
+
+class BatchedPersonSegmentationTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(99)
+        self.segments = rng.random((3, 24, 32), dtype=np.float32)
+        self.classes = [0, 2, 0]
+        self.config = build_config({"segmentation_batch_size": 4})
+
+    def test_merged_mask_matches_per_segment_resize(self):
+        h, w = 60, 80
+        expected = np.zeros((h, w), dtype=bool)
+        for seg, cls in zip(self.segments, self.classes):
+            if cls == 0:
+                expected |= cv2.resize(seg, (w, h), interpolation=cv2.INTER_LINEAR) > 0.5
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+        expected = cv2.morphologyEx(expected.astype(np.uint8), cv2.MORPH_CLOSE, kernel).astype(bool)
+
+        model = _FakeSegmentationModel(self.segments, self.classes)
+        (mask,) = detect_person_masks([np.zeros((h, w, 3), np.uint8)], model, (h, w), self.config)
+
+        self.assertLess(np.count_nonzero(mask != expected), 0.01 * mask.size)
+
+    def test_frames_are_sent_in_micro_batches(self):
+        model = _FakeSegmentationModel(self.segments, [1, 1, 1])
+        images = [np.zeros((10, 10, 3), np.uint8)] * 9
+
+        masks = detect_person_masks(images, model, (10, 10), self.config)
+
+        self.assertEqual(model.batches, [4, 4, 1])
+        self.assertEqual(len(masks), 9)
+        self.assertFalse(any(mask.any() for mask in masks))
+
+
+class ParallelFrameProcessingTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        base = np.full((120, 160, 3), 230, dtype=np.uint8)
+        for _ in range(40):
+            x, y = rng.integers(0, 150), rng.integers(0, 110)
+            base[y:y + 8, x:x + 8] = rng.integers(0, 120, size=3, dtype=np.uint8)
+        self.images = [np.roll(base, shift, axis=1) for shift in range(6)]
+
+    def _collect(self, **options):
+        config = build_config({"person_segmentation": "heuristic", "segmentation_batch_size": 4, **options})
+        aligned = [None] * len(self.images)
+        masks = [None] * len(self.images)
+        for indices, aligned_batch, person_masks, _ in iter_processed_frames(self.images, None, config):
+            for i, frame, mask in zip(indices, aligned_batch, person_masks):
+                aligned[i] = frame
+                masks[i] = mask
+        return aligned, masks
+
+    def test_pool_modes_match_serial(self):
+        expected_aligned, expected_masks = self._collect()
+        for parallelism in ("thread", "process"):
+            with self.subTest(parallelism=parallelism):
+                aligned, masks = self._collect(parallelism=parallelism, parallel_workers=3)
+                for i in range(len(self.images)):
+                    np.testing.assert_array_equal(aligned[i], expected_aligned[i])
+                    np.testing.assert_array_equal(masks[i], expected_masks[i])
+
+    def test_process_pool_runs_inside_daemonic_worker(self):
+        # Celery's prefork pool runs tasks in daemonic billiard processes.
+        import billiard
+
+        queue = billiard.Queue()
+        worker = billiard.Process(target=_collect_in_daemon, args=(self.images, queue), daemon=True)
+        worker.start()
+        self.assertEqual(queue.get(timeout=60), list(range(len(self.images))))
+        worker.join(10)
+        self.assertEqual(worker.exitcode, 0)
+
+    def test_threads_share_one_model(self):
+        model = _FakeSegmentationModel([np.zeros((4, 4), np.float32)], [1])
+        with mock.patch("digitization.pipeline.get_yolo_model", return_value=model) as get_model:
+            config = build_config({"parallelism": "thread", "parallel_workers": 3, "segmentation_batch_size": 1})
+            batches = list(iter_processed_frames(self.images, "model.pt", config))
+        get_model.assert_called_once_with("model.pt")
+        self.assertEqual(len(batches), len(self.images))
+        self.assertEqual(model.batches, [1] * len(self.images))
+
+
+def _collect_in_daemon(images, queue):
+    config = build_config({"person_segmentation": "heuristic", "parallelism": "process", "parallel_workers": 2})
+    queue.put(sorted(i for indices, *_ in iter_processed_frames(images, None, config) for i in indices))
+
+
+class PyramidAlignmentTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        self.ref = np.full((240, 320, 3), 230, dtype=np.uint8)
+        for _ in range(80):
+            x, y = rng.integers(0, 300), rng.integers(0, 220)
+            self.ref[y:y + 14, x:x + 14] = rng.integers(0, 120, size=3, dtype=np.uint8)
+        self.shift = np.float32([[1, 0, 6], [0, 1, -4]])
+        self.moved = cv2.warpAffine(self.ref, self.shift, (320, 240), borderValue=(230, 230, 230))
+
+    def _homography(self, **options):
+        config = build_config({"person_segmentation": "heuristic", "alignment_mode": "pyramid", **options})
+        processor = FrameProcessor(self.ref, None, config)
+        return processor._homography(cv2.cvtColor(self.moved, cv2.COLOR_BGR2GRAY))
+
+    def test_pyramid_homography_recovers_translation(self):
+        for refine in (False, True):
+            with self.subTest(refine=refine):
+                H, inlier_ratio = self._homography(pyramid_refine=refine)
+                self.assertIsNotNone(H)
+                points = np.float32([[80, 60], [240, 60], [160, 120], [80, 180], [240, 180]]).reshape(-1, 1, 2)
+                moved = cv2.perspectiveTransform(points, H)
+                np.testing.assert_allclose(moved - points, np.broadcast_to([[-6, 4]], moved.shape), atol=1.5)
+                self.assertGreater(inlier_ratio, 0.5)
+
+    def test_reference_frame_is_not_warped(self):
+        config = build_config({"person_segmentation": "heuristic", "alignment_mode": "pyramid"})
+        processor = FrameProcessor(self.ref, None, config)
+
+        aligned, stats = processor.align(self.ref)
+
+        self.assertIs(aligned, self.ref)
+        self.assertGreater(stats["inlier_ratio"], 0.5)
+
+
+class CalibrationCacheTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(23)
+        self.frame = np.full((240, 320, 3), 230, dtype=np.uint8)
+        for _ in range(60):
+            x, y = rng.integers(0, 300), rng.integers(0, 220)
+            self.frame[y:y + 16, x:x + 16] = rng.integers(0, 120, size=3, dtype=np.uint8)
+        self.config = build_config({"alignment_mode": "pyramid", "pyramid_refine": True})
+
+    def test_reference_features_round_trip(self):
+        features = reference_features(self.frame, self.config)
+        loaded = load_reference_features(dump_reference_features(features))
+
+        self.assertEqual(set(loaded), {0, 1})
+        for level, (points, des) in features.items():
+            np.testing.assert_array_equal(loaded[level][0], points)
+            np.testing.assert_array_equal(loaded[level][1], des)
+
+    def test_cached_features_are_reused(self):
+        features = reference_features(self.frame, self.config)
+        blank = np.full_like(self.frame, 230)
+
+        processor = FrameProcessor(blank, None, self.config, features)
+
+        self.assertIs(processor.features[0], features[0])
+        self.assertEqual(len(processor.ref_kp), len(features[0][0]))
+
+    def test_calibration_matches_same_scene_only(self):
+        thumbnail = calibration_thumbnail(self.frame)
+        presenter = self.frame.copy()
+        presenter[60:200, 100:160] = 40
+        shifted = np.roll(self.frame, 24, axis=1)
+
+        self.assertTrue(calibration_matches(thumbnail, presenter, self.config))
+        self.assertFalse(calibration_matches(thumbnail, shifted, self.config))
+
+
+class JobFingerprintTests(SimpleTestCase):
+    def _frames(self, *checksums):
+        return [DigitizationFrame(frame_index=i, checksum=checksum) for i, checksum in enumerate(checksums)]
+
+    def test_execution_options_do_not_change_fingerprint(self):
+        frames = self._frames("a" * 64, "b" * 64)
+        serial = _job_fingerprint(frames, build_config({}))
+        threaded = _job_fingerprint(frames, build_config({"parallelism": "thread", "parallel_workers": 3}))
+
+        self.assertEqual(serial, threaded)
+
+    def test_frame_order_and_options_change_fingerprint(self):
+        config = build_config({})
+        fingerprint = _job_fingerprint(self._frames("a" * 64, "b" * 64), config)
+
+        self.assertNotEqual(fingerprint, _job_fingerprint(self._frames("b" * 64, "a" * 64), config))
+        self.assertNotEqual(fingerprint, _job_fingerprint(self._frames("a" * 64, "b" * 64), build_config({"conf": 0.6})))
+
+
+class _RecordingJob(SimpleNamespace):
+    def save(self, update_fields=None):
+        self.saves.append(update_fields)
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def get(self, key):
+        return self.values.get(key)
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class ProgressReporterTests(SimpleTestCase):
+    def setUp(self):
+        self.job = _RecordingJob(
+            id="job-1",
+            room_id="room-1",
+            status="RUNNING",
+            stage="",
+            processed_frames=0,
+            expected_frames=9,
+            saves=[],
+        )
+        self.redis = _FakeRedis()
+        patcher = mock.patch("digitization.progress._get_redis_client", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_database_writes_are_throttled(self):
+        reporter = ProgressReporter(self.job, save_interval=60)
+        reporter.stage("ALIGNMENT_AND_SEGMENTATION")
+        for processed in range(1, 10):
+            reporter.frames(processed)
+
+        self.assertEqual(self.job.saves, [])
+        self.assertEqual(read_progress("job-1")["processed_frames"], 9)
+
+        reporter.flush()
+        self.assertEqual(self.job.saves, [["processed_frames", "stage"]])
+
+    def test_zero_interval_saves_every_change(self):
+        reporter = ProgressReporter(self.job, save_interval=0)
+        reporter.stage("RENDER")
+        reporter.frames(3)
+
+        self.assertEqual(self.job.saves, [["stage"], ["processed_frames"]])
+
+    def test_redis_errors_fall_back_to_database(self):
+        with mock.patch("digitization.progress._get_redis_client", side_effect=redis.ConnectionError):
+            with self.assertLogs("digitization.progress", "WARNING") as logs:
+                reporter = ProgressReporter(self.job, save_interval=0)
+                reporter.frames(1)
+                reporter.frames(2)
+            self.assertIsNone(read_progress("job-1"))
+
+        self.assertEqual(len(logs.records), 1)
+
+        self.assertEqual(self.job.saves, [["processed_frames"], ["processed_frames"]])
+
+    def test_stage_changes_are_pushed_to_the_room(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)("room_room-1", channel)
+
+        reporter = ProgressReporter(self.job, save_interval=60)
+        reporter.stage("INK_DETECTION")
+        reporter.frames(4)
+        message = async_to_sync(layer.receive)(channel)
+
+        self.assertEqual(message["type"], "room.event")
+        self.assertEqual(message["payload"], {
+            "type": "digitization-progress",
+            "job_id": "job-1",
+            "status": "RUNNING",
+            "stage": "INK_DETECTION",
+            "processed_frames": 0,
+            "expected_frames": 9,
+        })
+
+
+class JobProgressViewTests(TestCase):
+    def test_running_job_reports_live_progress(self):
+        job = DigitizationJob.objects.create(
+            room=Room.objects.create(),
+            status=STATUS_RUNNING,
+            stage="LOADING_FRAMES",
+            expected_frames=9,
+        )
+        with mock.patch("digitization.progress._get_redis_client", return_value=_FakeRedis()), \
+                mock.patch("digitization.progress.broadcast_to_room"):
+            reporter = ProgressReporter(job, save_interval=60)
+            reporter.stage("ALIGNMENT_AND_SEGMENTATION")
+            reporter.frames(6)
+            progress = self.client.get(f"/api/digitization-jobs/{job.id}/").json()["progress"]
+
+        job.refresh_from_db()
+        self.assertEqual((job.stage, job.processed_frames), ("LOADING_FRAMES", 0))
+        self.assertEqual(progress, {"stage": "ALIGNMENT_AND_SEGMENTATION", "processed_frames": 6, "expected_frames": 9})
+
+    def test_redis_client_is_shared(self):
+        with mock.patch("digitization.progress._redis_client", None):
+            self.assertIs(_get_redis_client(), _get_redis_client())
+
+
+class ImageProbeTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.image = rng.integers(0, 256, size=(37, 53, 3), dtype=np.uint8)
+
+    def _encode(self, ext, params=None):
+        success, buffer = cv2.imencode(ext, self.image, params or [])
+        self.assertTrue(success)
+        return buffer.tobytes()
+
+    def test_reads_dimensions_from_headers(self):
+        cases = [
+            ("jpeg", ".jpg", None),
+            ("jpeg", ".jpg", [cv2.IMWRITE_JPEG_PROGRESSIVE, 1]),
+            ("png", ".png", None),
+            ("webp", ".webp", [cv2.IMWRITE_WEBP_QUALITY, 80]),
+            ("webp", ".webp", [cv2.IMWRITE_WEBP_QUALITY, 101]),
+        ]
+        for fmt, ext, params in cases:
+            with self.subTest(ext=ext, params=params):
+                self.assertEqual(probe_image(self._encode(ext, params)), (fmt, 53, 37))
+
+    def test_jpeg_exif_rotation_swaps_dimensions(self):
+        import struct
+
+        for endian, orientation, expected in (("<", 6, (37, 53)), (">", 8, (37, 53)), ("<", 3, (53, 37))):
+            with self.subTest(endian=endian, orientation=orientation):
+                order = b"II" if endian == "<" else b"MM"
+                tiff = order + struct.pack(endian + "HI", 42, 8)
+                tiff += struct.pack(endian + "H", 1) + struct.pack(endian + "HHIHH", 0x0112, 3, 1, orientation, 0)
+                tiff += struct.pack(endian + "I", 0)
+                app1 = b"Exif\x00\x00" + tiff
+                jpeg = self._encode(".jpg")
+                data = jpeg[:2] + b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1 + jpeg[2:]
+
+                decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                self.assertEqual(decoded.shape[1::-1], expected)
+                self.assertEqual(probe_image(data), ("jpeg", *expected))
+
+    def test_rejects_unknown_or_truncated_payloads(self):
+        for data in (b"", b"GIF89a" + b"\x00" * 20, self._encode(".png")[:20], self._encode(".jpg")[:4]):
+            with self.subTest(data=data[:8]):
+                with self.assertRaises(ValueError):
+                    probe_image(data)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), DIGITIZATION_AUTO_TRIGGER=False)
+class DigitizationFrameBatchUploadTests(TestCase):
+    def setUp(self):
+        self.job = DigitizationJob.objects.create(room=Room.objects.create(), expected_frames=3)
+        self.url = f"/api/digitization-jobs/{self.job.id}/frames/batch/"
+        image = np.full((24, 32, 3), 200, dtype=np.uint8)
+        self.png = cv2.imencode(".png", image)[1].tobytes()
+
+    def _upload(self, name):
+        return SimpleUploadedFile(name, self.png, content_type="image/png")
+
+    def test_multipart_list_creates_frames_and_runs_job(self):
+        with mock.patch("digitization.views.current_app.send_task") as send_task:
+            response = self.client.post(self.url, {
+                "images": [self._upload(f"f{i}.png") for i in range(3)],
+                "run": "true",
+            })
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()["uploaded_frames"], 3)
+        self.assertEqual(
+            list(self.job.frames.values_list("frame_index", "width", "height")),
+            [(0, 32, 24), (1, 32, 24), (2, 32, 24)],
+        )
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, STATUS_QUEUED)
+        self.assertEqual((self.job.frame_width, self.job.frame_height), (32, 24))
+        send_task.assert_called_once()
+
+    def test_zip_archive_replaces_existing_frames(self):
+        self.client.post(self.url, {"images": [self._upload("old.png")], "frame_indices": [1]})
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            zf.writestr("b.png", self.png)
+            zf.writestr("a.png", self.png)
+        archive = SimpleUploadedFile("frames.zip", buffer.getvalue(), content_type="application/zip")
+
+        response = self.client.post(self.url, {"archive": archive, "frame_indices": [1, 2]})
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(list(self.job.frames.values_list("frame_index", flat=True)), [1, 2])
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, STATUS_UPLOADING)
+
+    def test_invalid_frame_rejects_whole_batch(self):
+        bad = SimpleUploadedFile("bad.png", b"not an image", content_type="image/png")
+        response = self.client.post(self.url, {"images": [self._upload("ok.png"), bad]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["frame_index"], 1)
+        self.assertFalse(self.job.frames.exists())
+
+
+@override_settings(USE_S3_STORAGE=True, DIRECT_UPLOADS_ENABLED=True, DIGITIZATION_AUTO_TRIGGER=False)
+class DirectFrameUploadTests(TestCase):
+    def setUp(self):
+        self.job = DigitizationJob.objects.create(room=Room.objects.create(), expected_frames=2)
+        self.png = cv2.imencode(".png", np.full((24, 32, 3), 200, dtype=np.uint8))[1].tobytes()
+        self.checksum = hashlib.sha256(self.png).hexdigest()
+
+        self.s3 = LocalS3().start()
+        self.addCleanup(self.s3.stop)
+        storage = self.s3.storage()
+        for patcher in (
+            mock.patch("media_ingest.direct_upload.default_storage", storage),
+            mock.patch.object(DigitizationFrame._meta.get_field("image"), "storage", storage),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _presign(self, frame_index=1, checksum=None):
+        return self.client.post(f"/api/digitization-jobs/{self.job.id}/frames/presign/", {
+            "frame_index": frame_index,
+            "content_type": "image/png",
+            "checksum": checksum or self.checksum,
+        })
+
+    def test_presign_then_finalize_records_frame(self):
+        presign = self._presign()
+        self.assertEqual(presign.status_code, 201, presign.content)
+        upload = presign.json()
+        self.assertEqual(upload["upload"]["method"], "PUT")
+        self.assertEqual(self.s3.put(upload["upload"], self.png), 200)
+        [name] = self.s3.objects
+        self.assertRegex(name, rf"^digitization/{self.job.id}/frames/frame_1_[0-9a-f]{{32}}\.png$")
+
+        response = self.client.post(
+            f"/api/digitization-jobs/{self.job.id}/frames/finalize/",
+            {"upload_token": upload["upload_token"]},
+        )
+
+        self.assertEqual(response.status_code, 201, response.content)
+        frame = self.job.frames.get()
+        self.assertEqual(
+            (frame.frame_index, frame.image.name, frame.width, frame.height, frame.size_bytes, frame.checksum),
+            (1, name, 32, 24, len(self.png), self.checksum),
+        )
+
+    def test_presigned_put_must_match_checksum(self):
+        upload = self._presign().json()
+        self.assertEqual(self.s3.put(upload["upload"], self.png[:-1]), 400)
+
+        response = self.client.post(
+            f"/api/digitization-jobs/{self.job.id}/frames/finalize/",
+            {"upload_token": upload["upload_token"]},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DigitizationFrame.objects.exists())
+
+    def _finalize(self, upload):
+        return self.client.post(
+            f"/api/digitization-jobs/{self.job.id}/frames/finalize/",
+            {"upload_token": upload["upload_token"]},
+        )
+
+    def test_reupload_keeps_recorded_frame_until_finalized(self):
+        first = self._presign().json()
+        self.s3.put(first["upload"], self.png)
+        self.assertEqual(self._finalize(first).status_code, 201)
+        recorded = self.job.frames.get().image.name
+
+        payload = b"not an image"
+        rejected = self._presign(checksum=hashlib.sha256(payload).hexdigest()).json()
+        self.s3.put(rejected["upload"], payload)
+        self.assertEqual(self._finalize(rejected).status_code, 400)
+        self.assertEqual(self.job.frames.get().image.name, recorded)
+        self.assertEqual(list(self.s3.objects), [recorded])
+
+        replacement = self._presign().json()
+        self.s3.put(replacement["upload"], self.png)
+        self.assertEqual(self._finalize(replacement).status_code, 201)
+        replaced = self.job.frames.get().image.name
+        self.assertNotEqual(replaced, recorded)
+        self.assertEqual(list(self.s3.objects), [replaced])
+
+    def test_finalize_rejects_token_for_another_job(self):
+        upload = self._presign().json()
+        self.s3.put(upload["upload"], self.png)
+        other = DigitizationJob.objects.create(room=self.job.room, expected_frames=2)
+
+        response = self.client.post(
+            f"/api/digitization-jobs/{other.id}/frames/finalize/",
+            {"upload_token": upload["upload_token"]},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DigitizationFrame.objects.exists())
+
+    def test_invalid_upload_is_discarded(self):
+        payload = b"not an image"
+        upload = self._presign(checksum=hashlib.sha256(payload).hexdigest()).json()
+        self.assertEqual(self.s3.put(upload["upload"], payload), 200)
+
+        response = self.client.post(
+            f"/api/digitization-jobs/{self.job.id}/frames/finalize/",
+            {"upload_token": upload["upload_token"]},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.s3.objects, {})
+
+    @override_settings(DIRECT_UPLOADS_ENABLED=False)
+    def test_disabled_without_direct_uploads(self):
+        self.assertEqual(self._presign().status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), DIGITIZATION_LOAD_WORKERS=3)
+class LoadFramesTests(TestCase):
+    def setUp(self):
+        job = DigitizationJob.objects.create(room=Room.objects.create(), expected_frames=4)
+        rng = np.random.default_rng(8)
+        self.images = [rng.integers(0, 256, size=(20, 30, 3), dtype=np.uint8) for _ in range(4)]
+        self.frames = []
+        for i, image in enumerate(self.images):
+            frame = DigitizationFrame(job=job, frame_index=i)
+            frame.image.save(f"f{i}.png", ContentFile(cv2.imencode(".png", image)[1].tobytes()), save=True)
+            self.frames.append(frame)
+
+    def test_loads_cropped_frames_in_order(self):
+        images = _load_frames(self.frames, crop=(5, 2, 10, 12))
+
+        for loaded, image in zip(images, self.images):
+            np.testing.assert_array_equal(loaded, image[2:14, 5:15])
+
+    def test_decodes_into_preallocated_stack(self):
+        stack = np.zeros((4, 12, 10, 3), dtype=np.uint8)
+        _load_frames(self.frames, crop=(5, 2, 10, 12), out=stack)
+
+        np.testing.assert_array_equal(stack, np.stack([image[2:14, 5:15] for image in self.images]))
+
+
+    def test_cache_errors_do_not_fail_loading(self):
+        for frame in self.frames:
+            frame.checksum = hashlib.sha256(frame.image.read()).hexdigest()
+            frame.image.close()
+        cache = mock.Mock(get=mock.Mock(side_effect=OSError), put=mock.Mock(side_effect=OSError))
+
+        with self.assertLogs("digitization.tasks", "WARNING"):
+            images = _load_frames(self.frames, cache=cache)
+
+        for loaded, image in zip(images, self.images):
+            np.testing.assert_array_equal(loaded, image)
+        self.assertEqual(cache.put.call_count, 4)
+
+    def test_lazy_frames_load_ahead_in_parallel(self):
+        frames = self.frames * 4
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def slow_decode(frame, cache=None):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return self.images[self.frames.index(frame)]
+
+        lazy = _LazyFrames(self.images[0][2:14, 5:15], frames, (5, 2, 10, 12), None, lookahead=3)
+        self.addCleanup(lazy.close)
+        with mock.patch("digitization.tasks._decode_frame", side_effect=slow_decode):
+            for i in range(len(frames)):
+                np.testing.assert_array_equal(lazy[i], self.images[i % 4][2:14, 5:15])
+                self.assertLessEqual(len(lazy._pending), 3)
+
+        self.assertGreater(peak[0], 1)
+        self.assertLessEqual(peak[0], 3)
+
+
+class BlobCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = BlobCache(tmp.name, max_bytes=250)
+
+    def test_get_counts_hits_and_misses(self):
+        self.assertIsNone(self.cache.get("a" * 64))
+        self.cache.put("a" * 64, b"frame")
+
+        self.assertEqual(self.cache.get("a" * 64), b"frame")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used_first(self):
+        for i, key in enumerate(("a" * 64, "b" * 64, "c" * 64)):
+            self.cache.put(key, bytes(100))
+            os.utime(self.cache.path(key), (1000 + i, 1000 + i))
+        self.cache.get("a" * 64)
+
+        self.cache.evict()
+
+        self.assertTrue(self.cache.path("a" * 64).exists())
+        self.assertFalse(self.cache.path("b" * 64).exists())
+        self.assertTrue(self.cache.path("c" * 64).exists())
+
+    def test_file_fetches_once(self):
+        fetch = mock.Mock(return_value=b"weights")
+
+        first = self.cache.file("d" * 64, ".pt", fetch)
+        second = self.cache.file("d" * 64, ".pt", fetch)
+
+        self.assertEqual(first, second)
+        self.assertEqual(first.read_bytes(), b"weights")
+        fetch.assert_called_once()
+
+    def test_io_errors_are_misses(self):
+        with mock.patch("tempfile.mkstemp", side_effect=OSError(28, "No space left on device")), \
+                self.assertLogs("digitization.blobcache", "WARNING"):
+            self.assertIsNone(self.cache.put("e" * 64, b"frame"))
+        self.assertEqual(list(self.cache.root.glob("*/.tmp-*")), [])
+
+        self.cache.put("e" * 64, b"frame")
+        with mock.patch("pathlib.Path.read_bytes", side_effect=PermissionError), \
+                self.assertLogs("digitization.blobcache", "WARNING"):
+            self.assertIsNone(self.cache.get("e" * 64))
+        self.assertEqual(self.cache.misses, 1)
+
+
+class MemmapStackTests(SimpleTestCase):
+    def test_memmap_stacks_match_in_memory_stacks(self):
+        rng = np.random.default_rng(42)
+        frames = rng.integers(0, 256, size=(5, 19, 23, 3), dtype=np.uint8)
+        masks = rng.random((5, 19, 23)) < 0.7
+
+        with tempfile.TemporaryDirectory() as scratch:
+            stack = allocate_stack(frames.shape, np.uint8, 0, scratch, "frames")
+            bg_mask_stack = allocate_stack(masks.shape, bool, True, scratch, "bg_masks")
+            self.assertIsInstance(stack, np.memmap)
+            self.assertTrue(bg_mask_stack.all())
+
+            stack[:] = frames
+            bg_mask_stack[:] = masks
+            median, sampled = masked_median(stack, bg_mask_stack, chunk_rows=4)
+            del stack, bg_mask_stack
+
+        expected, expected_sampled = masked_median(frames, masks, chunk_rows=4)
+        np.testing.assert_array_equal(median, expected)
+        np.testing.assert_array_equal(sampled, expected_sampled)
+
+
+class TiledEstimationTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        board = np.full((150, 170, 3), 235, dtype=np.uint8)
+        for i in range(12):
+            cv2.line(board, (int(rng.integers(0, 170)), 0), (int(rng.integers(0, 170)), 149), (40, 60, 160), 2)
+            cv2.putText(board, "ab", (10 * i, 12 * i + 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (20, 20, 20), 1)
+        noise = rng.integers(-6, 7, size=(6,) + board.shape)
+        self.stack = np.clip(board.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        self.bg_mask_stack = rng.random(self.stack.shape[:3]) < 0.6
+        self.bg_mask_stack[:, 60:70, 80:95] = False
+
+        self.config = build_config({"parallel_workers": 4})
+        self.config["tile_size"] = 48
+
+    def test_tile_grid_covers_board_once(self):
+        coverage = np.zeros((150, 170), dtype=np.int32)
+        for (oys, oxs), (iys, ixs) in tile_grid((150, 170), 48, halo=9):
+            coverage[oys, oxs][iys, ixs] += 1
+        self.assertTrue((coverage == 1).all())
+
+    def test_tiled_results_match_whole_board(self):
+        background, stroke_color = tiled_background_and_strokes(self.stack, self.bg_mask_stack, self.config)
+        expected_bg, expected_strokes = estimate_background_and_strokes(self.stack, self.bg_mask_stack)
+        np.testing.assert_array_equal(background, expected_bg)
+        np.testing.assert_array_equal(stroke_color, expected_strokes)
+
+        np.testing.assert_array_equal(tiled_ink_mask(background, self.config), detect_ink_mask(background, self.config))
+
+    def test_tiled_ink_mask_matches_for_other_block_and_kernel_sizes(self):
+        # Blurred noise gives blobs near every tile edge for the morphology to reach across.
+        noise = cv2.GaussianBlur(np.random.default_rng(17).normal(size=(300, 330)).astype(np.float32), (0, 0), 2)
+        gray = cv2.normalize(noise, None, 120, 255, cv2.NORM_MINMAX).astype(np.uint8)
+        background = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        for block, kernel in ((15, 3), (9, 5), (21, 7)):
+            with self.subTest(block=block, kernel=kernel):
+                config = build_config({"adaptive_block_size": block, "morph_kernel_size": kernel, "adaptive_c": 0})
+                config["tile_size"] = 128
+                np.testing.assert_array_equal(tiled_ink_mask(background, config), detect_ink_mask(background, config))
+
+
+class OnlineBackgroundModelTests(SimpleTestCase):
+    def test_first_samples_are_averaged_then_smoothed(self):
+        board = OnlineBackgroundModel.empty((2, 2), alpha=0.25)
+        mask = np.array([[True, True], [True, False]])
+        for value in (100, 110, 120):
+            board.update(np.full((2, 2, 3), value, dtype=np.uint8), mask)
+
+        current, sampled = board.current()
+        np.testing.assert_array_equal(sampled, mask)
+        self.assertEqual(current[0, 0, 0], 110)
+        self.assertEqual(current[1, 1, 0], 255)
+
+        board.update(np.full((2, 2, 3), 30, dtype=np.uint8), mask)
+        # 1 / 4 is no larger than alpha, so the fourth sample moves a quarter of the way.
+        self.assertEqual(board.current()[0][0, 0, 0], 90)
+
+    def test_live_state_round_trip(self):
+        rng = np.random.default_rng(5)
+        board = OnlineBackgroundModel.empty((6, 8), alpha=0.3)
+        board.update(rng.integers(0, 256, size=(6, 8, 3), dtype=np.uint8), rng.random((6, 8)) < 0.5)
+        features = {0: (rng.random((4, 7)).astype(np.float32), rng.integers(0, 256, size=(4, 32), dtype=np.uint8))}
+
+        loaded, bbox, loaded_features = load_live_state(dump_live_state(board, (1, 2, 8, 6), features), 0.3)
+
+        self.assertEqual(bbox, (1, 2, 8, 6))
+        np.testing.assert_array_equal(loaded.current()[0], board.current()[0])
+        np.testing.assert_array_equal(loaded.current()[1], board.current()[1])
+        np.testing.assert_array_equal(loaded_features[0][1], features[0][1])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), DIGITIZATION_CACHE_MAX_BYTES=0)
+class LiveBoardTests(TestCase):
+    def setUp(self):
+        self.room = Room.objects.create()
+        self.board = np.full((120, 160, 3), 40, dtype=np.uint8)
+        self.board[10:110, 15:145] = 230
+        cv2.putText(self.board, "live", (30, 70), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (30, 30, 140), 3)
+        self.png = cv2.imencode(".png", self.board)[1].tobytes()
+
+    def _frame_png(self, i):
+        board = self.board.copy()
+        board[100, 20 + i] = 0
+        return cv2.imencode(".png", board)[1].tobytes()
+
+    def _run_live(self, frames):
+        with mock.patch("digitization.views.current_app.send_task"):
+            response = self.client.post(f"/api/rooms/{self.room.id}/digitization-jobs/", {
+                "expected_frames": 3,
+                "options": {"live": True, "person_segmentation": "heuristic", "expect_person_in_each_frame": False},
+            }, content_type="application/json")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(response.json()["live"])
+        job_id = response.json()["job_id"]
+
+        names = []
+        with mock.patch("digitization.views.current_app.send_task") as send_task, \
+                mock.patch("digitization.tasks.broadcast_to_room") as broadcast:
+            for i in range(frames):
+                image = SimpleUploadedFile(f"f{i}.png", self._frame_png(i), content_type="image/png")
+                self.client.post(f"/api/digitization-jobs/{job_id}/frames/", {"frame_index": i, "image": image})
+                name, kwargs = send_task.call_args[0][0], send_task.call_args[1]
+                self.assertEqual(name, "digitization.tasks.process_live_frame")
+                with self.captureOnCommitCallbacks(execute=True):
+                    process_live_frame(*kwargs["args"])
+                live_board = LiveBoard.objects.get(job_id=job_id)
+                names.append((live_board.state.name, live_board.canvas.name))
+        return live_board, broadcast, names
+
+    def test_each_upload_updates_the_live_canvas(self):
+        live_board, broadcast, _ = self._run_live(2)
+
+        self.assertEqual(live_board.frames, 2)
+        self.assertGreater(live_board.metrics["ink_coverage_pct"], 0)
+        self.assertEqual(broadcast.call_count, 2)
+        self.assertTrue(broadcast.call_args[0][1]["live"])
+
+        response = self.client.get(f"/api/rooms/{self.room.id}/whiteboard/latest/")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(response.json()["live"])
+
+    def test_replaced_files_are_deleted_after_commit(self):
+        live_board, _, names = self._run_live(2)
+
+        storage = live_board.canvas.storage
+        self.assertEqual(names[1], (live_board.state.name, live_board.canvas.name))
+        for old, new in zip(*names):
+            self.assertNotEqual(old, new)
+            self.assertFalse(storage.exists(old))
+            self.assertTrue(storage.exists(new))
+
+    def test_frame_cache_stays_within_budget(self):
+        cache_dir = tempfile.mkdtemp()
+        budget = len(self._frame_png(0)) * 3 // 2
+        with override_settings(DIGITIZATION_CACHE_DIR=cache_dir, DIGITIZATION_CACHE_MAX_BYTES=budget):
+            self._run_live(3)
+
+        sizes = [path.stat().st_size for path in BlobCache(cache_dir, budget).root.glob("*/*")]
+        self.assertEqual(len(sizes), 1)
+        self.assertLessEqual(sum(sizes), budget)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), DIGITIZATION_BOARD_TILE_SIZE=32)
+class BoardTilesTests(TestCase):
+    def setUp(self):
+        self.room = Room.objects.create()
+        self.canvas = np.full((70, 100, 3), 255, dtype=np.uint8)
+
+    def test_dirty_tiles(self):
+        changed = self.canvas.copy()
+        changed[40, 99] = 0
+        self.assertEqual(dirty_tiles(self.canvas, changed, 32), [(1, 3)])
+        self.assertEqual(dirty_tiles(self.canvas, self.canvas, 32), [])
+        self.assertEqual(len(dirty_tiles(None, self.canvas, 32)), 3 * 4)
+
+    def test_only_changed_tiles_are_republished(self):
+        first, changed = publish_board_tiles(self.room.id, self.canvas)
+        self.assertEqual((first.version, len(changed)), (1, 12))
+
+        canvas = self.canvas.copy()
+        cv2.line(canvas, (5, 5), (40, 5), (0, 0, 0), 2)
+        second, changed = publish_board_tiles(self.room.id, canvas)
+        self.assertEqual(second.version, 2)
+        self.assertEqual(changed, [(0, 0), (0, 1)])
+
+        unchanged, changed = publish_board_tiles(self.room.id, canvas)
+        self.assertEqual((unchanged.version, changed), (2, []))
+
+        response = self.client.get(f"/api/rooms/{self.room.id}/whiteboard/tiles/", {"since": 1})
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        self.assertEqual(body["version"], 2)
+        self.assertEqual([(t["row"], t["col"], t["version"]) for t in body["tiles"]], [(0, 0, 2), (0, 1, 2)])
+
+        full = self.client.get(f"/api/rooms/{self.room.id}/whiteboard/tiles/").json()
+        self.assertEqual(len(full["tiles"]), 12)
+
+    def test_replaced_files_are_deleted_after_commit(self):
+        first, _ = publish_board_tiles(self.room.id, self.canvas)
+        old_names = [first.canvas.name, first.tiles["0,0"]["name"]]
+        storage = first.canvas.storage
+
+        canvas = self.canvas.copy()
+        cv2.line(canvas, (5, 5), (20, 5), (0, 0, 0), 2)
+        with self.captureOnCommitCallbacks() as callbacks:
+            second, _ = publish_board_tiles(self.room.id, canvas)
+        self.assertTrue(all(storage.exists(name) for name in old_names))
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(any(storage.exists(name) for name in old_names))
+        self.assertTrue(storage.exists(second.canvas.name))
+        self.assertTrue(storage.exists(second.tiles["0,0"]["name"]))
+
+    def test_failed_publish_keeps_the_committed_canvas(self):
+        publish_board_tiles(self.room.id, self.canvas)
+        canvas = self.canvas.copy()
+        cv2.line(canvas, (5, 5), (20, 5), (0, 0, 0), 2)
+
+        with mock.patch.object(BoardTileSet, "save", side_effect=DatabaseError), \
+                self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(DatabaseError):
+                publish_board_tiles(self.room.id, canvas)
+
+        tileset = BoardTileSet.objects.get(room=self.room)
+        self.assertTrue(tileset.canvas.storage.exists(tileset.canvas.name))
+        republished, changed = publish_board_tiles(self.room.id, canvas)
+        self.assertEqual((republished.version, changed), (2, [(0, 0)]))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), DIGITIZATION_PYRAMID_TILE_SIZE=64, DIGITIZATION_THUMBNAIL_WIDTHS=[50, 400])
+class ResultPyramidTests(TestCase):
+    def setUp(self):
+        self.job = DigitizationJob.objects.create(room=Room.objects.create())
+        self.canvas = np.full((100, 150, 3), 255, dtype=np.uint8)
+        cv2.rectangle(self.canvas, (10, 10), (140, 90), (0, 0, 200), 3)
+
+    def test_deep_zoom_levels_halve_down_to_one_pixel(self):
+        sizes = [(level, image.shape[:2]) for level, image in deep_zoom_levels(self.canvas)]
+        self.assertEqual(sizes[0], (8, (100, 150)))
+        self.assertEqual(sizes[1], (7, (50, 75)))
+        self.assertEqual(sizes[-1], (0, (1, 1)))
+
+    def test_tiles_and_thumbnails_are_served(self):
+        self.job.pyramid = save_tile_pyramid(self.job, self.canvas)
+        self.job.thumbnails = save_thumbnails(self.job, self.canvas)
+        self.job.result_image.save("digital_board.png", ContentFile(b"png"), save=False)
+        self.job.save()
+        self.assertEqual(list(self.job.thumbnails), ["50"])
+
+        base = f"/api/digitization-jobs/{self.job.id}/tiles"
+        response = self.client.get(f"{base}/8/2/1/")
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response["Location"].endswith("/8/2_1.png"))
+        self.assertEqual(self.client.get(f"{base}/8/3/0/").status_code, 404)
+        self.assertEqual(self.client.get(f"{base}/9/0/0/").status_code, 404)
+
+        tile = self.job.pyramid["root"] + "/7/1_0.png"
+        with self.job.result_image.storage.open(tile) as fh:
+            image = cv2.imdecode(np.frombuffer(fh.read(), np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(image.shape[:2], (50, 11))
+
+        result = self.client.get(f"/api/digitization-jobs/{self.job.id}/").json()["result"]
+        self.assertEqual(list(result["thumbnails"]), ["50"])
+        self.assertTrue(result["pyramid"]["tile_url"].endswith("/tiles/{level}/{x}/{y}/"))
+
+
+class PaletteCanvasTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        self.ink_mask = np.zeros((40, 61), dtype=bool)
+        self.stroke_color = np.full((40, 61, 3), 255, dtype=np.uint8)
+        for row, color in ((5, (20, 20, 20)), (15, (180, 40, 30)), (25, (30, 40, 190))):
+            self.ink_mask[row:row + 4] = True
+            noise = rng.integers(-8, 9, size=(4, 61, 3))
+            self.stroke_color[row:row + 4] = np.clip(np.array(color) + noise, 0, 255)
+
+    def test_strokes_cluster_into_marker_colours(self):
+        indices, palette = quantize_canvas(self.ink_mask, self.stroke_color, 3)
+
+        self.assertEqual(len(palette), 4)
+        np.testing.assert_array_equal(palette[0], [255, 255, 255])
+        self.assertTrue((indices[~self.ink_mask] == 0).all())
+        for row in (5, 15, 25):
+            self.assertEqual(len(np.unique(indices[row:row + 4])), 1)
+        error = np.abs(palette[indices].astype(int) - self.stroke_color.astype(int))[self.ink_mask]
+        self.assertLessEqual(error.max(), 8)
+
+    def test_few_colours_are_kept_exactly(self):
+        stroke_color = np.full_like(self.stroke_color, 255)
+        stroke_color[5:9] = (20, 20, 20)
+        stroke_color[15:29] = (180, 40, 30)
+        indices, palette = quantize_canvas(self.ink_mask, stroke_color, 8)
+
+        self.assertEqual(len(palette), 3)
+        canvas = np.full_like(stroke_color, 255)
+        canvas[self.ink_mask] = stroke_color[self.ink_mask]
+        np.testing.assert_array_equal(palette[indices], canvas)
+
+    def test_indexed_png_decodes_to_canvas(self):
+        for max_colors in (3, 40):
+            indices, palette = quantize_canvas(self.ink_mask, self.stroke_color, max_colors)
+            data = encode_indexed_png(indices, palette)
+            decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            np.testing.assert_array_equal(decoded, palette[indices])
+
+
+def _rasterize_svg_paths(svg, width, height, scale=8):
+    """Pixels the board's paths cover at least half of, drawn supersampled with even-odd fills and any 1 px strokes."""
+    import re
+
+    offset = 0.5 if 'transform="translate(.5 .5)"' in svg else 0.0
+    covered = np.zeros((height * scale, width * scale), dtype=np.uint8)
+    for attrs, d in re.findall(r'<path ([^>]*)d="([^"]*)"', svg):
+        filled = np.zeros_like(covered)
+        for subpath in d.strip("Z").split("ZM"):
+            values = [float(v) for v in subpath.strip("MZ").split()]
+            points = ((np.array(values).reshape(-1, 2) + offset) * scale).round().astype(np.int32)
+            shape = np.zeros_like(covered)
+            cv2.fillPoly(shape, [points], 1)
+            filled ^= shape
+            if "stroke=" in attrs:
+                cv2.polylines(covered, [points], True, 1, thickness=scale)
+        covered |= filled
+    return cv2.resize(covered.astype(np.float32), (width, height), interpolation=cv2.INTER_AREA) > 0.5
+
+
+class VectorExportTests(SimpleTestCase):
+    def setUp(self):
+        self.palette = np.array([[255, 255, 255], [20, 20, 20], [30, 40, 190]], dtype=np.uint8)
+        self.indices = np.zeros((50, 80), dtype=np.uint8)
+        self.indices[10:40, 10:40] = 1
+        self.indices[20:30, 20:30] = 0
+        self.indices[12, 12] = 2
+        self.indices[10:40, 55:60] = 2
+
+    def test_strokes_take_their_majority_colour(self):
+        strokes = trace_strokes(self.indices, self.palette, epsilon=0)
+        self.assertEqual([color.tolist() for color, _ in strokes], [[20, 20, 20], [30, 40, 190]])
+
+        ring = np.zeros(self.indices.shape, dtype=np.uint8)
+        cv2.fillPoly(ring, [polygon.reshape(-1, 1, 2).astype(np.int32) for polygon in strokes[0][1]], 1)
+        expected = np.isin(self.indices, (1, 2)).astype(np.uint8)
+        expected[:, 50:] = 0
+        np.testing.assert_array_equal(ring, expected)
+
+    def test_rasterized_svg_matches_ink(self):
+        indices = np.zeros((60, 90), dtype=np.uint8)
+        for row, width in ((5, 1), (12, 2), (20, 3)):
+            indices[row:row + width, 5:85] = 1
+        indices[30:55, 40:50] = 2
+        indices[10:50, 88] = 2
+        indices[35:50, 10:30] = 1
+        indices[40:45, 15:25] = 0
+        indices[57, 60] = 1
+
+        svg = strokes_to_svg(trace_strokes(indices, self.palette, epsilon=0), 90, 60).decode()
+        rendered = _rasterize_svg_paths(svg, 90, 60)
+
+        np.testing.assert_array_equal(rendered, indices > 0)
+
+    def test_svg_has_one_path_per_colour(self):
+        svg = strokes_to_svg(trace_strokes(self.indices, self.palette), 80, 50).decode()
+        self.assertIn('viewBox="0 0 80 50"', svg)
+        self.assertEqual(svg.count("<path"), 2)
+        self.assertIn('fill="#be281e"', svg)
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    DIGITIZATION_PYRAMID_TILE_SIZE=64,
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+class LazyArtifactTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.background = np.full((40, 90, 3), 210, dtype=np.uint8)
+        canvas = np.full((40, 90, 3), 255, dtype=np.uint8)
+        canvas[10:20, 10:80] = (30, 30, 160)
+
+        self.job = DigitizationJob.objects.create(room=Room.objects.create(), status=STATUS_SUCCEEDED)
+        self.job.result_image.save("digital_board.png", ContentFile(cv2.imencode(".png", canvas)[1].tobytes()))
+        self.job.intermediates = save_intermediates(self.job, self.background, canvas, build_config({}))
+        self.job.pyramid = pyramid_description(canvas.shape)
+        self.job.save()
+
+    def _request_artifact(self, url, name):
+        with mock.patch("digitization.views.current_app.send_task") as send_task:
+            for _ in range(3):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 202)
+                self.assertEqual(response["Retry-After"], "2")
+        # Repeated requests while the render is queued do not queue it again.
+        send_task.assert_called_once_with("digitization.tasks.render_job_artifact", args=[str(self.job.id), name])
+
+    def test_debug_image_is_rendered_once_by_a_worker(self):
+        detail = self.client.get(f"/api/digitization-jobs/{self.job.id}/").json()["result"]
+        self.assertTrue(detail["debug_url"].endswith(f"/api/digitization-jobs/{self.job.id}/artifacts/debug/"))
+
+        url = f"/api/digitization-jobs/{self.job.id}/artifacts/debug/"
+        with mock.patch("digitization.artifacts.render_artifact") as render:
+            self._request_artifact(url, "debug")
+        render.assert_not_called()
+        render_job_artifact(str(self.job.id), "debug")
+        self.job.refresh_from_db()
+        self.assertTrue(self.job.debug_image)
+        self.assertFalse(self.job.background_image)
+        with self.job.debug_image.open("rb") as fh:
+            debug = cv2.imdecode(np.frombuffer(fh.read(), np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(debug.shape, (40, 180, 3))
+
+        name = self.job.debug_image.name
+        render_job_artifact(str(self.job.id), "debug")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response["Location"].endswith(name))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.debug_image.name, name)
+        detail = self.client.get(f"/api/digitization-jobs/{self.job.id}/").json()["result"]
+        self.assertTrue(detail["debug_url"].endswith(name))
+
+    def test_first_tile_request_builds_the_pyramid(self):
+        with mock.patch("digitization.views.current_app.send_task") as send_task:
+            for x in range(2):
+                response = self.client.get(f"/api/digitization-jobs/{self.job.id}/tiles/7/{x}/0/")
+                self.assertEqual(response.status_code, 202)
+        send_task.assert_called_once_with("digitization.tasks.render_job_artifact", args=[str(self.job.id), "pyramid"])
+        render_job_artifact(str(self.job.id), "pyramid")
+        self.job.refresh_from_db()
+        self.assertIn("root", self.job.pyramid)
+        response = self.client.get(f"/api/digitization-jobs/{self.job.id}/tiles/7/1/0/")
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response["Location"].endswith(f"{self.job.pyramid['root']}/7/1_0.png"))
+
+    def test_failed_render_can_be_queued_again(self):
+        url = f"/api/digitization-jobs/{self.job.id}/artifacts/webp/"
+        self._request_artifact(url, "webp")
+        with mock.patch("digitization.artifacts.render_artifact", side_effect=OSError), \
+                self.assertLogs("digitization.tasks", "ERROR"):
+            render_job_artifact(str(self.job.id), "webp")
+        self._request_artifact(url, "webp")
+
+    def test_missing_intermediates_are_not_queued(self):
+        self.job.intermediates = {}
+        self.job.save()
+        with mock.patch("digitization.views.current_app.send_task") as send_task:
+            response = self.client.get(f"/api/digitization-jobs/{self.job.id}/artifacts/background/")
+        self.assertEqual(response.status_code, 404)
+        send_task.assert_not_called()
+
+    def test_unknown_artifact(self):
+        self.assertEqual(self.client.get(f"/api/digitization-jobs/{self.job.id}/artifacts/nope/").status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RerenderTests(TestCase):
+    def setUp(self):
+        background = np.full((80, 120, 3), 225, dtype=np.uint8)
+        cv2.putText(background, "abc", (10, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (150, 150, 150), 2)
+        cv2.putText(background, "xyz", (10, 75), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (40, 40, 170), 2)
+        self.job = DigitizationJob.objects.create(
+            room=Room.objects.create(),
+            status=STATUS_SUCCEEDED,
+            options={"person_segmentation": "heuristic"},
+            metrics={"frames_used": 3},
+        )
+        config = build_config(self.job.options)
+        self.job.intermediates = save_intermediates(self.job, background, background, config)
+        self.job.result_image.save("digital_board.png", ContentFile(b"png"), save=False)
+        self.job.save()
+        self.url = f"/api/digitization-jobs/{self.job.id}/rerender/"
+
+    def _rerender(self, options):
+        with mock.patch("digitization.views.current_app.send_task") as send_task:
+            response = self.client.post(self.url, {"options": options}, content_type="application/json")
+        self.assertEqual(response.status_code, 202, response.content)
+        job_id = response.json()["job_id"]
+        send_task.assert_called_once_with("digitization.tasks.rerender_digitization_job", args=[job_id])
+        self.assertEqual(DigitizationJob.objects.get(id=job_id).status, STATUS_QUEUED)
+        rerender_digitization_job(job_id)
+        return DigitizationJob.objects.get(id=job_id)
+
+    def test_ink_options_rerender_from_intermediates(self):
+        with mock.patch("digitization.tasks.broadcast_to_room") as broadcast, \
+                mock.patch("digitization.pipeline.detect_person_masks") as detect_person_masks:
+            faint_job = self._rerender({"adaptive_c": 40})
+            strong_job = self._rerender({"adaptive_c": 2})
+        detect_person_masks.assert_not_called()
+        self.assertEqual(broadcast.call_count, 2)
+
+        self.assertEqual(strong_job.status, STATUS_SUCCEEDED)
+        self.assertEqual(strong_job.options, {"person_segmentation": "heuristic", "adaptive_c": 2})
+        self.assertEqual(strong_job.metrics["rerendered_from"], str(self.job.id))
+        self.assertEqual(strong_job.metrics["frames_used"], 3)
+        self.assertGreater(strong_job.metrics["ink_coverage_pct"], faint_job.metrics["ink_coverage_pct"])
+        self.assertTrue(strong_job.result_image)
+        self.assertTrue(strong_job.result_svg)
+        self.assertEqual(strong_job.intermediates, self.job.intermediates)
+
+    def test_older_job_does_not_replace_current_board(self):
+        DigitizationJob.objects.create(room=self.job.room, status=STATUS_SUCCEEDED, finished_at=timezone.now())
+        with mock.patch("digitization.tasks.broadcast_to_room") as broadcast, \
+                mock.patch("digitization.tasks._publish_tiles") as publish_tiles:
+            rerendered = self._rerender({"adaptive_c": 2})
+        self.assertEqual(rerendered.status, STATUS_SUCCEEDED)
+        publish_tiles.assert_not_called()
+        broadcast.assert_not_called()
+
+    def test_upstream_options_need_a_new_job(self):
+        with mock.patch("digitization.tasks.broadcast_to_room") as broadcast:
+            rerendered = self._rerender({"whiteboard_thresh": 150})
+        self.assertEqual(rerendered.status, STATUS_FAILED)
+        self.assertIn("whiteboard_thresh", rerendered.error_message)
+        broadcast.assert_not_called()
+
+        self.job.intermediates = {}
+        self.job.save()
+        response = self.client.post(self.url, {"options": {"adaptive_c": 2}}, content_type="application/json")
+        self.assertEqual(response.status_code, 409)
+
+
+class OnnxSegmentationTests(SimpleTestCase):
+    def setUp(self):
+        self.config = build_config({"person_segmentation": "onnx", "onnx_input_size": 640})
+        # Two prototypes: one positive everywhere, one negative everywhere.
+        self.protos = np.stack([np.ones((160, 160)), -np.ones((160, 160))]).astype(np.float32)
+        self.preds = np.zeros((4 + 80 + 2, 6), dtype=np.float32)
+
+    def _detection(self, anchor, box, cls, score, coeffs):
+        self.preds[:4, anchor] = box
+        self.preds[4 + cls, anchor] = score
+        self.preds[84:, anchor] = coeffs
+
+    def test_letterbox_centres_the_frame(self):
+        padded, letterbox = letterbox_image(np.zeros((300, 640, 3), dtype=np.uint8), 640)
+        self.assertEqual(letterbox, (640, 1.0, 0, 170))
+        self.assertTrue((padded[:170] == 114).all())
+        self.assertTrue((padded[170:470] == 0).all())
+
+    def test_person_masks_are_decoded_from_prototypes(self):
+        frame = np.zeros((320, 640, 3), dtype=np.uint8)
+        _, letterbox = letterbox_image(frame, 640)
+        # A person at x 100..300, y 40..200 of the frame, in letterboxed input pixels.
+        self._detection(0, (200, 160 + 120, 200, 160), 0, 0.9, (1, 0))
+        self._detection(1, (202, 160 + 121, 200, 160), 0, 0.8, (1, 0))
+        self._detection(2, (500, 160 + 100, 80, 80), 0, 0.3, (1, 0))
+        self._detection(3, (500, 160 + 250, 80, 80), 2, 0.9, (1, 0))
+        self._detection(4, (500, 160 + 100, 60, 60), 0, 0.9, (0, 1))
+
+        calls = []
+
+        def model(img, input_size):
+            calls.append((img.shape, input_size))
+            return self.preds, self.protos, letterbox
+
+        mask = detect_person_masks([frame], model, (320, 640), self.config)[0]
+        self.assertEqual(calls, [((320, 640, 3), 640)])
+        self.assertTrue(mask[42:198, 102:298].all())
+        self.assertFalse(mask[:36].any() or mask[204:].any())
+        self.assertFalse(mask[:, :96].any() or mask[:, 304:].any())
+
+    def test_no_person_gives_empty_mask(self):
+        self._detection(0, (200, 200, 100, 100), 5, 0.9, (1, 0))
+        mask = decode_person_segments(self.preds, self.protos, (640, 1.0, 0, 0), (640, 640), self.config)
+        self.assertFalse(mask.any())
+
+
+class StreamingBackgroundEstimatorTests(SimpleTestCase):
+    def _median(self, frames, mask, bins=16):
+        estimator = StreamingBackgroundEstimator(frames.shape[1:3], bins)
+        for frame, frame_mask in zip(frames, mask):
+            estimator.update(frame, frame_mask)
+        return estimator.median()
+
+    def test_constant_boards_are_exact(self):
+        mask = np.random.default_rng(3).random((7, 10, 12)) > 0.3
+        for value in (0, 131, 255):
+            frames = np.full((7, 10, 12, 3), value, dtype=np.uint8)
+            median, sampled = self._median(frames, mask)
+            expected, expected_sampled = masked_median(frames, mask)
+            np.testing.assert_array_equal(sampled, expected_sampled)
+            np.testing.assert_array_equal(median, expected)
+
+    def test_close_to_masked_median(self):
+        rng = np.random.default_rng(4)
+        frames = np.clip(200 + rng.normal(0, 8, (9, 16, 20, 3)), 0, 255).astype(np.uint8)
+        mask = rng.random((9, 16, 20)) > 0.2
+        mask[:, 0, 0] = False
+        median, sampled = self._median(frames, mask)
+        expected, _ = masked_median(frames, mask)
+        self.assertFalse(sampled[0, 0])
+        np.testing.assert_array_equal(median[0, 0], [255, 255, 255])
+        # Within one 16-value bucket of the exact median.
+        self.assertLessEqual(np.abs(median.astype(int) - expected)[sampled].max(), 16)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DigitizationJobProcessingTests(TestCase):
+    def setUp(self):
+        self.room = Room.objects.create()
+        rng = np.random.default_rng(8)
+        board = np.full((300, 400, 3), 40, dtype=np.uint8)
+        board[30:270, 40:360] = 235
+        for _ in range(40):
+            x, y = int(rng.integers(50, 340)), int(rng.integers(40, 250))
+            cv2.line(board, (x, y), (x + 12, y + 7), (20, 20, 160), 2)
+        self.frames = []
+        for i in range(5):
+            frame = board.copy()
+            cv2.rectangle(frame, (60 + 40 * i, 100), (120 + 40 * i, 260), (50, 60, 70), -1)
+            self.frames.append(cv2.imencode(".png", frame)[1].tobytes())
+
+    def _run(self, **options):
+        job = DigitizationJob.objects.create(
+            room=self.room,
+            expected_frames=len(self.frames),
+            options={"person_segmentation": "heuristic", "expect_person_in_each_frame": False, **options},
+            status=STATUS_QUEUED,
+        )
+        for i, data in enumerate(self.frames):
+            frame = DigitizationFrame(job=job, frame_index=i, checksum=hashlib.sha256(data).hexdigest())
+            frame.image.save(f"f{i}.png", ContentFile(data))
+        with mock.patch("digitization.tasks.broadcast_to_room"), \
+                mock.patch("digitization.progress.broadcast_to_room"), \
+                mock.patch("digitization.progress._get_redis_client"):
+            process_digitization_job(str(job.id))
+        job.refresh_from_db()
+        self.assertEqual(job.status, STATUS_SUCCEEDED, job.error_message)
+        return job
+
+    def _canvas(self, job):
+        with job.result_image.open("rb") as fh:
+            return cv2.imdecode(np.frombuffer(fh.read(), np.uint8), cv2.IMREAD_COLOR)
+
+    def test_blank_board_exports_an_empty_svg(self):
+        board = np.full((300, 400, 3), 40, dtype=np.uint8)
+        board[30:270, 40:360] = 235
+        self.frames = []
+        for i in range(5):
+            frame = board.copy()
+            cv2.rectangle(frame, (60 + 40 * i, 100), (120 + 40 * i, 260), (50, 60, 70), -1)
+            self.frames.append(cv2.imencode(".png", frame)[1].tobytes())
+
+        job = self._run()
+
+        self.assertEqual(job.metrics["ink_coverage_pct"], 0)
+        with job.result_svg.open("rb") as fh:
+            svg = fh.read().decode()
+        self.assertNotIn("<path", svg)
+        self.assertTrue(svg.endswith("</svg>"))
+
+    def test_same_frames_and_options_reuse_the_result(self):
+        first = self._run()
+        with mock.patch("digitization.pipeline.iter_processed_frames") as process_frames:
+            second = self._run(stack_storage="memmap", parallelism="thread")
+        process_frames.assert_not_called()
+
+        self.assertEqual(second.fingerprint, first.fingerprint)
+        self.assertEqual(second.metrics["reused_from"], str(first.id))
+        self.assertEqual(second.result_image.name, first.result_image.name)
+        self.assertEqual(second.intermediates, first.intermediates)
+
+    def test_changed_option_recomputes(self):
+        first = self._run()
+        with mock.patch("digitization.pipeline.iter_processed_frames", wraps=iter_processed_frames) as process_frames:
+            second = self._run(adaptive_c=9)
+        process_frames.assert_called_once()
+
+        self.assertNotEqual(second.fingerprint, first.fingerprint)
+        self.assertNotIn("reused_from", second.metrics)
+        self.assertNotEqual(second.result_image.name, first.result_image.name)
+
+    def test_streaming_matches_median_without_stacking_frames(self):
+        median_job = self._run(palette_colors=0)
+        with mock.patch("digitization.tasks._load_frames") as load_frames:
+            streaming_job = self._run(palette_colors=0, background_mode="streaming")
+        load_frames.assert_not_called()
+        self.assertEqual(streaming_job.metrics["stack_storage"], "streaming")
+
+        median, streaming = self._canvas(median_job), self._canvas(streaming_job)
+        self.assertEqual(median.shape, streaming.shape)
+        differs = (np.abs(median.astype(int) - streaming) > 12).any(axis=-1)
+        self.assertLess(np.count_nonzero(differs), 0.01 * differs.size)
@@ -1,17 +1,34 @@
 from django.urls import path
 
 from .views import (
+    BoardTilesView,
+    DigitizationJobArtifactView,
+    DigitizationFrameBatchUploadView,
+    DigitizationFrameFinalizeView,
+    DigitizationFramePresignView,
     DigitizationFrameUploadView,
     DigitizationJobCreateView,
     DigitizationJobDetailView,
+    DigitizationJobRerenderView,
     DigitizationJobRunView,
+    DigitizationJobTileView,
     LatestWhiteboardView,
 )
 
 urlpatterns = [
     path("rooms/<uuid:room_id>/digitization-jobs/", DigitizationJobCreateView.as_view()),
     path("digitization-jobs/<uuid:job_id>/frames/", DigitizationFrameUploadView.as_view()),
+    path("digitization-jobs/<uuid:job_id>/frames/batch/", DigitizationFrameBatchUploadView.as_view()),
+    path("digitization-jobs/<uuid:job_id>/frames/presign/", DigitizationFramePresignView.as_view()),
+    path("digitization-jobs/<uuid:job_id>/frames/finalize/", DigitizationFrameFinalizeView.as_view()),
     path("digitization-jobs/<uuid:job_id>/run/", DigitizationJobRunView.as_view()),
+    path("digitization-jobs/<uuid:job_id>/rerender/", DigitizationJobRerenderView.as_view()),
     path("digitization-jobs/<uuid:job_id>/", DigitizationJobDetailView.as_view()),
+    path("digitization-jobs/<uuid:job_id>/artifacts/<str:name>/", DigitizationJobArtifactView.as_view()),
+    path(
+        "digitization-jobs/<uuid:job_id>/tiles/<int:level>/<int:x>/<int:y>/",
+        DigitizationJobTileView.as_view(),
+    ),
     path("rooms/<uuid:room_id>/whiteboard/latest/", LatestWhiteboardView.as_view()),
+    path("rooms/<uuid:room_id>/whiteboard/tiles/", BoardTilesView.as_view()),
 ]
@@ -1,11 +1,39 @@
+import hashlib
+import logging
+import mimetypes
+import posixpath
+import uuid
+import zipfile
+
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from celery import current_app
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from media_ingest.direct_upload import (
+    create_upload,
+    direct_uploads_enabled,
+    discard_upload,
+    read_upload_token,
+    read_uploaded_head,
+    uploaded_size,
+)
 from rooms.models import Room
+from .artifacts import (
+    LAZY_ARTIFACTS,
+    artifact_available,
+    artifact_queue_key,
+    artifact_ready,
+    pyramid_tile_path,
+    thumbnail_urls,
+)
 from .constants import (
     STATUS_CREATED,
     STATUS_FAILED,
@@ -13,10 +41,26 @@ from .constants import (
     STATUS_RUNNING,
     STATUS_SUCCEEDED,
     STATUS_UPLOADING,
+    STAGE_INK,
     STAGE_LOADING,
 )
-from .models import DigitizationFrame, DigitizationJob
-from .serializers import DigitizationFrameUploadSerializer, DigitizationJobCreateSerializer
+from .imageprobe import probe_image
+from .models import BoardTileSet, DigitizationFrame, DigitizationJob, LiveBoard, frame_upload_to
+from .progress import read_progress
+from .serializers import (
+    DigitizationFrameBatchUploadSerializer,
+    DigitizationFrameFinalizeSerializer,
+    DigitizationFramePresignSerializer,
+    DigitizationFrameUploadSerializer,
+    DigitizationJobCreateSerializer,
+    DigitizationJobRerenderSerializer,
+)
+
+logger = logging.getLogger(__name__)
+
+UPLOADABLE_STATUSES = {STATUS_CREATED, STATUS_UPLOADING, STATUS_FAILED}
+# Enough of a direct upload to reach the image dimensions past any EXIF block.
+PROBE_HEAD_BYTES = 128 * 1024
 
 
 def _file_url(request, file_field):
@@ -25,6 +69,127 @@ def _file_url(request, file_field):
     return request.build_absolute_uri(file_field.url)
 
 
+def _artifact_url(request, job, name):
+    """Direct URL of a lazy artifact once stored, otherwise the endpoint that renders it."""
+    if artifact_ready(job, name):
+        return _file_url(request, getattr(job, LAZY_ARTIFACTS[name]))
+    if not job.intermediates:
+        return None
+    return request.build_absolute_uri(f"/api/digitization-jobs/{job.id}/artifacts/{name}/")
+
+
+def _artifact_pending(job, name):
+    """Queue a worker render of a lazy artifact, once, and tell the client to retry."""
+    timeout = int(getattr(settings, "DIGITIZATION_ARTIFACT_QUEUE_TIMEOUT_SECONDS", 300))
+    try:
+        first = cache.add(artifact_queue_key(job.id, name), 1, timeout)
+    except Exception:
+        # Without the cache every request queues; the worker renders once anyway.
+        logger.warning("Could not mark %s of DigitizationJob %s as queued", name, job.id, exc_info=True)
+        first = True
+    if first:
+        current_app.send_task(
+            "digitization.tasks.render_job_artifact",
+            args=[str(job.id), name],
+        )
+    response = Response({"detail": f"{name} is being rendered"}, status=status.HTTP_202_ACCEPTED)
+    response["Retry-After"] = str(getattr(settings, "DIGITIZATION_ARTIFACT_RETRY_AFTER_SECONDS", 2))
+    return response
+
+
+def _enqueue_job(job):
+    job.status = STATUS_QUEUED
+    job.stage = STAGE_LOADING
+    job.save(update_fields=["status", "stage"])
+    current_app.send_task(
+        "digitization.tasks.process_digitization_job",
+        args=[str(job.id)],
+    )
+
+
+def _enqueue_live_frames(job, frame_indices):
+    if not job.live:
+        return
+    for frame_index in frame_indices:
+        current_app.send_task(
+            "digitization.tasks.process_live_frame",
+            args=[str(job.id), frame_index],
+        )
+
+
+def _read_archive(archive, max_bytes, max_members):
+    """Return ``(name, data)`` for each file in a zip archive, in name order."""
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            members = sorted((m for m in zf.infolist() if not m.is_dir()), key=lambda m: m.filename)
+            if max_members and len(members) > max_members:
+                raise ValueError("Archive has more files than expected_frames")
+            entries = []
+            for member in members:
+                if member.file_size > max_bytes:
+                    raise ValueError(f"{member.filename} exceeds max file size")
+                entries.append((member.filename, zf.read(member)))
+            return entries
+    except zipfile.BadZipFile:
+        raise ValueError("Invalid zip archive")
+
+
+def _frame_index_error(job, frame_index):
+    if frame_index < 0:
+        return Response({"detail": "frame_index must be >= 0"}, status=status.HTTP_400_BAD_REQUEST)
+    if job.expected_frames and frame_index >= job.expected_frames:
+        return Response({"detail": "frame_index exceeds expected_frames"}, status=status.HTTP_400_BAD_REQUEST)
+    return None
+
+
+def _record_frame(job, frame_index, image, *, captured_at, width, height, checksum, size_bytes):
+    """
+    Store ``image`` (an uploaded file, or the name of an object already in
+    storage) as the job's frame ``frame_index`` and update the job.
+    """
+    frame, created = DigitizationFrame.objects.get_or_create(
+        job=job,
+        frame_index=frame_index,
+    )
+    if not created and frame.image and frame.image.name != getattr(image, "name", image):
+        frame.image.delete(save=False)
+
+    frame.image = image
+    frame.captured_at = captured_at
+    frame.width = width
+    frame.height = height
+    frame.checksum = checksum
+    frame.size_bytes = size_bytes
+    frame.save()
+
+    if not job.frame_width or not job.frame_height:
+        job.frame_width = width
+        job.frame_height = height
+
+    if job.status in {STATUS_CREATED, STATUS_FAILED}:
+        job.status = STATUS_UPLOADING
+        job.error_message = ""
+        job.error_code = ""
+        job.save(update_fields=["status", "frame_width", "frame_height", "error_message", "error_code"])
+    else:
+        job.save(update_fields=["frame_width", "frame_height"])
+
+    _enqueue_live_frames(job, [frame.frame_index])
+
+    if getattr(settings, "DIGITIZATION_AUTO_TRIGGER", False):
+        if job.frames.count() >= job.expected_frames and job.status != STATUS_QUEUED:
+            _enqueue_job(job)
+
+    return Response(
+        {
+            "frame_id": str(frame.id),
+            "frame_index": frame.frame_index,
+            "status": "UPLOADED",
+        },
+        status=status.HTTP_201_CREATED,
+    )
+
+
 class DigitizationJobCreateView(APIView):
     def post(self, request, room_id):
         room = get_object_or_404(Room, id=room_id)
@@ -45,14 +210,21 @@ class DigitizationJobCreateView(APIView):
             options=s.validated_data.get("options") or {},
             status=STATUS_CREATED,
         )
+        if job.live:
+            LiveBoard.objects.create(job=job)
 
         return Response(
             {
                 "job_id": str(job.id),
                 "status": job.status,
+                "live": job.live,
                 "upload": {
                     "mode": "multipart",
                     "frame_upload_url": f"/api/digitization-jobs/{job.id}/frames/",
+                    "batch_upload_url": f"/api/digitization-jobs/{job.id}/frames/batch/",
+                    "presign_url": (
+                        f"/api/digitization-jobs/{job.id}/frames/presign/" if direct_uploads_enabled() else None
+                    ),
                 },
             },
             status=status.HTTP_201_CREATED,
@@ -61,11 +233,8 @@ class DigitizationJobCreateView(APIView):
 
 class DigitizationFrameUploadView(APIView):
     def post(self, request, job_id):
-        import cv2
-        import numpy as np
-
         job = get_object_or_404(DigitizationJob, id=job_id)
-        if job.status not in {STATUS_CREATED, STATUS_UPLOADING, STATUS_FAILED}:
+        if job.status not in UPLOADABLE_STATUSES:
             return Response(
                 {"detail": "Job is not accepting uploads"},
                 status=status.HTTP_409_CONFLICT,
@@ -75,66 +244,228 @@ class DigitizationFrameUploadView(APIView):
         s.is_valid(raise_exception=True)
 
         frame_index = s.validated_data["frame_index"]
-        if frame_index < 0:
-            return Response({"detail": "frame_index must be >= 0"}, status=status.HTTP_400_BAD_REQUEST)
-        if job.expected_frames and frame_index >= job.expected_frames:
-            return Response({"detail": "frame_index exceeds expected_frames"}, status=status.HTTP_400_BAD_REQUEST)
+        error = _frame_index_error(job, frame_index)
+        if error:
+            return error
 
         image = s.validated_data["image"]
         data = image.read()
         image.seek(0)
-        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
-        if img is None:
+        # Only the headers are checked here; the worker fully decodes frames.
+        try:
+            _, width, height = probe_image(data)
+        except ValueError:
             return Response({"detail": "Invalid image payload"}, status=status.HTTP_400_BAD_REQUEST)
-        height, width = img.shape[:2]
 
-        captured_at = s.validated_data.get("captured_at")
-
-        frame, created = DigitizationFrame.objects.get_or_create(
-            job=job,
-            frame_index=frame_index,
+        return _record_frame(
+            job,
+            frame_index,
+            image,
+            captured_at=s.validated_data.get("captured_at"),
+            width=width,
+            height=height,
+            checksum=hashlib.sha256(data).hexdigest(),
+            size_bytes=len(data),
         )
-        if not created and frame.image:
-            frame.image.delete(save=False)
 
-        frame.image = image
-        frame.captured_at = captured_at
-        frame.width = width
-        frame.height = height
-        frame.save()
 
-        if not job.frame_width or not job.frame_height:
-            job.frame_width = width
-            job.frame_height = height
+class DigitizationFrameBatchUploadView(APIView):
+    """
+    Stores many frames in one request, sent either as repeated ``images``
+    parts or as a zip ``archive`` whose files are ordered by name. Frames take
+    ``frame_indices`` when given, otherwise 0..n-1. With ``run`` set the job is
+    queued in the same request once every expected frame is present.
+    """
+
+    def post(self, request, job_id):
+        job = get_object_or_404(DigitizationJob, id=job_id)
+        if job.status not in UPLOADABLE_STATUSES:
+            return Response(
+                {"detail": "Job is not accepting uploads"},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        s = DigitizationFrameBatchUploadSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
 
-        if job.status in {STATUS_CREATED, STATUS_FAILED}:
-            job.status = STATUS_UPLOADING
-            job.error_message = ""
-            job.error_code = ""
-            job.save(update_fields=["status", "frame_width", "frame_height", "error_message", "error_code"])
+        if "archive" in s.validated_data:
+            try:
+                entries = _read_archive(
+                    s.validated_data["archive"],
+                    getattr(settings, "DIGITIZATION_MAX_FRAME_BYTES", 3_000_000),
+                    job.expected_frames,
+                )
+            except ValueError as exc:
+                return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         else:
-            job.save(update_fields=["frame_width", "frame_height"])
-
-        if getattr(settings, "DIGITIZATION_AUTO_TRIGGER", False):
-            if job.frames.count() >= job.expected_frames and job.status != STATUS_QUEUED:
-                job.status = STATUS_QUEUED
-                job.stage = STAGE_LOADING
-                job.save(update_fields=["status", "stage"])
-                current_app.send_task(
-                    "digitization.tasks.process_digitization_job",
-                    args=[str(job.id)],
+            entries = [(image.name, image.read()) for image in s.validated_data["images"]]
+
+        if not entries:
+            return Response({"detail": "No frames in request"}, status=status.HTTP_400_BAD_REQUEST)
+
+        frame_indices = s.validated_data.get("frame_indices") or list(range(len(entries)))
+        if len(frame_indices) != len(entries):
+            return Response(
+                {"detail": "frame_indices must match the number of frames"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if job.expected_frames and max(frame_indices) >= job.expected_frames:
+            return Response({"detail": "frame_index exceeds expected_frames"}, status=status.HTTP_400_BAD_REQUEST)
+
+        frames = []
+        for frame_index, (_, data) in zip(frame_indices, entries):
+            try:
+                _, width, height = probe_image(data)
+            except ValueError:
+                return Response(
+                    {"detail": "Invalid image payload", "frame_index": frame_index},
+                    status=status.HTTP_400_BAD_REQUEST,
                 )
+            frames.append(DigitizationFrame(
+                job=job,
+                frame_index=frame_index,
+                width=width,
+                height=height,
+                checksum=hashlib.sha256(data).hexdigest(),
+                size_bytes=len(data),
+            ))
+
+        # Files are only written once every frame in the request is valid.
+        for frame, (name, data) in zip(frames, entries):
+            frame.image.save(name, ContentFile(data), save=False)
+
+        with transaction.atomic():
+            replaced = list(job.frames.filter(frame_index__in=frame_indices))
+            for old_frame in replaced:
+                old_frame.image.delete(save=False)
+            DigitizationFrame.objects.filter(id__in=[f.id for f in replaced]).delete()
+            DigitizationFrame.objects.bulk_create(frames)
+
+            update_fields = []
+            if not job.frame_width or not job.frame_height:
+                job.frame_width = frames[0].width
+                job.frame_height = frames[0].height
+                update_fields += ["frame_width", "frame_height"]
+            if job.status in {STATUS_CREATED, STATUS_FAILED}:
+                job.status = STATUS_UPLOADING
+                job.error_message = ""
+                job.error_code = ""
+                update_fields += ["status", "error_message", "error_code"]
+            if update_fields:
+                job.save(update_fields=update_fields)
+
+        _enqueue_live_frames(job, frame_indices)
+
+        uploaded_frames = job.frames.count()
+        run = s.validated_data["run"] or getattr(settings, "DIGITIZATION_AUTO_TRIGGER", False)
+        if run and uploaded_frames >= job.expected_frames:
+            _enqueue_job(job)
 
         return Response(
             {
-                "frame_id": str(frame.id),
-                "frame_index": frame.frame_index,
+                "frames": [{"frame_id": str(f.id), "frame_index": f.frame_index} for f in frames],
+                "uploaded_frames": uploaded_frames,
+                "expected_frames": job.expected_frames,
+                "job_status": job.status,
                 "status": "UPLOADED",
             },
             status=status.HTTP_201_CREATED,
         )
 
 
+class DigitizationFramePresignView(APIView):
+    """Issue a presigned PUT so the client uploads a frame straight to object storage."""
+
+    def post(self, request, job_id):
+        if not direct_uploads_enabled():
+            return Response({"detail": "Direct uploads are not enabled"}, status=status.HTTP_404_NOT_FOUND)
+
+        job = get_object_or_404(DigitizationJob, id=job_id)
+        if job.status not in UPLOADABLE_STATUSES:
+            return Response(
+                {"detail": "Job is not accepting uploads"},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        s = DigitizationFramePresignSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+
+        frame_index = s.validated_data["frame_index"]
+        error = _frame_index_error(job, frame_index)
+        if error:
+            return error
+
+        content_type = s.validated_data["content_type"]
+        ext = mimetypes.guess_extension(content_type) or ".jpg"
+        # A fresh key per presign, so re-uploading an index never overwrites
+        # the recorded frame's object before the new one is finalized.
+        stem, ext = posixpath.splitext(frame_upload_to(DigitizationFrame(job=job, frame_index=frame_index), f"upload{ext}"))
+        name = f"{stem}_{uuid.uuid4().hex}{ext}"
+        try:
+            upload = create_upload(
+                name,
+                content_type,
+                s.validated_data["checksum"],
+                job_id=str(job.id),
+                frame_index=frame_index,
+            )
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(upload, status=status.HTTP_201_CREATED)
+
+
+class DigitizationFrameFinalizeView(APIView):
+    """Record a frame that the client uploaded with a presigned URL."""
+
+    def post(self, request, job_id):
+        if not direct_uploads_enabled():
+            return Response({"detail": "Direct uploads are not enabled"}, status=status.HTTP_404_NOT_FOUND)
+
+        job = get_object_or_404(DigitizationJob, id=job_id)
+        if job.status not in UPLOADABLE_STATUSES:
+            return Response(
+                {"detail": "Job is not accepting uploads"},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        s = DigitizationFrameFinalizeSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+
+        try:
+            claims = read_upload_token(s.validated_data["upload_token"])
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if claims.get("job_id") != str(job.id):
+            return Response({"detail": "Upload token belongs to another job"}, status=status.HTTP_400_BAD_REQUEST)
+
+        name = claims["name"]
+        try:
+            size_bytes = uploaded_size(name)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        max_bytes = getattr(settings, "DIGITIZATION_MAX_FRAME_BYTES", 3_000_000)
+        try:
+            if size_bytes > max_bytes:
+                raise ValueError("Image exceeds max file size")
+            _, width, height = probe_image(read_uploaded_head(name, PROBE_HEAD_BYTES))
+        except ValueError as exc:
+            discard_upload(name)
+            return Response({"detail": str(exc) or "Invalid image payload"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return _record_frame(
+            job,
+            claims["frame_index"],
+            name,
+            captured_at=s.validated_data.get("captured_at"),
+            width=width,
+            height=height,
+            checksum=claims["checksum"],
+            size_bytes=size_bytes,
+        )
+
+
 class DigitizationJobRunView(APIView):
     def post(self, request, job_id):
         job = get_object_or_404(DigitizationJob, id=job_id)
@@ -154,16 +485,57 @@ class DigitizationJobRunView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        job.status = STATUS_QUEUED
-        job.stage = STAGE_LOADING
-        job.save(update_fields=["status", "stage"])
+        _enqueue_job(job)
+
+        return Response({"job_id": str(job.id), "status": job.status}, status=status.HTTP_200_OK)
+
+
+class DigitizationJobRerenderView(APIView):
+    """
+    Re-render a finished job's board with new ink detection or render options
+    (``adaptive_c``, ``palette_colors``, ...) from its stored intermediates,
+    as a new job queued on a worker. Other option changes need a new job.
+    """
+
+    def post(self, request, job_id):
+        job = get_object_or_404(DigitizationJob, id=job_id)
+        if job.status != STATUS_SUCCEEDED or "strokes" not in (job.intermediates or {}):
+            return Response(
+                {"detail": "Job has no stored intermediates to re-render from"},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        s = DigitizationJobRerenderSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
 
+        # Rendering runs on a worker, which also rejects options the stored
+        # intermediates depend on by failing the new job.
+        rerendered = DigitizationJob.objects.create(
+            room_id=job.room_id,
+            status=STATUS_QUEUED,
+            stage=STAGE_INK,
+            expected_frames=job.expected_frames,
+            processed_frames=job.processed_frames,
+            frame_width=job.frame_width,
+            frame_height=job.frame_height,
+            capture_source=job.capture_source,
+            options={**(job.options or {}), **s.validated_data["options"]},
+            metrics={"rerendered_from": str(job.id)},
+        )
         current_app.send_task(
-            "digitization.tasks.process_digitization_job",
-            args=[str(job.id)],
+            "digitization.tasks.rerender_digitization_job",
+            args=[str(rerendered.id)],
         )
 
-        return Response({"job_id": str(job.id), "status": job.status}, status=status.HTTP_200_OK)
+        return Response(
+            {
+                "job_id": str(rerendered.id),
+                "status": rerendered.status,
+                "rerendered_from": str(job.id),
+                "detail_url": request.build_absolute_uri(f"/api/digitization-jobs/{rerendered.id}/"),
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
 
 
 class DigitizationJobDetailView(APIView):
@@ -174,9 +546,20 @@ class DigitizationJobDetailView(APIView):
         if job.result_image:
             result = {
                 "image_url": _file_url(request, job.result_image),
-                "background_url": _file_url(request, job.background_image),
-                "debug_url": _file_url(request, job.debug_image),
+                "background_url": _artifact_url(request, job, "background"),
+                "debug_url": _artifact_url(request, job, "debug"),
+                "webp_url": _artifact_url(request, job, "webp"),
+                "svg_url": _file_url(request, job.result_svg),
+                "thumbnails": thumbnail_urls(request, job),
+                "pyramid": None,
             }
+            if job.pyramid:
+                result["pyramid"] = {
+                    key: job.pyramid[key] for key in ("format", "tile_size", "max_level", "width", "height")
+                }
+                result["pyramid"]["tile_url"] = (
+                    request.build_absolute_uri(f"/api/digitization-jobs/{job.id}/tiles/") + "{level}/{x}/{y}/"
+                )
 
         error = None
         if job.status == STATUS_FAILED:
@@ -185,13 +568,22 @@ class DigitizationJobDetailView(APIView):
                 "message": job.error_message or None,
             }
 
+        stage = job.stage
+        processed_frames = job.processed_frames
+        if job.status == STATUS_RUNNING:
+            # The worker only saves progress to the database periodically.
+            live = read_progress(job.id)
+            if live:
+                stage = live.get("stage", stage)
+                processed_frames = live.get("processed_frames", processed_frames)
+
         return Response(
             {
                 "job_id": str(job.id),
                 "status": job.status,
                 "progress": {
-                    "stage": job.stage or None,
-                    "processed_frames": job.processed_frames,
+                    "stage": stage or None,
+                    "processed_frames": processed_frames,
                     "expected_frames": job.expected_frames,
                 },
                 "result": result,
@@ -209,6 +601,27 @@ class LatestWhiteboardView(APIView):
             .order_by("-finished_at", "-created_at")
             .first()
         )
+
+        # A live board folded after the latest finished job is the fresher view.
+        live_board = (
+            LiveBoard.objects.filter(job__room=room)
+            .exclude(canvas="")
+            .exclude(canvas=None)
+            .select_related("job")
+            .order_by("-updated_at")
+            .first()
+        )
+        if live_board and (not job or not job.result_image or live_board.updated_at > (job.finished_at or job.created_at)):
+            return Response(
+                {
+                    "room_id": str(room.id),
+                    "image_url": _file_url(request, live_board.canvas),
+                    "generated_at": live_board.updated_at,
+                    "job_id": str(live_board.job_id),
+                    "live": True,
+                }
+            )
+
         if not job or not job.result_image:
             return Response({"detail": "No digitized board available"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -216,7 +629,92 @@ class LatestWhiteboardView(APIView):
             {
                 "room_id": str(room.id),
                 "image_url": _file_url(request, job.result_image),
+                "svg_url": _file_url(request, job.result_svg),
+                "thumbnails": thumbnail_urls(request, job),
                 "generated_at": job.finished_at or job.created_at,
                 "job_id": str(job.id),
             }
         )
+
+
+class DigitizationJobTileView(APIView):
+    """Redirect to one tile of a finished job's Deep Zoom pyramid."""
+
+    def get(self, request, job_id, level, x, y):
+        job = get_object_or_404(DigitizationJob, id=job_id)
+        if not job.pyramid:
+            return Response({"detail": "No tile pyramid for this job"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            path = pyramid_tile_path(job.pyramid, level, x, y)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_404_NOT_FOUND)
+        if not artifact_ready(job, "pyramid"):
+            if not artifact_available(job, "pyramid"):
+                return Response({"detail": "No tile pyramid for this job"}, status=status.HTTP_404_NOT_FOUND)
+            # The first tile request has a worker build the whole pyramid.
+            return _artifact_pending(job, "pyramid")
+        name = f"{job.pyramid['root']}/{path}"
+        return HttpResponseRedirect(request.build_absolute_uri(default_storage.url(name)))
+
+
+class DigitizationJobArtifactView(APIView):
+    """Redirect to a secondary artifact of a finished job; the first request has a worker render it."""
+
+    def get(self, request, job_id, name):
+        job = get_object_or_404(DigitizationJob, id=job_id)
+        if name not in LAZY_ARTIFACTS or name == "pyramid":
+            return Response({"detail": "Unknown artifact"}, status=status.HTTP_404_NOT_FOUND)
+        if job.status != STATUS_SUCCEEDED:
+            return Response({"detail": "Job has not finished"}, status=status.HTTP_409_CONFLICT)
+        if not artifact_ready(job, name):
+            if not artifact_available(job, name):
+                return Response({"detail": f"{name} is not available for this job"}, status=status.HTTP_404_NOT_FOUND)
+            return _artifact_pending(job, name)
+        return HttpResponseRedirect(_file_url(request, getattr(job, LAZY_ARTIFACTS[name])))
+
+
+class BoardTilesView(APIView):
+    """
+    Manifest of a room's tiled board. With ``?since=<version>`` only tiles
+    rewritten after that version are listed, so clients holding an older
+    board fetch just what changed.
+    """
+
+    def get(self, request, room_id):
+        room = get_object_or_404(Room, id=room_id)
+        tileset = BoardTileSet.objects.filter(room=room).first()
+        if tileset is None or not tileset.canvas:
+            return Response({"detail": "No digitized board available"}, status=status.HTTP_404_NOT_FOUND)
+
+        since = request.query_params.get("since")
+        try:
+            since = int(since) if since not in (None, "") else 0
+        except ValueError:
+            return Response({"detail": "since must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        tiles = []
+        for key, entry in tileset.tiles.items():
+            if entry["version"] <= since:
+                continue
+            row, col = map(int, key.split(","))
+            tiles.append({
+                "row": row,
+                "col": col,
+                "version": entry["version"],
+                "url": request.build_absolute_uri(tileset.canvas.storage.url(entry["name"])),
+            })
+        tiles.sort(key=lambda tile: (tile["row"], tile["col"]))
+
+        return Response(
+            {
+                "room_id": str(room.id),
+                "version": tileset.version,
+                "since": since,
+                "tile_size": tileset.tile_size,
+                "width": tileset.width,
+                "height": tileset.height,
+                "job_id": str(tileset.job_id) if tileset.job_id else None,
+                "generated_at": tileset.updated_at,
+                "tiles": tiles,
+            }
+        )
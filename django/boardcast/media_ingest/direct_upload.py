@@ -0,0 +1,94 @@
+import base64
+import posixpath
+import re
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+
+UPLOAD_TOKEN_SALT = "media_ingest.direct_upload"
+_SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+
+def direct_uploads_enabled() -> bool:
+    return bool(getattr(settings, "USE_S3_STORAGE", False) and getattr(settings, "DIRECT_UPLOADS_ENABLED", False))
+
+
+def _object_key(name: str) -> str:
+    location = getattr(default_storage, "location", "") or ""
+    return posixpath.join(location, name) if location else name
+
+
+def _client():
+    return default_storage.connection.meta.client
+
+
+def create_upload(name: str, content_type: str, checksum: str, **claims) -> dict:
+    """
+    Presigned PUT for storage name ``name``, plus a signed token that the
+    finalize call hands back to prove which object and checksum were issued.
+
+    S3 rejects the PUT unless the body matches the SHA-256 ``checksum``.
+    """
+    checksum = checksum.lower()
+    if not _SHA256_HEX.match(checksum):
+        raise ValueError("checksum must be a hex SHA-256 digest")
+
+    checksum_b64 = base64.b64encode(bytes.fromhex(checksum)).decode("ascii")
+    expires = int(getattr(settings, "DIRECT_UPLOAD_EXPIRES_SECONDS", 900))
+    url = _client().generate_presigned_url(
+        "put_object",
+        Params={
+            "Bucket": default_storage.bucket_name,
+            "Key": _object_key(name),
+            "ContentType": content_type,
+            "ChecksumSHA256": checksum_b64,
+        },
+        ExpiresIn=expires,
+    )
+    token = signing.dumps({"name": name, "checksum": checksum, **claims}, salt=UPLOAD_TOKEN_SALT)
+    return {
+        "upload": {
+            "method": "PUT",
+            "url": url,
+            "headers": {
+                "Content-Type": content_type,
+                "x-amz-checksum-sha256": checksum_b64,
+            },
+            "expires_in": expires,
+        },
+        "upload_token": token,
+    }
+
+
+def read_upload_token(token: str) -> dict:
+    # Finalize may come a little after the presigned URL itself expires.
+    max_age = 2 * int(getattr(settings, "DIRECT_UPLOAD_EXPIRES_SECONDS", 900))
+    try:
+        return signing.loads(token, salt=UPLOAD_TOKEN_SALT, max_age=max_age)
+    except signing.BadSignature:
+        raise ValueError("Invalid or expired upload token")
+
+
+def uploaded_size(name: str) -> int:
+    """Size of an uploaded object; raises ``ValueError`` if it was never uploaded."""
+    from botocore.exceptions import ClientError
+
+    try:
+        head = _client().head_object(Bucket=default_storage.bucket_name, Key=_object_key(name))
+    except ClientError:
+        raise ValueError("Upload not found")
+    return int(head["ContentLength"])
+
+
+def read_uploaded_head(name: str, length: int) -> bytes:
+    response = _client().get_object(
+        Bucket=default_storage.bucket_name,
+        Key=_object_key(name),
+        Range=f"bytes=0-{length - 1}",
+    )
+    return response["Body"].read()
+
+
+def discard_upload(name: str) -> None:
+    default_storage.delete(name)
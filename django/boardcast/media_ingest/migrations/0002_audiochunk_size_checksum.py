@@ -0,0 +1,23 @@
+# Generated by Django 5.0.10 on 2026-10-17 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("media_ingest", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="audiochunk",
+            name="checksum",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="audiochunk",
+            name="size_bytes",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -8,3 +8,5 @@ class AudioChunk(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     file = models.FileField(upload_to="audio_chunks/")
     duration_ms = models.IntegerField(default=0)
+    size_bytes = models.IntegerField(null=True, blank=True)
+    checksum = models.CharField(max_length=64, blank=True, default="")
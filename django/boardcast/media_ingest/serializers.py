@@ -7,3 +7,14 @@ class AudioChunkUploadSerializer(serializers.ModelSerializer):
         model = AudioChunk
         fields = ["id", "room_id", "file", "duration_ms", "created_at"]
         read_only_fields = ["id", "created_at"]
+
+
+class AudioChunkPresignSerializer(serializers.Serializer):
+    room_id = serializers.UUIDField()
+    content_type = serializers.CharField()
+    checksum = serializers.CharField(min_length=64, max_length=64)
+
+
+class AudioChunkFinalizeSerializer(serializers.Serializer):
+    upload_token = serializers.CharField()
+    duration_ms = serializers.IntegerField(required=False, default=0)
@@ -0,0 +1,226 @@
+import base64
+import hashlib
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from django.test import TestCase, override_settings
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .models import AudioChunk
+
+
+class LocalS3:
+    """
+    A throwaway S3 endpoint on localhost for presigned-upload tests. Like S3,
+    it refuses expired or unsigned PUTs, PUTs whose headers differ from the
+    signed ones, and bodies that do not match ``x-amz-checksum-sha256``.
+    """
+
+    def __init__(self, bucket="bucket"):
+        self.bucket = bucket
+        self.objects = {}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def endpoint_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def storage(self):
+        return S3Boto3Storage(
+            bucket_name=self.bucket,
+            endpoint_url=self.endpoint_url,
+            access_key="test",
+            secret_key="test",
+            region_name="us-east-1",
+        )
+
+    def put(self, upload, body):
+        """PUT ``body`` as a client would with the presign response's ``upload``; returns the status."""
+        request = urllib.request.Request(upload["url"], data=body, method=upload["method"], headers=upload["headers"])
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status
+        except urllib.error.HTTPError as exc:
+            return exc.code
+
+    def _handler(self):
+        s3 = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, code, body=b"", headers=None):
+                self.send_response(code)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _key(self):
+                bucket, _, key = unquote(urlsplit(self.path).path).lstrip("/").partition("/")
+                return key if bucket == s3.bucket else None
+
+            def _presign_error(self, query, body):
+                if "Signature" in query:
+                    expires = int(query["Expires"][0])
+                elif "X-Amz-Signature" in query:
+                    signed_at = time.mktime(time.strptime(query["X-Amz-Date"][0], "%Y%m%dT%H%M%SZ")) - time.timezone
+                    expires = signed_at + int(query["X-Amz-Expires"][0])
+                else:
+                    return 403
+                if time.time() > expires:
+                    return 403
+                for name in ("content-type", "x-amz-checksum-sha256"):
+                    if name in query and self.headers.get(name) != query[name][0]:
+                        return 403
+                checksum = self.headers.get("x-amz-checksum-sha256")
+                if checksum and checksum != base64.b64encode(hashlib.sha256(body).digest()).decode("ascii"):
+                    return 400
+                return None
+
+            def do_PUT(self):
+                key = self._key()
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                query = parse_qs(urlsplit(self.path).query)
+                error = self._presign_error(query, body) if key is not None else 404
+                if error:
+                    self._reply(error)
+                    return
+                s3.objects[key] = body
+                self._reply(200)
+
+            def do_HEAD(self):
+                key = self._key()
+                if key not in s3.objects:
+                    self._reply(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(s3.objects[key])))
+                self.end_headers()
+
+            def do_GET(self):
+                body = s3.objects.get(self._key())
+                if body is None:
+                    self._reply(404)
+                    return
+                range_header = self.headers.get("Range")
+                if not range_header:
+                    self._reply(200, body)
+                    return
+                start, _, end = range_header.removeprefix("bytes=").partition("-")
+                start, end = int(start), min(int(end or len(body) - 1), len(body) - 1)
+                self._reply(206, body[start:end + 1], {"Content-Range": f"bytes {start}-{end}/{len(body)}"})
+
+            def do_DELETE(self):
+                s3.objects.pop(self._key(), None)
+                self._reply(204)
+
+        return Handler
+
+
+@override_settings(USE_S3_STORAGE=True, DIRECT_UPLOADS_ENABLED=True)
+class DirectAudioUploadTests(TestCase):
+    def setUp(self):
+        self.s3 = LocalS3().start()
+        self.addCleanup(self.s3.stop)
+        patcher = mock.patch("media_ingest.direct_upload.default_storage", self.s3.storage())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("media_ingest.views.process_audio_chunk_async")
+        self.transcribe = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.room_id = uuid.uuid4()
+        self.audio = b"OggS" + bytes(range(256)) * 8
+        self.checksum = hashlib.sha256(self.audio).hexdigest()
+
+    def _presign(self, checksum=None):
+        response = self.client.post("/api/media/audio-chunks/presign/", {
+            "room_id": str(self.room_id),
+            "content_type": "audio/ogg",
+            "checksum": checksum or self.checksum,
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def _finalize(self, upload):
+        return self.client.post("/api/media/audio-chunks/finalize/", {
+            "upload_token": upload["upload_token"],
+            "duration_ms": 5000,
+        })
+
+    def test_presigned_put_then_finalize_records_chunk(self):
+        upload = self._presign()
+        self.assertEqual(upload["upload"]["method"], "PUT")
+        self.assertEqual(self.s3.put(upload["upload"], self.audio), 200)
+        [name] = self.s3.objects
+        self.assertTrue(name.startswith("audio_chunks/"))
+
+        response = self._finalize(upload)
+
+        self.assertEqual(response.status_code, 201, response.content)
+        chunk = AudioChunk.objects.get()
+        self.assertEqual(str(chunk.id), response.json()["id"])
+        self.assertEqual(
+            (chunk.room_id, chunk.file.name, chunk.duration_ms, chunk.size_bytes, chunk.checksum),
+            (self.room_id, name, 5000, len(self.audio), self.checksum),
+        )
+        self.transcribe.delay.assert_called_once_with(str(chunk.id))
+
+    def test_replayed_finalize_does_not_transcribe_again(self):
+        upload = self._presign()
+        self.s3.put(upload["upload"], self.audio)
+
+        first = self._finalize(upload)
+        replay = self._finalize(upload)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json()["id"], first.json()["id"])
+        self.assertEqual(AudioChunk.objects.count(), 1)
+        self.transcribe.delay.assert_called_once()
+
+    def test_put_must_match_checksum(self):
+        upload = self._presign()
+        self.assertEqual(self.s3.put(upload["upload"], self.audio + b"tampered"), 400)
+        headers = {**upload["upload"]["headers"], "Content-Type": "audio/webm"}
+        self.assertEqual(self.s3.put({**upload["upload"], "headers": headers}, self.audio), 403)
+
+        response = self._finalize(upload)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Upload not found")
+        self.assertFalse(AudioChunk.objects.exists())
+        self.transcribe.delay.assert_not_called()
+
+    def test_presign_rejects_bad_checksum(self):
+        response = self.client.post("/api/media/audio-chunks/presign/", {
+            "room_id": str(self.room_id),
+            "content_type": "audio/ogg",
+            "checksum": "z" * 64,
+        })
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(DIRECT_UPLOADS_ENABLED=False)
+    def test_disabled_without_direct_uploads(self):
+        response = self.client.post("/api/media/audio-chunks/finalize/", {"upload_token": "x"})
+        self.assertEqual(response.status_code, 404)
@@ -1,6 +1,8 @@
 from django.urls import path
-from .views import AudioChunkUploadView
+from .views import AudioChunkFinalizeView, AudioChunkPresignView, AudioChunkUploadView
 
 urlpatterns = [
     path("audio-chunks/", AudioChunkUploadView.as_view()),
+    path("audio-chunks/presign/", AudioChunkPresignView.as_view()),
+    path("audio-chunks/finalize/", AudioChunkFinalizeView.as_view()),
 ]
@@ -1,7 +1,12 @@
+import mimetypes
+import uuid
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import AudioChunkUploadSerializer
+from .direct_upload import create_upload, direct_uploads_enabled, read_upload_token, uploaded_size
+from .models import AudioChunk
+from .serializers import AudioChunkFinalizeSerializer, AudioChunkPresignSerializer, AudioChunkUploadSerializer
 from intelligence.tasks import process_audio_chunk_async
 
 
@@ -9,9 +14,66 @@ class AudioChunkUploadView(APIView):
     def post(self, request):
         s = AudioChunkUploadSerializer(data=request.data)
         s.is_valid(raise_exception=True)
-        chunk = s.save()
+        chunk = s.save(size_bytes=s.validated_data["file"].size)
 
         # Trigger async processing (transcribe + importance)
         process_audio_chunk_async.delay(str(chunk.id))
 
         return Response({"id": str(chunk.id)}, status=status.HTTP_201_CREATED)
+
+
+class AudioChunkPresignView(APIView):
+    def post(self, request):
+        if not direct_uploads_enabled():
+            return Response({"detail": "Direct uploads are not enabled"}, status=status.HTTP_404_NOT_FOUND)
+
+        s = AudioChunkPresignSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+
+        content_type = s.validated_data["content_type"]
+        ext = mimetypes.guess_extension(content_type) or ""
+        name = f"{AudioChunk.file.field.upload_to}{uuid.uuid4().hex}{ext}"
+        try:
+            upload = create_upload(
+                name,
+                content_type,
+                s.validated_data["checksum"],
+                room_id=str(s.validated_data["room_id"]),
+            )
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(upload, status=status.HTTP_201_CREATED)
+
+
+class AudioChunkFinalizeView(APIView):
+    def post(self, request):
+        if not direct_uploads_enabled():
+            return Response({"detail": "Direct uploads are not enabled"}, status=status.HTTP_404_NOT_FOUND)
+
+        s = AudioChunkFinalizeSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+
+        try:
+            claims = read_upload_token(s.validated_data["upload_token"])
+            size_bytes = uploaded_size(claims["name"])
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # A replayed token finds the chunk recorded for its object instead of
+        # creating (and transcribing) it again.
+        chunk, created = AudioChunk.objects.get_or_create(
+            file=claims["name"],
+            defaults={
+                "room_id": claims["room_id"],
+                "duration_ms": s.validated_data["duration_ms"],
+                "size_bytes": size_bytes,
+                "checksum": claims["checksum"],
+            },
+        )
+        if not created:
+            return Response({"id": str(chunk.id)}, status=status.HTTP_200_OK)
+
+        process_audio_chunk_async.delay(str(chunk.id))
+
+        return Response({"id": str(chunk.id)}, status=status.HTTP_201_CREATED)